@@ -1,7 +1,9 @@
 """
 BreakingPoint controller shell driver.
 """
+import logging
 import time
+from typing import Optional
 
 from cloudshell.shell.core.driver_context import CancellationContext, InitCommandContext, ResourceCommandContext
 from cloudshell.shell.core.resource_driver_interface import ResourceDriverInterface
@@ -12,7 +14,9 @@ from cloudshell_bp.devices.standards.traffic.controller.configuration_attributes
     GenericTrafficControllerResource,
 )
 from cloudshell_bp.tg.breaking_point.entities.bp_session import BPSession
+from cloudshell_bp.tg.breaking_point.helpers.job_queue import JobQueue
 from cloudshell_bp.tg.breaking_point.helpers.quali_rest_api_helper import QualiAPIHelper
+from cloudshell_bp.tg.breaking_point.rest_api.rest_session_pool import RestSessionPool
 from cloudshell_bp.tg.breaking_point.runners.bp_test_runner import BPTestRunner
 
 
@@ -21,10 +25,15 @@ class BreakingPointControllerDriver(ResourceDriverInterface):
 
     SHELL_NAME = "BreakingPoint Controller 2G"
     SUPPORTED_OS = ["BreakingPoint"]
+    SESSION_POOL_SIZE = 4
+    SESSION_IDLE_TIMEOUT = 600
+    JOB_WORKERS = 2
 
     def __init__(self) -> None:
         """Init must be without arguments, it is created with reflection at run time."""
         self._bp_sessions: dict = {}
+        self._rest_session_pool = RestSessionPool(self.SESSION_POOL_SIZE, self.SESSION_IDLE_TIMEOUT)
+        self._job_queue = JobQueue(self.JOB_WORKERS)
 
     def _session_runner(self, context: ResourceCommandContext) -> BPTestRunner:
         logger = get_logger_with_thread_id(context)
@@ -38,27 +47,55 @@ class BreakingPointControllerDriver(ResourceDriverInterface):
             bp_session = BPSession(reservation_id)
             self._bp_sessions[reservation_id] = bp_session
 
-        return BPTestRunner(resource_config, bp_session, logger, api)
+        return BPTestRunner(resource_config, bp_session, logger, api, self._rest_session_pool)
 
-    def load_config(self, context: ResourceCommandContext, config_file_location: str) -> None:
+    def load_config(
+        self,
+        context: ResourceCommandContext,
+        config_file_location: str,
+        force_upload: str = "False",
+        group_wait_timeout: str = "0",
+    ) -> None:
         """Reserve ports and load configuration.
 
         :param context:
-        :param config_file_location: configuration file location
+        :param config_file_location: configuration file location or test name from the test library
+        :param force_upload: True - upload the file even if identical one was already imported to the chassis
+        :param group_wait_timeout: seconds to wait for a free reservation group when all the groups are busy
         """
         cs_session = CloudShellSessionContext(context).get_api()
         cs_session.EnqueueCommand(
             context.reservation.reservation_id, context.resource.name, targetType="Service", commandName="keep_alive"
         )
-        return self._session_runner(context).load_configuration(config_file_location.replace('"', ""))
+        return self._session_runner(context).load_configuration(
+            config_file_location.replace('"', ""), force_upload, group_wait_timeout
+        )
 
-    def start_traffic(self, context: ResourceCommandContext, blocking: str) -> None:
+    def start_traffic(
+        self,
+        context: ResourceCommandContext,
+        blocking: str,
+        timeout: str = "",
+        statistics_groups: str = "",
+        statistics_interval: str = "",
+        thresholds: str = "",
+        stop_on_failure: str = "True",
+        cancellation_context: CancellationContext = None,
+    ) -> Optional[str]:
         """Start traffic on all ports.
 
         :param context: the context the command runs on
         :param bool blocking: True - return after traffic finish to run, False - return immediately
+        :param timeout: seconds to wait for blocking test to finish, empty - no timeout
+        :param statistics_groups: comma separated statistics groups to sample in background, empty - do not sample
+        :param statistics_interval: seconds between statistics samples
+        :param thresholds: semicolon separated rules evaluated on each statistics sample, empty - no thresholds
+        :param stop_on_failure: True - stop traffic when a hard threshold failed
+        :param cancellation_context: stop waiting for blocking test when the command is cancelled
         """
-        return self._session_runner(context).start_traffic(blocking)
+        return self._session_runner(context).start_traffic(
+            blocking, timeout, cancellation_context, statistics_groups, statistics_interval, thresholds, stop_on_failure
+        )
 
     def stop_traffic(self, context: ResourceCommandContext) -> None:
         """Stop traffic on all ports.
@@ -67,28 +104,112 @@ class BreakingPointControllerDriver(ResourceDriverInterface):
         """
         return self._session_runner(context).stop_traffic()
 
-    def get_statistics(self, context: ResourceCommandContext, view_name: str, output_type: str) -> str:
+    def get_threshold_results(self, context: ResourceCommandContext) -> str:
+        """Get thresholds evaluation of the running or last test in JSON format.
+
+        :param context: the context the command runs on
+        """
+        return self._session_runner(context).get_threshold_results()
+
+    def get_statistics(
+        self,
+        context: ResourceCommandContext,
+        view_name: str,
+        output_type: str,
+        time_series: str = "False",
+        derived_metrics: str = "False",
+    ) -> str:
         """Get real time statistics as sandbox attachment.
 
         :param context:
         :param str view_name: requested view name
         :param str output_type: CSV or JSON
+        :param time_series: True - all the samples collected in background, False - the latest values
+        :param derived_metrics: True - add delta, rate and rate moving average of numeric counters
+        """
+        return self._session_runner(context).get_statistics(view_name, output_type, time_series, derived_metrics)
+
+    def get_results(self, context: ResourceCommandContext, result_formats: str = "pdf", run_async: str = "False") -> str:
+        """Attach result files to the reservation.
+
+        :param context:
+        :param result_formats: comma separated result formats - pdf, csv, rtf, html, xml, zip
+        :param run_async: True - attach the files in background and return job id, see get_job_status
         """
-        return self._session_runner(context).get_statistics(view_name, output_type)
+        runner = self._session_runner(context)
+        quali_api_helper = QualiAPIHelper.from_context(context, runner.logger)
+        if run_async.lower() == "true":
+            return runner.submit_results_job(
+                self._job_queue, context.reservation.environment_name, quali_api_helper, result_formats
+            )
+        return runner.get_results(context.reservation.environment_name, quali_api_helper, result_formats)
 
-    def get_results(self, context: ResourceCommandContext) -> str:
-        """Attach result file to the reservation.
+    def get_job_status(self, context: ResourceCommandContext, job_id: str = "") -> str:
+        """Get status of the background job in JSON format.
 
         :param context:
+        :param job_id: job id returned by the command, empty - all the jobs of the reservation
+        """
+        return self._session_runner(context).get_job_status(self._job_queue, job_id.strip())
+
+    def export_statistics(
+        self,
+        context: ResourceCommandContext,
+        downsample_interval: str = "",
+        output_format: str = "zip",
+        compress: str = "False",
+    ) -> str:
+        """Attach history of the statistics sampled in background to the reservation.
+
+        :param context:
+        :param downsample_interval: seconds, aggregate samples to min, max and mean per interval, empty - all samples
+        :param output_format: zip - compressed columnar store, csv or json - one row per sample
+        :param compress: True - gzip csv or json file
         """
         runner = self._session_runner(context)
-        return runner.get_results(context.reservation.environment_name, QualiAPIHelper.from_context(context, runner.logger))
+        return runner.export_statistics(
+            context.reservation.environment_name,
+            QualiAPIHelper.from_context(context, runner.logger),
+            downsample_interval,
+            output_format,
+            compress,
+        )
+
+    def get_test_library(self, context: ResourceCommandContext, search: str = "") -> str:
+        """Get the test files under Test Files Location with their network and interfaces in JSON format.
+
+        :param context:
+        :param search: substring or glob of the test name, file path or network name, empty - all the tests
+        """
+        return self._session_runner(context).get_test_library(search)
+
+    def get_lock_statistics(self, context: ResourceCommandContext) -> str:
+        """Get wait and hold time of the chassis port reservation and network locks in JSON format.
+
+        :param context:
+        """
+        return self._session_runner(context).get_lock_statistics()
+
+    def get_cache_statistics(self, context: ResourceCommandContext, clear: str = "False") -> str:
+        """Get statistics of the exported files cache in JSON format.
+
+        :param context:
+        :param clear: True - remove the cached files
+        """
+        return self._session_runner(context).get_cache_statistics(clear)
+
+    def invalidate_upload_index(self, context: ResourceCommandContext) -> str:
+        """Forget the test files imported to the chassis, e.g. after the chassis reboot.
+
+        :param context:
+        """
+        return self._session_runner(context).invalidate_upload_index()
 
     def get_test_file(self, context: ResourceCommandContext, test_name: str) -> str:
         """Download test file configuration and put to the folder defined in Test Files Location attribute.
 
         :param context:
-        :param test_name: Name of the test
+        :param test_name: Name of the test, comma separated names or globs of the tests saved on the chassis
         """
         return self._session_runner(context).get_test_file(test_name)
 
@@ -159,7 +280,7 @@ class BreakingPointControllerDriver(ResourceDriverInterface):
             resource_config = GenericTrafficControllerResource.from_context(
                 shell_name=self.SHELL_NAME, supported_os=self.SUPPORTED_OS, context=context
             )
-            test_runner = BPTestRunner(resource_config, bp_session, logger, api)
+            test_runner = BPTestRunner(resource_config, bp_session, logger, api, self._rest_session_pool)
             test_runner.close_session()
             del self._bp_sessions[reservation_id]
 
@@ -168,11 +289,24 @@ class BreakingPointControllerDriver(ResourceDriverInterface):
 
     def cleanup(self) -> None:
         """Cleanup BreakingPoint controller shell (from API)."""
+        logger = logging.getLogger(__name__)
+        logger.debug(f"REST session pool statistics {self._rest_session_pool.statistics()}")
+        self._rest_session_pool.close(logger)
+        self._job_queue.shutdown()
+
+    def _release_reservation(self, reservation_id: str) -> None:
+        """Stop the background statistics sampling of the reservation.
+
+        The REST session pool and the job queue are shared by all the reservations of the driver
+        and are closed by cleanup only.
+        """
+        bp_session = self._bp_sessions.get(reservation_id, None)
+        if bp_session and bp_session.statistics_sampler:
+            bp_session.statistics_sampler.stop(wait=False)
 
-    # pylint: disable=unused-argument
     def keep_alive(self, context: ResourceCommandContext, cancellation_context: CancellationContext) -> None:
         """Keep BreakingPoint controller shell sessions alive (from TG controller API)."""
         while not cancellation_context.is_cancelled:
             time.sleep(2)
         if cancellation_context.is_cancelled:
-            self.cleanup()
+            self._release_reservation(context.reservation.reservation_id)
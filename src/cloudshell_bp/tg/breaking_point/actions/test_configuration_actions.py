@@ -4,6 +4,8 @@ from cloudshell_bp.tg.breaking_point.rest_api.rest_json_client import RestJsonCl
 
 
 class TestConfigurationActions(object):
+    SEARCH_LIMIT = 1000
+
     def __init__(self, rest_service, logger):
         """
         Reboot actions
@@ -59,6 +61,32 @@ class TestConfigurationActions(object):
         result = data.content
         return result
 
+    def download_test(self, test_name, file_object):
+        """
+        Stream exported test file to the file object without loading it to memory
+        :param file_object: binary file object
+        :return: bytes written
+        :rtype: int
+        """
+        self._logger.debug("Downloading test {0}".format(test_name))
+        uri = "/api/v1/bps/export/bpt/testname/" + test_name
+        return self._rest_service.download_file(uri, file_object)
+
+    def search_tests(self, search_string, limit=SEARCH_LIMIT):
+        """
+        Search saved tests by name
+        :param str search_string:
+        :param int limit: maximal number of tests
+        :return: test names
+        :rtype: list[str]
+        """
+        self._logger.debug("Searching tests {0}".format(search_string))
+        uri = "/api/v1/bps/testmodel/operations/search"
+        json_data = {"searchString": search_string, "limit": limit, "sort": "name", "sortorder": "ascending"}
+        data = self._rest_service.request_post(uri, json_data)
+        tests = data if isinstance(data, list) else data.get("result", [])
+        return [test["name"] for test in tests]
+
     def reserve_port(self, slot, port_list):
         self._logger.debug("Reserving ports {0} on slot {1}".format(port_list, slot))
         uri = "/api/v1/bps/ports/operations/reserve"
@@ -31,12 +31,15 @@ class TestExecutionActions(object):
         result = data
         return result
 
-    def get_test_status(self, test_id):
-        self._logger.debug("Geting test status, testID {}".format(test_id))
+    def get_test_result(self, test_id):
+        self._logger.debug("Geting test result, testID {}".format(test_id))
         uri = "/api/v1/bps/tests/operations/result"
         json_request = {"runid": test_id}
         data = self._rest_service.request_post(uri, json_request)
-        result = data.get("result")
+        return data
+
+    def get_test_status(self, test_id):
+        result = self.get_test_result(test_id).get("result")
         return result
 
     def running_tests(self):
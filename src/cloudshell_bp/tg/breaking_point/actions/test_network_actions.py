@@ -2,7 +2,8 @@ from cloudshell_bp.tg.breaking_point.utils.file_based_lock import FileBasedLock
 
 
 class TestNetworkActions(object):
-    LOCK_FILE = ".bp_networks.lock"
+    LOCK_NAME = "bp_networks"
+    LOCK_TIMEOUT = 120
 
     def __init__(self, rest_service, logger):
         """
@@ -18,7 +19,7 @@ class TestNetworkActions(object):
 
     def get_network_neighborhood(self, name):
         self._logger.debug("Network info {0}".format(name))
-        with FileBasedLock(self.LOCK_FILE):
+        with FileBasedLock.for_chassis(self.LOCK_NAME, self._rest_service.hostname, self.LOCK_TIMEOUT, self._logger):
             uri_r = "/api/v1/bps/network/operations/retrieve"
             request_body = {"name": name}
             self._rest_service.request_post(uri_r, request_body)
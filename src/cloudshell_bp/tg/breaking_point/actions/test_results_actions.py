@@ -18,10 +18,26 @@ class TestResultsActions(object):
         self._rest_service = rest_service
         self._logger = logger
 
+    RESULT_FORMATS = ["pdf", "csv", "rtf", "html", "xml", "zip"]
+
+    def _get_result_uri(self, test_id, result_format):
+        if result_format not in self.RESULT_FORMATS:
+            raise RestActionsException(self.__class__.__name__, "Incorrect format {}".format(result_format))
+        return "/api/v1/bps/export/report/{0}/{1}".format(test_id, result_format)
+
     def get_result_file(self, test_id, result_format):
         self._logger.debug("Get result in format {}".format(result_format))
-        if result_format not in ["pdf", "csv", "rtf", "html", "xml", "zip"]:
-            raise RestActionsException(self.__class__.__name__, "Incorrect format {}".format(result_format))
-        uri = "/api/v1/bps/export/report/{0}/{1}".format(test_id, result_format)
+        uri = self._get_result_uri(test_id, result_format)
         data = self._rest_service.request_get_files(uri)
         return data.content
+
+    def download_result_file(self, test_id, result_format, file_object):
+        """
+        Stream result file to the file object without loading it to memory
+        :param file_object: binary file object
+        :return: bytes written
+        :rtype: int
+        """
+        self._logger.debug("Download result in format {}".format(result_format))
+        uri = self._get_result_uri(test_id, result_format)
+        return self._rest_service.download_file(uri, file_object)
@@ -6,6 +6,19 @@ from cloudshell_bp.tg.breaking_point.rest_api.rest_json_client import RestJsonCl
 
 
 class TestStatisticsActions(object):
+    STATS_GROUPS = [
+        "summary",
+        "iface",
+        "l4stats",
+        "sslstats",
+        "ipsecstats",
+        "l7stats",
+        "clientstats",
+        "attacksstats",
+        "gtp",
+        "resource",
+    ]
+
     def __init__(self, rest_service, logger):
         """
         Reboot actions
@@ -20,21 +33,10 @@ class TestStatisticsActions(object):
 
     def get_real_time_statistics(self, test_id, stats_group="summary"):
         self._logger.debug("Get RTS, testID {0}, {1}".format(test_id, stats_group))
-        stats_groups = [
-            "summary",
-            "iface",
-            "l4stats",
-            "sslstats",
-            "ipsecstats",
-            "l7stats",
-            "clientstats",
-            "attacksstats",
-            "gtp",
-            "resource",
-        ]
-        if stats_group.lower() not in stats_groups:
+        if stats_group.lower() not in self.STATS_GROUPS:
             raise RestActionsException(
-                self.__class__.__name__, "Incorrect stats group {0}, supported groups {1}".format(stats_group, stats_groups)
+                self.__class__.__name__,
+                "Incorrect stats group {0}, supported groups {1}".format(stats_group, self.STATS_GROUPS),
             )
         uri = "/api/v1/bps/tests/operations/getrts"
         json_request = {"runid": test_id, "statsGroup": stats_group}
@@ -3,6 +3,7 @@ class BPSession(object):
     test_id = None
     reserved_ports = []
     reservation_group = None
+    statistics_sampler = None
 
     def __init__(self, cs_reservation_id):
         self.__cs_reservation_id = cs_reservation_id
@@ -0,0 +1,50 @@
+from xml.etree import ElementTree
+
+from cloudshell_bp.tg.breaking_point.bp_exception import BPException
+
+
+class BPTestModel(object):
+    """
+    Name, network name and interface numbers of the test exported to .bpt file
+    """
+
+    TEST_MODEL_TAG = "testmodel"
+    INTERFACE_TAG = "interface"
+
+    def __init__(self, network_name, interfaces, name=None):
+        """
+        :param str network_name:
+        :param list[int] interfaces: interface numbers in the test order
+        :param str name: test name
+        """
+        self.network_name = network_name
+        self.interfaces = interfaces
+        self.name = name
+
+    @classmethod
+    def from_file(cls, source):
+        """
+        Parse the file incrementally and stop after the testmodel element,
+        super flows and strikes embedded after it are never read and the parsed elements are released on the way
+        :param source: file path or binary file object
+        :rtype: BPTestModel
+        """
+        if isinstance(source, str):
+            with open(source, "rb") as test_file:
+                return cls.from_file(test_file)
+        depth = 0
+        test_model = None
+        for event, element in ElementTree.iterparse(source, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if depth == 2 and element.tag == cls.TEST_MODEL_TAG:
+                    test_model = cls(element.get("network"), [], element.get("name"))
+                continue
+            depth -= 1
+            if depth == 2 and test_model and element.tag == cls.INTERFACE_TAG:
+                test_model.interfaces.append(int(element.get("number")))
+            if depth == 1 and test_model:
+                return test_model
+            if depth in [1, 2]:
+                element.clear()
+        raise BPException(cls.__name__, "Test file does not contain {} element".format(cls.TEST_MODEL_TAG))
@@ -8,3 +8,24 @@ class BPDownloadTestFileFlow(BPFlow):
             configuration_actions = TestConfigurationActions(rest_service, self._logger)
             test_file_content = configuration_actions.export_test(test_name)
             return test_file_content
+
+    def download_test_file_to(self, test_name, file_object):
+        """
+        Stream exported test file to the file object
+        :param file_object: binary file object
+        :return: bytes written
+        :rtype: int
+        """
+        with self._session_context_manager as rest_service:
+            configuration_actions = TestConfigurationActions(rest_service, self._logger)
+            return configuration_actions.download_test(test_name, file_object)
+
+    def search_tests(self, search_string):
+        """
+        :param str search_string:
+        :return: test names
+        :rtype: list[str]
+        """
+        with self._session_context_manager as rest_service:
+            configuration_actions = TestConfigurationActions(rest_service, self._logger)
+            return configuration_actions.search_tests(search_string)
@@ -14,3 +14,10 @@ class BPFlow(object):
         """
         self._session_context_manager = session_context_manager
         self._logger = logger
+
+    @property
+    def hostname(self):
+        """
+        Chassis address
+        """
+        return self._session_context_manager.hostname
@@ -1,4 +1,5 @@
 import re
+from collections import OrderedDict
 
 from cloudshell_bp.tg.breaking_point.actions.port_reservation_actions import PortReservationActions
 from cloudshell_bp.tg.breaking_point.actions.test_network_actions import TestNetworkActions
@@ -39,16 +40,41 @@ class BPPortReservationFlow(BPFlow):
         else:
             raise BPFlowException(self.__class__.__name__, "Network name cannot be empty")
 
+    @staticmethod
+    def _slot_runs(ports):
+        """
+        Split ports to runs of consecutive ports on the same slot, BP numbers the interfaces in the reservation order
+        :param ports: [(slot, port)]
+        :return: [(slot, [port])]
+        """
+        runs = []
+        for slot, port in ports:
+            if runs and runs[-1][0] == slot:
+                runs[-1][1].append(port)
+            else:
+                runs.append((slot, [port]))
+        return runs
+
+    @staticmethod
+    def _slot_ports(ports):
+        """
+        Group ports by slot
+        :param ports: [(slot, port)]
+        :return: [(slot, [port])]
+        """
+        slot_ports = OrderedDict()
+        for slot, port in ports:
+            slot_ports.setdefault(slot, []).append(port)
+        return list(slot_ports.items())
+
     def reserve_ports(self, group, ports):
         with self._session_context_manager as rest_service:
             port_reservation = PortReservationActions(rest_service, self._logger)
-            results = []
-            for slot, port in ports:
-                result = port_reservation.reserve_port(slot, [port], group)
+            for slot, port_list in self._slot_runs(ports):
+                port_reservation.reserve_port(slot, port_list, group)
 
     def unreserve_ports(self, ports):
         with self._session_context_manager as rest_service:
             port_reservation = PortReservationActions(rest_service, self._logger)
-            results = []
-            for slot, port in ports:
-                result = port_reservation.unreserve_port(slot, [port])
+            for slot, port_list in self._slot_ports(ports):
+                port_reservation.unreserve_port(slot, port_list)
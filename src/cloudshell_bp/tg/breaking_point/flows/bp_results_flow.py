@@ -1,3 +1,6 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from cloudshell_bp.tg.breaking_point.actions.test_results_actions import TestResultsActions
 from cloudshell_bp.tg.breaking_point.flows.bp_flow import BPFlow
 
@@ -8,3 +11,40 @@ class BPResultsFlow(BPFlow):
             statistics_actions = TestResultsActions(rest_service, self._logger)
             pdf_results = statistics_actions.get_result_file(test_id, "pdf")
             return pdf_results
+
+    def download_results(self, test_id, result_format, file_object):
+        """
+        Stream result file to the file object
+        :param str result_format: pdf, csv, rtf, html, xml or zip
+        :param file_object: binary file object
+        :return: bytes written
+        :rtype: int
+        """
+        with self._session_context_manager as rest_service:
+            results_actions = TestResultsActions(rest_service, self._logger)
+            return results_actions.download_result_file(test_id, result_format, file_object)
+
+    def _timed_download(self, test_id, result_format, file_object):
+        start_time = time.time()
+        size = self.download_results(test_id, result_format, file_object)
+        return size, time.time() - start_time
+
+    def download_results_formats(self, test_id, file_objects):
+        """
+        Download several result formats concurrently, each download borrows its own pooled session
+        :param test_id:
+        :param dict file_objects: {result_format: binary file object}
+        :return: {result_format: (bytes written, seconds)}
+        :rtype: dict
+        """
+        if len(file_objects) == 1:
+            return {
+                result_format: self._timed_download(test_id, result_format, file_object)
+                for result_format, file_object in file_objects.items()
+            }
+        with ThreadPoolExecutor(max_workers=len(file_objects)) as executor:
+            futures = [
+                (result_format, executor.submit(self._timed_download, test_id, result_format, file_object))
+                for result_format, file_object in file_objects.items()
+            ]
+            return {result_format: future.result() for result_format, future in futures}
@@ -1,3 +1,6 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from cloudshell_bp.tg.breaking_point.actions.test_statistics_actions import TestStatisticsActions
 from cloudshell_bp.tg.breaking_point.flows.bp_flow import BPFlow
 
@@ -8,3 +11,18 @@ class BPStatisticsFlow(BPFlow):
             statistics_actions = TestStatisticsActions(rest_service, self._logger)
             stats = statistics_actions.get_real_time_statistics(test_id, view_name)
             return stats
+
+    def get_rt_statistics_groups(self, test_id, stats_groups):
+        """
+        Get several statistics groups concurrently, each request borrows its own pooled session
+        :param test_id:
+        :param list[str] stats_groups:
+        :return: (timestamp, {stats_group: statistics}), one timestamp for all the groups
+        :rtype: tuple
+        """
+        timestamp = time.time()
+        if len(stats_groups) == 1:
+            return timestamp, {stats_groups[0]: self.get_rt_statistics(test_id, stats_groups[0])}
+        with ThreadPoolExecutor(max_workers=len(stats_groups)) as executor:
+            futures = [(group, executor.submit(self.get_rt_statistics, test_id, group)) for group in stats_groups]
+            return timestamp, {group: future.result() for group, future in futures}
@@ -1,10 +1,13 @@
-import time
-
 from cloudshell_bp.tg.breaking_point.actions.test_execution_actions import TestExecutionActions
 from cloudshell_bp.tg.breaking_point.flows.bp_flow import BPFlow
+from cloudshell_bp.tg.breaking_point.flows.exceptions import BPFlowException
+from cloudshell_bp.tg.breaking_point.utils.adaptive_poller import AdaptivePoller
 
 
 class BPTestExecutionFlow(BPFlow):
+    INITIAL_POLL_INTERVAL = 0.5
+    MAX_POLL_INTERVAL = 30
+
     def start_traffic(self, test_name, group_id):
         with self._session_context_manager as rest_service:
             test_execution_actions = TestExecutionActions(rest_service, self._logger)
@@ -17,12 +20,42 @@ class BPTestExecutionFlow(BPFlow):
             status = test_execution_actions.stop_test(test_id)
             return status.get("result")
 
-    def block_while_test_running(self, test_id):
+    def get_test_result(self, test_id):
         with self._session_context_manager as rest_service:
             test_execution_actions = TestExecutionActions(rest_service, self._logger)
-            running = True
-            while running:
-                self._logger.debug("Test {} is running".format(test_id))
-                status = test_execution_actions.get_test_status(test_id)
-                running = "incomplete" in status
-                time.sleep(2)
+            return test_execution_actions.get_test_result(test_id)
+
+    def get_test_status(self, test_id):
+        return self.get_test_result(test_id).get("result")
+
+    @staticmethod
+    def _get_progress(test_result):
+        try:
+            return float(test_result.get("progress"))
+        except (TypeError, ValueError):
+            return None
+
+    def block_while_test_running(self, test_id, timeout=None, cancellation_context=None):
+        """
+        Wait for the test to finish, the session is taken per status request only
+        so other commands of the reservation are not blocked by the wait
+        :param test_id:
+        :param float timeout: seconds to wait, None - wait until the test finished
+        :param cancellation_context: cloudshell.shell.core.driver_context.CancellationContext
+        :return: True if the test finished, False if waiting was cancelled
+        :rtype: bool
+        """
+        poller = AdaptivePoller(
+            self.INITIAL_POLL_INTERVAL, self.MAX_POLL_INTERVAL, timeout=timeout, cancellation_context=cancellation_context
+        )
+        for _ in poller:
+            test_result = self.get_test_result(test_id)
+            if "incomplete" not in test_result.get("result"):
+                self._logger.debug("Test {} finished after {} status requests".format(test_id, poller.polls_count))
+                return True
+            poller.progress = self._get_progress(test_result)
+            self._logger.debug("Test {} is running, progress {}".format(test_id, poller.progress))
+        if poller.cancelled:
+            self._logger.info("Waiting for test {} was cancelled".format(test_id))
+            return False
+        raise BPFlowException(self.__class__.__name__, "Test {} did not finish in {} seconds".format(test_id, timeout))
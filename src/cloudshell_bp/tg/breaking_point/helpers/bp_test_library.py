@@ -0,0 +1,194 @@
+import fnmatch
+import json
+import os
+import re
+import tempfile
+
+from cloudshell_bp.tg.breaking_point.bp_exception import BPException
+from cloudshell_bp.tg.breaking_point.entities.bp_test_model import BPTestModel
+from cloudshell_bp.tg.breaking_point.helpers.upload_index import UploadIndex
+from cloudshell_bp.tg.breaking_point.utils.file_based_lock import FileBasedLock
+
+
+class BPTestLibrary(object):
+    """
+    Index of the .bpt files under Test Files Location: name, size, mtime, sha256, network name and interface numbers.
+    Only new and modified files are parsed on refresh, the index is shared by the driver processes,
+    it is updated under file lock and replaced atomically.
+    The reservation folders the test files are downloaded to are not part of the library.
+    """
+
+    INDEX_FILE = ".bp_library.json"
+    LOCK_FILE = ".bp_library.lock"
+    RESERVATION_MARKER = ".bp_reservation"
+    EXTENSION = ".bpt"
+    RESERVATION_ID = re.compile(r"^[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}$", re.IGNORECASE)
+
+    def __init__(self, location, logger):
+        """
+        :param str location: Test Files Location
+        :param logger:
+        """
+        self._location = location
+        self._logger = logger
+
+    def _lock(self):
+        return FileBasedLock(os.path.join(self._location, self.LOCK_FILE))
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self._location, self.INDEX_FILE)) as index_file:
+                return json.load(index_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self._location, suffix=".tmp")
+        with os.fdopen(file_descriptor, "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(temp_path, os.path.join(self._location, self.INDEX_FILE))
+
+    @classmethod
+    def mark_reservation_folder(cls, folder):
+        """
+        Exclude the reservation download folder from the library
+        :param str folder:
+        """
+        marker_path = os.path.join(folder, cls.RESERVATION_MARKER)
+        if not os.path.exists(marker_path):
+            open(marker_path, "a").close()
+
+    def _library_folder(self, path, folder):
+        """
+        Hidden folders and the reservation folders, marked or named by the reservation id, are skipped
+        :rtype: bool
+        """
+        if folder.startswith(".") or self.RESERVATION_ID.match(folder):
+            return False
+        return not os.path.exists(os.path.join(path, folder, self.RESERVATION_MARKER))
+
+    def _test_files(self):
+        """
+        :return: {relative path: os.stat_result} of the library test files
+        """
+        test_files = {}
+        for path, folders, files in os.walk(self._location):
+            folders[:] = [folder for folder in folders if self._library_folder(path, folder)]
+            for file_name in files:
+                if file_name.lower().endswith(self.EXTENSION):
+                    file_path = os.path.join(path, file_name)
+                    test_files[os.path.relpath(file_path, self._location)] = os.stat(file_path)
+        return test_files
+
+    def _index_file(self, relative_path, file_stat):
+        file_path = os.path.join(self._location, relative_path)
+        try:
+            test_model = BPTestModel.from_file(file_path)
+        except Exception as e:
+            self._logger.warning("Cannot read test model of {}: {}".format(file_path, e))
+            test_model = BPTestModel(None, [])
+        return {
+            "name": test_model.name or os.path.splitext(os.path.basename(relative_path))[0],
+            "path": relative_path,
+            "size": file_stat.st_size,
+            "mtime": file_stat.st_mtime,
+            "sha256": UploadIndex.file_hash(file_path),
+            "network": test_model.network_name,
+            "interfaces": test_model.interfaces,
+        }
+
+    def refresh(self):
+        """
+        Index new and modified files, forget removed ones
+        :return: entries sorted by path
+        :rtype: list[dict]
+        """
+        with self._lock():
+            index = self._read_index()
+            test_files = self._test_files()
+            updated = {}
+            for relative_path, file_stat in test_files.items():
+                entry = index.get(relative_path)
+                if not entry or entry["mtime"] != file_stat.st_mtime or entry["size"] != file_stat.st_size:
+                    entry = self._index_file(relative_path, file_stat)
+                    self._logger.debug("Indexed test file {}".format(relative_path))
+                updated[relative_path] = entry
+            if updated != index:
+                self._write_index(updated)
+        return [updated[relative_path] for relative_path in sorted(updated)]
+
+    def search(self, pattern=None):
+        """
+        :param str pattern: case insensitive substring or glob of the test name, file path or network name,
+            empty - all the tests
+        :rtype: list[dict]
+        """
+        entries = self.refresh()
+        if not pattern:
+            return entries
+        pattern = pattern.lower()
+        if not any(char in pattern for char in "*?["):
+            pattern = "*{}*".format(pattern)
+        return [
+            entry
+            for entry in entries
+            if any(fnmatch.fnmatchcase((entry[key] or "").lower(), pattern) for key in ["name", "path", "network"])
+        ]
+
+    def find(self, name):
+        """
+        Find the test by the test name or the file name without extension
+        :param str name:
+        :return: index entry
+        :rtype: dict
+        """
+        entries = self.refresh()
+        for key in ["name", "path"]:
+            matches = [entry for entry in entries if self._entry_name(entry, key) == name.lower()]
+            if len(matches) > 1:
+                raise BPException(
+                    self.__class__.__name__,
+                    "Test name {} is ambiguous: {}".format(name, ", ".join(entry["path"] for entry in matches)),
+                )
+            if matches:
+                return matches[0]
+
+    @staticmethod
+    def _entry_name(entry, key):
+        if key == "path":
+            return os.path.splitext(os.path.basename(entry["path"]))[0].lower()
+        return (entry[key] or "").lower()
+
+    def get(self, file_path):
+        """
+        Index entry of the file, refreshed if the file was modified
+        :param str file_path:
+        :return: None if the file is not in the library
+        :rtype: dict
+        """
+        relative_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(self._location))
+        if relative_path.startswith(os.pardir) or not os.path.exists(file_path):
+            return None
+        file_stat = os.stat(file_path)
+        with self._lock():
+            index = self._read_index()
+            entry = index.get(relative_path)
+            if not entry or entry["mtime"] != file_stat.st_mtime or entry["size"] != file_stat.st_size:
+                entry = index[relative_path] = self._index_file(relative_path, file_stat)
+                self._write_index(index)
+        return entry
+
+    def path(self, entry):
+        """
+        :param dict entry:
+        :return: absolute file path
+        """
+        return os.path.join(self._location, entry["path"])
+
+    @staticmethod
+    def test_model(entry):
+        """
+        :param dict entry:
+        :rtype: BPTestModel
+        """
+        return BPTestModel(entry["network"], entry["interfaces"], entry["name"])
@@ -0,0 +1,203 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+
+from cloudshell_bp.tg.breaking_point.utils.file_based_lock import FileBasedLock
+
+
+class ExportCache(object):
+    """
+    Content addressed on-disk cache of files exported from the chassis.
+    Entries are keyed by (chassis, test id or test name, format) and point to sha256 named objects,
+    least recently used entries are evicted when the objects size exceeds the limit.
+    The index is shared by the driver processes, it is updated under file lock and replaced atomically.
+    """
+
+    CACHE_DIR = ".bp_cache"
+    OBJECTS_DIR = "objects"
+    INDEX_FILE = "index.json"
+    LOCK_FILE = ".cache.lock"
+    DEFAULT_MAX_SIZE = 2 * 2**30
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, location, logger, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param str location: parent folder, Test Files Location
+        :param logger:
+        :param int max_size: bytes
+        """
+        self._path = os.path.join(location, self.CACHE_DIR)
+        self._objects_path = os.path.join(self._path, self.OBJECTS_DIR)
+        self._logger = logger
+        self._max_size = max_size
+        if not os.path.exists(self._objects_path):
+            os.makedirs(self._objects_path)
+
+    @staticmethod
+    def key(chassis, name, file_format):
+        """
+        :param str chassis: chassis address
+        :param str name: test id or test name
+        :param str file_format:
+        :rtype: str
+        """
+        return "{}|{}|{}".format(chassis, name, file_format.lower())
+
+    def _lock(self):
+        return FileBasedLock(os.path.join(self._path, self.LOCK_FILE))
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self._path, self.INDEX_FILE)) as index_file:
+                return json.load(index_file)
+        except (IOError, OSError, ValueError):
+            return {"entries": {}, "hits": 0, "misses": 0}
+
+    def _write_index(self, index):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self._path, suffix=".tmp")
+        with os.fdopen(file_descriptor, "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(temp_path, os.path.join(self._path, self.INDEX_FILE))
+
+    def _object_path(self, sha256):
+        return os.path.join(self._objects_path, sha256)
+
+    @staticmethod
+    def _objects(entries):
+        """
+        :return: {sha256: size} of the referenced objects
+        """
+        return {entry["sha256"]: entry["size"] for entry in entries.values()}
+
+    def open(self, key, max_age=None):
+        """
+        Open the cached file, the entry becomes the most recently used.
+        The file is opened under the lock so it can be read even if the entry is evicted meanwhile
+        :param str key:
+        :param float max_age: seconds since the entry was cached, older entries are dropped, None - never expire
+        :return: binary file object or None if not cached
+        """
+        cached_file = None
+        with self._lock():
+            index = self._read_index()
+            entry = index["entries"].get(key)
+            if entry and max_age is not None and time.time() - entry.get("created", 0) > max_age:
+                self._logger.debug("Cached {} expired".format(key))
+                entry = None
+            if entry:
+                try:
+                    cached_file = open(self._object_path(entry["sha256"]), "rb")
+                except (IOError, OSError):
+                    cached_file = None
+            if cached_file and os.fstat(cached_file.fileno()).st_size == entry["size"]:
+                entry["last_access"] = time.time()
+                index["hits"] += 1
+            else:
+                if cached_file:
+                    cached_file.close()
+                    cached_file = None
+                dropped = index["entries"].pop(key, None)
+                if dropped and dropped["sha256"] not in self._objects(index["entries"]):
+                    self._remove_object(dropped["sha256"])
+                index["misses"] += 1
+            self._write_index(index)
+        self._logger.debug("Cache {} for {}".format("hit" if cached_file else "miss", key))
+        return cached_file
+
+    def put_file(self, key, file_object):
+        """
+        Copy file object content to the cache, the object is written to a temporary file and renamed,
+        identical content is stored once
+        :param str key:
+        :param file_object: binary file object, read from the current position
+        :return: cached file path
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self._objects_path, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "wb") as temp_file:
+                for chunk in iter(lambda: file_object.read(self.CHUNK_SIZE), b""):
+                    sha256.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+            path = self._object_path(sha256.hexdigest())
+            with self._lock():
+                if not os.path.exists(path):
+                    os.replace(temp_path, path)
+                index = self._read_index()
+                replaced = index["entries"].get(key)
+                now = time.time()
+                index["entries"][key] = {"sha256": sha256.hexdigest(), "size": size, "created": now, "last_access": now}
+                if replaced and replaced["sha256"] not in self._objects(index["entries"]):
+                    self._remove_object(replaced["sha256"])
+                self._evict(index, keep=key)
+                self._write_index(index)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._logger.debug("Cached {} bytes of {} as {}".format(size, key, sha256.hexdigest()))
+        return path
+
+    def put(self, key, data):
+        """
+        :param str key:
+        :param bytes data:
+        :return: cached file path
+        """
+        return self.put_file(key, io.BytesIO(data))
+
+    def _remove_object(self, sha256):
+        try:
+            os.remove(self._object_path(sha256))
+        except OSError as e:
+            self._logger.debug("Failed to remove cached object {}: {}".format(sha256, e))
+
+    def _evict(self, index, keep=None):
+        """
+        Remove least recently used entries and not referenced objects until the size fits the limit
+        """
+        entries = index["entries"]
+        total_size = sum(self._objects(entries).values())
+        for key in sorted(entries, key=lambda entry_key: entries[entry_key]["last_access"]):
+            if total_size <= self._max_size:
+                break
+            if key == keep:
+                continue
+            entry = entries.pop(key)
+            if entry["sha256"] not in self._objects(entries):
+                total_size -= entry["size"]
+                self._remove_object(entry["sha256"])
+            self._logger.debug("Evicted {} from cache".format(key))
+
+    def clear(self):
+        """
+        Remove all the entries, hit statistics are kept
+        """
+        with self._lock():
+            index = self._read_index()
+            for file_name in os.listdir(self._objects_path):
+                if not file_name.endswith(".tmp"):
+                    self._remove_object(file_name)
+            index["entries"] = {}
+            self._write_index(index)
+
+    def statistics(self):
+        """
+        :return: entries, size, max_size, hits, misses and hit_ratio
+        :rtype: dict
+        """
+        with self._lock():
+            index = self._read_index()
+        requests_count = index["hits"] + index["misses"]
+        return {
+            "entries": len(index["entries"]),
+            "size": sum(self._objects(index["entries"]).values()),
+            "max_size": self._max_size,
+            "hits": index["hits"],
+            "misses": index["misses"],
+            "hit_ratio": float(index["hits"]) / requests_count if requests_count else None,
+        }
@@ -0,0 +1,107 @@
+import time
+from collections import deque
+from threading import Condition, Lock
+
+
+class GroupAllocator(object):
+    """
+    Reservation group leases of the chassis. A reservation keeps its group between the loads,
+    groups leased to other reservations are not allocated, and when all the groups are busy
+    the reservations wait for a released group in FIFO order
+    """
+
+    POLL_INTERVAL = 5
+    _allocators = {}
+    _allocators_lock = Lock()
+
+    def __init__(self):
+        self._leases = {}
+        self._queue = deque()
+        self._condition = Condition()
+
+    @classmethod
+    def for_chassis(cls, chassis):
+        """
+        :param str chassis: chassis address
+        :rtype: GroupAllocator
+        """
+        with cls._allocators_lock:
+            return cls._allocators.setdefault(chassis, cls())
+
+    def leases(self):
+        """
+        :return: {reservation id: group id}
+        :rtype: dict
+        """
+        with self._condition:
+            return dict(self._leases)
+
+    def waiting(self):
+        """
+        :return: reservation ids waiting for a group in the queue order
+        :rtype: list[str]
+        """
+        with self._condition:
+            return list(self._queue)
+
+    def choose(self, owner, free_groups):
+        """
+        Choose the group among the groups free on the chassis: the owner's leased group,
+        then the lowest free group if no reservation is waiting ahead of the owner.
+        Leases of other reservations on the free groups are dropped, their ports were unreserved outside the driver
+        or their sandbox ended without releasing the group
+        :param str owner: reservation id
+        :param list[int] free_groups: sorted group ids without reserved ports
+        :return: group id or None if the owner has to wait
+        """
+        with self._condition:
+            stale_owners = [
+                lease_owner
+                for lease_owner, group_id in self._leases.items()
+                if lease_owner != owner and group_id in free_groups
+            ]
+            for lease_owner in stale_owners:
+                del self._leases[lease_owner]
+            if stale_owners:
+                self._condition.notify_all()
+            own_group = self._leases.get(owner)
+            if own_group in free_groups:
+                return own_group
+            if self._queue and self._queue[0] != owner:
+                return None
+            return free_groups[0] if free_groups else None
+
+    def lease(self, owner, group_id):
+        with self._condition:
+            self._leases[owner] = group_id
+
+    def release(self, owner):
+        """
+        Release the owner's group and wake up the waiting reservations
+        """
+        with self._condition:
+            if self._leases.pop(owner, None) is not None:
+                self._condition.notify_all()
+
+    def wait(self, owner, deadline):
+        """
+        Queue the owner and wait for a released group, groups released by other driver processes are polled
+        :param str owner: reservation id
+        :param float deadline: time to stop waiting
+        :return: False if the deadline passed
+        :rtype: bool
+        """
+        with self._condition:
+            if owner not in self._queue:
+                self._queue.append(owner)
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            self._condition.wait(min(remaining, self.POLL_INTERVAL))
+            return True
+
+    def dequeue(self, owner):
+        with self._condition:
+            if owner in self._queue:
+                self._queue.remove(owner)
+                self._condition.notify_all()
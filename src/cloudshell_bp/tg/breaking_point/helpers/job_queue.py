@@ -0,0 +1,150 @@
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+
+
+class Job(object):
+    QUEUED = "queued"
+    RUNNING = "running"
+    RETRYING = "retrying"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    def __init__(self, key, description, function, owner=None):
+        """
+        :param key: identical jobs have the same key
+        :param str description:
+        :param function: callable without arguments, returns the job result
+        :param str owner: reservation id
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.description = description
+        self.owner = owner
+        self.function = function
+        self.status = self.QUEUED
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.done = Event()
+
+    @property
+    def active(self):
+        return self.status in [self.QUEUED, self.RUNNING, self.RETRYING]
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "description": self.description,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class JobQueue(object):
+    """
+    Background jobs of the driver process, failed jobs are retried with exponential backoff,
+    identical active jobs are submitted once
+    """
+
+    DEFAULT_WORKERS = 2
+    DEFAULT_ATTEMPTS = 3
+    INITIAL_BACKOFF = 5
+    MAX_BACKOFF = 60
+    MAX_FINISHED_JOBS = 100
+
+    def __init__(
+        self, workers=DEFAULT_WORKERS, attempts=DEFAULT_ATTEMPTS, initial_backoff=INITIAL_BACKOFF, max_backoff=MAX_BACKOFF
+    ):
+        """
+        :param int workers: concurrent jobs
+        :param int attempts: attempts per job
+        :param float initial_backoff: seconds before the first retry, doubled for the next ones
+        :param float max_backoff: seconds
+        """
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bp-job")
+        self._attempts = attempts
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+        self._jobs = OrderedDict()
+        self._lock = Lock()
+
+    def submit(self, key, description, function, logger, owner=None):
+        """
+        Queue the job, active job with the same key is returned instead of a new one
+        :param key: hashable job identity
+        :param str description:
+        :param function: callable without arguments
+        :param logger:
+        :param str owner: reservation id
+        :rtype: Job
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.key == key and job.active:
+                    logger.debug("Job {} is already {}".format(job.id, job.status))
+                    return job
+            job = Job(key, description, function, owner)
+            self._executor.submit(self._run, job, logger)
+            self._jobs[job.id] = job
+            self._remove_finished()
+        logger.info("Job {} queued: {}".format(job.id, description))
+        return job
+
+    def _remove_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[: max(len(finished) - self.MAX_FINISHED_JOBS, 0)]:
+            del self._jobs[job_id]
+
+    def _run(self, job, logger):
+        backoff = self._initial_backoff
+        while True:
+            job.status = Job.RUNNING
+            job.attempts += 1
+            try:
+                job.result = job.function()
+                job.status = Job.COMPLETED
+                logger.info("Job {} completed: {}".format(job.id, job.result))
+                break
+            except Exception as e:
+                job.error = str(e)
+                if job.attempts >= self._attempts:
+                    job.status = Job.FAILED
+                    logger.exception("Job {} failed after {} attempts".format(job.id, job.attempts))
+                    break
+                job.status = Job.RETRYING
+                logger.warning("Job {} attempt {} failed: {}, retry in {}s".format(job.id, job.attempts, e, backoff))
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+        job.finished = time.time()
+        job.done.set()
+
+    def get(self, job_id):
+        """
+        :rtype: Job
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, owner=None):
+        """
+        :param str owner: jobs of the reservation, None - all the jobs
+        :rtype: list[Job]
+        """
+        with self._lock:
+            return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def shutdown(self):
+        """
+        Release the worker threads once the submitted jobs are done, called on the driver teardown.
+        The queue does not accept jobs after it
+        """
+        self._executor.shutdown(wait=False)
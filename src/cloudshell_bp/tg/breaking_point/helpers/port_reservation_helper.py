@@ -1,14 +1,17 @@
-from collections import defaultdict
+import time
 
 from cloudshell_bp.tg.breaking_point.bp_exception import BPException
 from cloudshell_bp.tg.breaking_point.helpers.bp_cs_reservation_details import BPCSReservationDetails
+from cloudshell_bp.tg.breaking_point.helpers.group_allocator import GroupAllocator
+from cloudshell_bp.tg.breaking_point.helpers.port_state_snapshot import PortStateSnapshot
 from cloudshell_bp.tg.breaking_point.utils.file_based_lock import FileBasedLock
 
 
 class PortReservationHelper(object):
     GROUP_MIN = 1
     GROUP_MAX = 12
-    LOCK_FILE = ".port_reservation.lock"
+    LOCK_NAME = "port_reservation"
+    LOCK_TIMEOUT = 600
 
     def __init__(self, reservation_flow, cs_reservation_details, logger):
         """
@@ -20,56 +23,58 @@ class PortReservationHelper(object):
         self._logger = logger
         self._cs_reservation_details = cs_reservation_details
 
-    def _get_groups_info(self):
+    def _get_port_state(self):
         """
-        Collect information regarding used groups
-        :return:
+        Port reservation state snapshot
+        :rtype: PortStateSnapshot
         """
-        groups_info = defaultdict(list)
-        for port_info in self._reservation_flow.port_status():
-            group_id = port_info.get("group")
-            if group_id is not None:
-                groups_info[int(group_id)].append((port_info["slot"], port_info["port"]))
-        return groups_info
+        return PortStateSnapshot.from_flow(self._reservation_flow)
 
-    def _find_not_used_group_id(self):
+    def _find_not_used_group_id(self, port_state, owner=None, allocator=None):
         """
         Find not used group id
-        :return:
+        :type port_state: PortStateSnapshot
+        :param str owner: reservation id
+        :type allocator: GroupAllocator
+        :return: group id or None if the owner has to wait for a free group
         """
-        available_groups = list(
-            set([i for i in range(self.GROUP_MIN, self.GROUP_MAX + 1)]) - set(self._get_groups_info().keys())
-        )
-        if len(available_groups) > 0:
-            group_id = sorted(available_groups)[0]
-        else:
-            raise BPException(self.__class__.__name__, "Cannot find unused group id")
-        return group_id
+        available_groups = port_state.free_groups(self.GROUP_MIN, self.GROUP_MAX)
+        if allocator:
+            return allocator.choose(owner, available_groups)
+        return available_groups[0] if available_groups else None
 
-    def _find_used_ports(self, port_order):
+    def _find_used_ports(self, port_order, port_state):
         """
         Find port usage
         :param port_order:
+        :type port_state: PortStateSnapshot
         :return:
         """
-        used_ports = []
-        groups_info = self._get_groups_info()
-        port_order_set = set(port_order)
-        for ports in groups_info.values():
-            used_ports_set = set(ports) & port_order_set
-            used_ports.extend(list(used_ports_set))
-        return used_ports
+        return port_state.used_ports(port_order)
 
-    def _build_reservation_order(self, network_name, interfaces):
+    def get_test_interfaces(self, network_name):
         """
-        Associate BP interfaces with CS ports and build reservation order
+        BP interfaces of the test network
         :param network_name:
-        :param interfaces:
-        :return:
+        :return: {interface number: logical name}
+        """
+        return self._reservation_flow.get_interfaces(network_name) if network_name else {}
+
+    def get_cs_reserved_ports(self):
+        """
+        Chassis ports of the CS reservation
+        :return: {logical name: (slot, port)}
         """
-        bp_test_interfaces = self._reservation_flow.get_interfaces(network_name) if network_name else {}
-        cs_reserved_ports = self._cs_reservation_details.get_chassis_ports()
+        return self._cs_reservation_details.get_chassis_ports()
 
+    def build_reservation_order(self, interfaces, bp_test_interfaces, cs_reserved_ports):
+        """
+        Associate BP interfaces with CS ports and build reservation order
+        :param interfaces: test interface numbers
+        :param dict bp_test_interfaces: {interface number: logical name}
+        :param dict cs_reserved_ports: {logical name: (slot, port)}
+        :return:
+        """
         reservation_order = []
         self._logger.debug("CS reserved ports {}".format(cs_reserved_ports))
         self._logger.debug("BP test interfaces {}".format(bp_test_interfaces))
@@ -84,36 +89,115 @@ class PortReservationHelper(object):
                 )
         return reservation_order
 
-    def reserve_ports(self, network_name, interfaces, bp_session):
+    def _find_kept_group_id(self, bp_session, port_state):
         """
-        Reserve ports
+        Session group is kept if the chassis reports exactly the session ports in it
         :type bp_session: cloudshell.tg.breaking_point.entities.bp_session.BPSession
-        :param network_name:
-        :param interfaces:
-        :return:
+        :type port_state: PortStateSnapshot
+        :return: group id or None
         """
+        group_id = bp_session.reservation_group
+        if group_id is None or not bp_session.reserved_ports:
+            return None
+        if set(port_state.groups_info().get(group_id, [])) != set(bp_session.reserved_ports):
+            self._logger.debug("Ports of group {} were changed outside the session".format(group_id))
+            return None
+        return group_id
 
-        reservation_order = self._build_reservation_order(network_name, interfaces)
+    @staticmethod
+    def _common_prefix_length(reserved_ports, reservation_order):
+        """
+        BP numbers the interfaces in the reservation order, so only the common prefix can be kept
+        """
+        length = 0
+        for reserved_port, port in zip(reserved_ports, reservation_order):
+            if tuple(reserved_port) != tuple(port):
+                break
+            length += 1
+        return length
 
-        # Unreserve used ports and reserve new port order
-        with FileBasedLock(self.LOCK_FILE):
-            self.unreserve_ports(bp_session)
-            used_ports = self._find_used_ports(reservation_order)
+    def reserve_reservation_order(self, reservation_order, bp_session, group_wait_timeout=0):
+        """
+        Reserve new port order, the ports and the group already reserved by the session in the same order are kept
+        and only the difference is released and reserved.
+        When all the groups are busy the reservation waits in the queue for a released group
+        :param list reservation_order: [(slot, port)] in the test interfaces order
+        :type bp_session: cloudshell.tg.breaking_point.entities.bp_session.BPSession
+        :param float group_wait_timeout: seconds to wait for a free group
+        :return:
+        """
+        chassis = self._reservation_flow.hostname
+        allocator = GroupAllocator.for_chassis(chassis)
+        owner = bp_session.cs_reservation_id
+        deadline = time.time() + group_wait_timeout
+        try:
+            while True:
+                with FileBasedLock.for_chassis(self.LOCK_NAME, chassis, self.LOCK_TIMEOUT, self._logger):
+                    if self._reserve_reservation_order(reservation_order, bp_session, allocator):
+                        return bp_session
+                self._logger.info("All groups are busy, waiting for a free group")
+                if not allocator.wait(owner, deadline):
+                    raise BPException(
+                        self.__class__.__name__,
+                        "Cannot find unused group id, all groups are busy for {}s".format(group_wait_timeout),
+                    )
+        finally:
+            allocator.dequeue(owner)
+
+    def _reserve_reservation_order(self, reservation_order, bp_session, allocator):
+        """
+        Reservation transaction, runs under the chassis lock.
+        The group is chosen on the port state planned with the releases of the transaction
+        and leased before any port is unreserved, so a waiting reservation does not release ports
+        :type allocator: GroupAllocator
+        :return: False if there is no free group
+        """
+        owner = bp_session.cs_reservation_id
+        port_state = self._get_port_state()
+        group_id = self._find_kept_group_id(bp_session, port_state)
+        if group_id is None:
+            kept_ports = 0
+            planned_state = port_state.copy()
+            planned_state.unreserved(bp_session.reserved_ports)
+            planned_state.unreserved(reservation_order)
+            group_id = self._find_not_used_group_id(planned_state, owner, allocator)
+            if group_id is None:
+                return False
+            allocator.lease(owner, group_id)
+            self.unreserve_ports(bp_session, port_state, release_group=False)
+        else:
+            kept_ports = self._common_prefix_length(bp_session.reserved_ports, reservation_order)
+            released_ports = bp_session.reserved_ports[kept_ports:]
+            if released_ports:
+                self._reservation_flow.unreserve_ports(released_ports)
+                port_state.unreserved(released_ports)
+        acquired_ports = reservation_order[kept_ports:]
+        used_ports = self._find_used_ports(acquired_ports, port_state)
+        if used_ports:
             self._reservation_flow.unreserve_ports(used_ports)
-            group_id = self._find_not_used_group_id()
-            self._reservation_flow.reserve_ports(group_id, reservation_order)
-            bp_session.reservation_group = group_id
-            bp_session.reserved_ports = reservation_order
-            return bp_session
+            port_state.unreserved(used_ports)
+        if acquired_ports:
+            self._reservation_flow.reserve_ports(group_id, acquired_ports)
+            port_state.reserved(group_id, acquired_ports)
+        allocator.lease(owner, group_id)
+        self._logger.info("Group {}: kept {} ports, reserved {} ports".format(group_id, kept_ports, len(acquired_ports)))
+        bp_session.reservation_group = group_id
+        bp_session.reserved_ports = reservation_order
+        return True
 
-    def unreserve_ports(self, bp_session):
+    def unreserve_ports(self, bp_session, port_state=None, release_group=True):
         """
         Unreserve ports
         :type bp_session: cloudshell.tg.breaking_point.entities.bp_session.BPSession
-
+        :param PortStateSnapshot port_state: snapshot of the reservation transaction to update
+        :param bool release_group: release the group lease of the reservation
         """
         bp_session.reservation_group = None
+        if release_group:
+            GroupAllocator.for_chassis(self._reservation_flow.hostname).release(bp_session.cs_reservation_id)
         if bp_session.reserved_ports:
             self._reservation_flow.unreserve_ports(bp_session.reserved_ports)
+            if port_state:
+                port_state.unreserved(bp_session.reserved_ports)
             bp_session.reserved_ports = None
         return bp_session
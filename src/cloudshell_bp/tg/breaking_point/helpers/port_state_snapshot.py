@@ -0,0 +1,67 @@
+from collections import OrderedDict, defaultdict
+
+
+class PortStateSnapshot(object):
+    """
+    Port reservation state fetched once per reservation transaction and updated locally
+    by the ports unreserved and reserved in the transaction
+    """
+
+    def __init__(self, ports_info):
+        """
+        :param list[dict] ports_info: port status entries with slot, port and group keys
+        """
+        self._groups = OrderedDict()
+        for port_info in ports_info:
+            group_id = port_info.get("group")
+            self._groups[(port_info["slot"], port_info["port"])] = int(group_id) if group_id is not None else None
+
+    @classmethod
+    def from_flow(cls, reservation_flow):
+        """
+        :type reservation_flow: cloudshell_bp.tg.breaking_point.flows.bp_port_reservation_flow.BPPortReservationFlow
+        :rtype: PortStateSnapshot
+        """
+        return cls(reservation_flow.port_status())
+
+    def copy(self):
+        """
+        Snapshot to plan the transaction on without changing this one
+        :rtype: PortStateSnapshot
+        """
+        port_state = PortStateSnapshot([])
+        port_state._groups = OrderedDict(self._groups)
+        return port_state
+
+    def groups_info(self):
+        """
+        :return: {group id: [(slot, port)]}
+        """
+        groups_info = defaultdict(list)
+        for port, group_id in self._groups.items():
+            if group_id is not None:
+                groups_info[group_id].append(port)
+        return groups_info
+
+    def used_ports(self, ports):
+        """
+        :param ports: [(slot, port)]
+        :return: ports reserved by any group
+        """
+        return [port for port in ports if self._groups.get(tuple(port)) is not None]
+
+    def free_groups(self, group_min, group_max):
+        """
+        :return: sorted group ids without reserved ports
+        :rtype: list[int]
+        """
+        used_groups = set(self.groups_info())
+        return [group_id for group_id in range(group_min, group_max + 1) if group_id not in used_groups]
+
+    def unreserved(self, ports):
+        for port in ports or []:
+            self._groups[tuple(port)] = None
+
+    def reserved(self, group_id, ports):
+        for port in ports:
+            self._groups[tuple(port)] = group_id
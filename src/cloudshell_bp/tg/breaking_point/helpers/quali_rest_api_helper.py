@@ -1,7 +1,76 @@
+import time
+from collections import OrderedDict
+from threading import Lock, RLock
+
+from cloudshell_bp.tg.breaking_point.rest_api.multipart_stream import MultipartFileStream
 from cloudshell_bp.tg.breaking_point.rest_api.rest_json_client import RestJsonClient
 
 
+class QualiAPISession(object):
+    """
+    Authenticated Quali API client shared by the helpers of one server, domain and credentials,
+    the client re-login handler is bound to the session once
+    """
+
+    def __init__(self, server_name, domain):
+        self.client = RestJsonClient(server_name, False)
+        self.domain = domain
+        self.lock = RLock()
+        self.credentials = None
+        self.login_time = None
+        self.logins = 0
+        self.logger = None
+        self.client.set_unauthorized_handler(self._relogin)
+
+    def authenticated(self, credentials, token_ttl):
+        """
+        :param tuple credentials: (token, username, password)
+        :param float token_ttl: seconds
+        :rtype: bool
+        """
+        return self.login_time is not None and self.credentials == credentials and time.time() - self.login_time < token_ttl
+
+    def login(self, credentials, logger, token_ttl, force=False):
+        """
+        Login, the token is reused until it expires
+        :param tuple credentials: (token, username, password)
+        :param logger:
+        :param float token_ttl: seconds
+        :param bool force: login even if the session is authenticated
+        """
+        with self.lock:
+            if not force and self.authenticated(credentials, token_ttl):
+                return
+            token, username, password = credentials
+            if token:
+                json_data = {"token": token, "domain": self.domain}
+            else:
+                json_data = {"username": username, "password": password, "domain": self.domain}
+            result = self.client.request_put("API/Auth/Login", json_data)
+            self.client.session.headers.update(authorization="Basic {0}".format(result.replace('"', "")))
+            self.credentials = credentials
+            self.login_time = time.time()
+            self.logins += 1
+            self.logger = logger
+            logger.debug("Logged in to Quali API {}, login {}".format(self.client.hostname, self.logins))
+
+    def _relogin(self):
+        """
+        Unauthorized handler of the client, the token rejected in several threads is renewed once
+        """
+        login_time = self.login_time
+        with self.lock:
+            if self.credentials is None or self.login_time != login_time:
+                return
+            self.login(self.credentials, self.logger, None, force=True)
+
+
 class QualiAPIHelper(object):
+    TOKEN_TTL = 1800
+    MAX_SESSIONS = 16
+    _sessions = OrderedDict()
+    _sessions_lock = Lock()
+
     def __init__(self, server_name, logger, username=None, password=None, token=None, domain=None):
         self._server_name = server_name
         if ":" not in self._server_name:
@@ -11,36 +80,78 @@ class QualiAPIHelper(object):
         self._username = username
         self._password = password
         self._token = token
-        self.__rest_client = RestJsonClient(self._server_name, False)
+        self.__session = self._get_session(self._server_name, self._domain, (token, username, password))
+        self.__rest_client = self.__session.client
+
+    @classmethod
+    def _get_session(cls, server_name, domain, credentials):
+        """
+        Session of the credentials, commands with different admin tokens do not re-login each other's session.
+        The least recently used sessions are dropped above MAX_SESSIONS
+        :param tuple credentials: (token, username, password)
+        :rtype: QualiAPISession
+        """
+        key = (server_name, domain, credentials)
+        with cls._sessions_lock:
+            session = cls._sessions.get(key)
+            if session:
+                cls._sessions.move_to_end(key)
+                return session
+            session = cls._sessions[key] = QualiAPISession(server_name, domain)
+            while len(cls._sessions) > cls.MAX_SESSIONS:
+                cls._sessions.popitem(last=False)
+            return session
+
+    @property
+    def session(self):
+        return self.__session
 
     def upload_file(self, reservation_id, file_stream, file_name):
         # self.remove_attached_files(reservation_id)
         self.attach_new_file(reservation_id, file_stream, file_name)
 
-    def login(self):
+    def login(self, force=False):
         """
-        Login
+        Login, the token of the shared session is reused until it expires
+        :param bool force: login even if the session is authenticated
         :return:
         """
-        uri = "API/Auth/Login"
-        if self._token:
-            json_data = {"token": self._token, "domain": self._domain}
-        else:
-            json_data = {"username": self._username, "password": self._password, "domain": self._domain}
-        result = self.__rest_client.request_put(uri, json_data)
-        self.__rest_client.session.headers.update(authorization="Basic {0}".format(result.replace('"', "")))
+        self.__session.login((self._token, self._username, self._password), self._logger, self.TOKEN_TTL, force)
 
     def attach_new_file(self, reservation_id, file_data, file_name):
-        file_to_upload = {"QualiPackage": file_data}
+        """
+        :param file_data: bytes or seekable binary file object, file object is streamed from the current position
+        """
+        self.login()
         data = {
             "reservationId": reservation_id,
             "saveFileAs": file_name,
             "overwriteIfExists": "true",
         }
+        if hasattr(file_data, "read"):
+            body = MultipartFileStream(data, "QualiPackage", file_data, file_name)
+            self.__rest_client.request_post_stream("API/Package/AttachFileToReservation", body, body.content_type)
+            return
+        file_to_upload = {"QualiPackage": file_data}
 
         self.__rest_client.request_post_files("API/Package/AttachFileToReservation", data=data, files=file_to_upload)
 
+    def attach_files(self, reservation_id, files):
+        """
+        Attach several files over the shared authenticated session
+        :param reservation_id:
+        :param list[tuple] files: [(file name, bytes or binary file object)]
+        :return: attached file names
+        :rtype: list[str]
+        """
+        attached = []
+        for file_name, file_data in files:
+            self.attach_new_file(reservation_id, file_data, file_name)
+            attached.append(file_name)
+        return attached
+
     def get_attached_files(self, reservation_id):
+        self.login()
         uri = "API/Package/GetReservationAttachmentsDetails/{0}".format(reservation_id)
         result = self.__rest_client.request_get(uri)
         return result["AllAttachments"]
@@ -0,0 +1,154 @@
+import time
+from collections import deque
+from threading import Event, Lock, Thread
+
+from cloudshell_bp.tg.breaking_point.statistics.columnar_store import ColumnarStatisticsStore
+
+
+class StatisticsSampler(object):
+    """
+    Background RTS sampler, polls statistics groups of the running test into bounded in-memory ring buffer,
+    the whole history is kept in compact columnar store
+    """
+
+    DEFAULT_INTERVAL = 1
+    DEFAULT_BUFFER_SIZE = 3600
+    MAX_ERRORS = 5
+
+    def __init__(
+        self,
+        statistics_flow,
+        test_id,
+        stats_groups,
+        logger,
+        interval=DEFAULT_INTERVAL,
+        buffer_size=DEFAULT_BUFFER_SIZE,
+        threshold_engine=None,
+        on_hard_failure=None,
+    ):
+        """
+        :type statistics_flow: cloudshell_bp.tg.breaking_point.flows.bp_statistics_flow.BPStatisticsFlow
+        :param test_id:
+        :param list[str] stats_groups:
+        :param logger:
+        :param float interval: seconds between samples
+        :param int buffer_size: samples kept per statistics group
+        :type threshold_engine: cloudshell_bp.tg.breaking_point.statistics.thresholds.ThresholdEngine
+        :param on_hard_failure: called with the failed rules from the sampler thread, sampling stops afterwards,
+            the error raised by it is kept in hard_failure_error
+        """
+        self._statistics_flow = statistics_flow
+        self._test_id = test_id
+        self._stats_groups = [group.lower() for group in stats_groups]
+        self._logger = logger
+        self._interval = interval
+        self._buffer = deque(maxlen=buffer_size)
+        self._buffer_lock = Lock()
+        self._store = ColumnarStatisticsStore()
+        self._stop_event = Event()
+        self.threshold_engine = threshold_engine
+        self._on_hard_failure = on_hard_failure
+        self.hard_failure_error = None
+        self._thread = None
+        self.samples_count = 0
+
+    @property
+    def test_id(self):
+        return self._test_id
+
+    @property
+    def stats_groups(self):
+        return list(self._stats_groups)
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self):
+        self._logger.debug("Start sampling {} of test {} every {}s".format(self._stats_groups, self._test_id, self._interval))
+        self._thread = Thread(target=self._run, name="rts-{}".format(self._test_id))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, wait=True):
+        self._stop_event.set()
+        if wait and self._thread and self._thread.is_alive():
+            self._thread.join(self._interval + 30)
+
+    def _sample(self):
+        sample = self._statistics_flow.get_rt_statistics_groups(self._test_id, self._stats_groups)
+        with self._buffer_lock:
+            self._buffer.append(sample)
+            self._store.append_groups(*sample)
+        self.samples_count += 1
+        if self.threshold_engine:
+            failed_rules = self.threshold_engine.evaluate(*sample)
+            if failed_rules:
+                self._logger.info(
+                    "Test {} failed thresholds {}".format(self._test_id, ", ".join(str(rule) for rule in failed_rules))
+                )
+                if self._on_hard_failure:
+                    self._stop_event.set()
+                    try:
+                        self._on_hard_failure(failed_rules)
+                    except Exception as e:
+                        self._logger.error("Hard threshold failure handler of test {} failed: {}".format(self._test_id, e))
+                        self.hard_failure_error = e
+
+    def _run(self):
+        errors = 0
+        while not self._stop_event.is_set():
+            start_time = time.time()
+            try:
+                self._sample()
+                errors = 0
+            except Exception as e:
+                errors += 1
+                self._logger.debug("Failed to sample RTS of test {}: {}".format(self._test_id, e))
+                if errors >= self.MAX_ERRORS:
+                    self._logger.info("Stop sampling RTS of test {} after {} failures".format(self._test_id, errors))
+                    break
+            self._stop_event.wait(max(self._interval - (time.time() - start_time), 0))
+        self._logger.debug("RTS sampler of test {} stopped after {} samples".format(self._test_id, self.samples_count))
+
+    def history(self, interval=None):
+        """
+        Columnar copy of all the collected samples
+        :param float interval: downsample to interval buckets with min, max and mean values, None - all samples
+        :rtype: ColumnarStatisticsStore
+        """
+        with self._buffer_lock:
+            if interval:
+                return self._store.downsample(interval)
+            return self._store.copy()
+
+    def samples(self, stats_groups):
+        """
+        Check that all the groups are sampled
+        :param list[str] stats_groups:
+        :rtype: bool
+        """
+        return all(group.lower() in self._stats_groups for group in stats_groups)
+
+    @staticmethod
+    def _select(sample, stats_groups):
+        timestamp, stats = sample
+        return timestamp, {group: stats[group.lower()] for group in stats_groups}
+
+    def latest(self, stats_groups):
+        """
+        Last sample of the groups
+        :param list[str] stats_groups:
+        :return: (timestamp, {stats_group: statistics}) or None
+        """
+        with self._buffer_lock:
+            return self._select(self._buffer[-1], stats_groups) if self._buffer else None
+
+    def series(self, stats_groups):
+        """
+        All buffered samples of the groups, oldest first
+        :param list[str] stats_groups:
+        :rtype: list[tuple]
+        """
+        with self._buffer_lock:
+            return [self._select(sample, stats_groups) for sample in self._buffer]
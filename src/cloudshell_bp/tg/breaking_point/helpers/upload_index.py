@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from cloudshell_bp.tg.breaking_point.utils.file_based_lock import FileBasedLock
+
+
+class UploadIndex(object):
+    """
+    Index of the test files imported to the chassis, sha256 of the file content -> imported test name.
+    Identical files loaded again are not uploaded.
+    The index of the chassis is shared by the driver processes, it is updated under the chassis file lock
+    and replaced atomically
+    """
+
+    NAME = "upload_index"
+    CHUNK_SIZE = 64 * 1024
+    LOCK_TIMEOUT = 60
+
+    def __init__(self, chassis, logger=None):
+        """
+        :param str chassis: chassis address
+        :param logger:
+        """
+        self._chassis = chassis
+        self._logger = logger
+        self._path = FileBasedLock.chassis_path(self.NAME, chassis, "json")
+
+    @classmethod
+    def file_hash(cls, file_path):
+        """
+        :param str file_path:
+        :return: sha256 hex digest
+        :rtype: str
+        """
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as test_file:
+            for chunk in iter(lambda: test_file.read(cls.CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def _lock(self):
+        return FileBasedLock.for_chassis(self.NAME, self._chassis, self.LOCK_TIMEOUT, self._logger)
+
+    def _read(self):
+        """
+        :return: {sha256: test name}
+        :rtype: dict
+        """
+        try:
+            with open(self._path) as index_file:
+                return json.load(index_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write(self, tests):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(self._path), suffix=".tmp")
+        with os.fdopen(file_descriptor, "w") as index_file:
+            json.dump(tests, index_file)
+        os.replace(temp_path, self._path)
+
+    def get(self, sha256):
+        """
+        :param str sha256:
+        :return: imported test name or None
+        """
+        with self._lock():
+            return self._read().get(sha256)
+
+    def add(self, sha256, test_name):
+        """
+        Register imported file, the test name imported from other content is forgotten as it was overwritten
+        :param str sha256:
+        :param str test_name:
+        """
+        with self._lock():
+            tests = {file_hash: name for file_hash, name in self._read().items() if name != test_name}
+            tests[sha256] = test_name
+            self._write(tests)
+
+    def invalidate(self):
+        """
+        Forget the files imported to the chassis, e.g. after the chassis reboot
+        :return: number of forgotten files
+        :rtype: int
+        """
+        with self._lock():
+            tests = self._read()
+            if tests:
+                os.remove(self._path)
+            return len(tests)
@@ -0,0 +1,91 @@
+import io
+import os
+import uuid
+
+
+class MultipartFileStream(object):
+    """
+    multipart/form-data body read from the form fields and one file object on demand,
+    the file is never loaded to memory. Used as requests data, Content-Length is taken from len()
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, fields, file_field, file_object, file_name=None, content_type="application/octet-stream"):
+        """
+        :param dict fields: form fields {name: value}
+        :param str file_field: file form field name
+        :param file_object: seekable binary file object, read from the current position
+        :param str file_name: file name in the form, file field name by default
+        :param str content_type: file content type
+        """
+        self.boundary = uuid.uuid4().hex
+        self._file_object = file_object
+        self._file_start = file_object.tell()
+        self._file_size = file_object.seek(0, os.SEEK_END) - self._file_start
+        file_object.seek(self._file_start)
+
+        preamble = io.BytesIO()
+        for name, value in fields.items():
+            preamble.write(self._part_header(name))
+            preamble.write(b"\r\n\r\n")
+            preamble.write(str(value).encode("utf-8"))
+            preamble.write(b"\r\n")
+        preamble.write(self._part_header(file_field, file_name or file_field))
+        preamble.write("\r\nContent-Type: {}\r\n\r\n".format(content_type).encode("utf-8"))
+        self._preamble = preamble.getvalue()
+        self._epilogue = "\r\n--{}--\r\n".format(self.boundary).encode("utf-8")
+        self._position = 0
+
+    def _part_header(self, name, file_name=None):
+        header = '--{}\r\nContent-Disposition: form-data; name="{}"'.format(self.boundary, name)
+        if file_name is not None:
+            header += '; filename="{}"'.format(file_name)
+        return header.encode("utf-8")
+
+    @property
+    def content_type(self):
+        return "multipart/form-data; boundary={}".format(self.boundary)
+
+    def __len__(self):
+        return len(self._preamble) + self._file_size + len(self._epilogue)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """
+        Only rewind to the start is supported, the body is re-sent when the request is replayed
+        """
+        if offset or whence != os.SEEK_SET:
+            raise io.UnsupportedOperation("MultipartFileStream can be rewound only")
+        self._position = 0
+        self._file_object.seek(self._file_start)
+        return 0
+
+    def tell(self):
+        return self._position
+
+    def read(self, size=-1):
+        """
+        :param int size: maximal bytes to read, -1 - up to the end of the current part
+        :rtype: bytes
+        """
+        if size is None or size < 0:
+            size = len(self)
+        file_end = len(self._preamble) + self._file_size
+        if self._position < len(self._preamble):
+            data = self._preamble[self._position : self._position + size]
+        elif self._position < file_end:
+            data = self._file_object.read(min(size, file_end - self._position))
+            if not data:
+                raise IOError("File is shorter than {} bytes".format(self._file_size))
+        else:
+            offset = self._position - file_end
+            data = self._epilogue[offset : offset + size]
+        self._position += len(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
@@ -1,3 +1,5 @@
+from threading import local
+
 import requests
 
 from cloudshell_bp.tg.breaking_point.rest_api.rest_requests import RestRequests
@@ -14,15 +16,32 @@ class RestClientUnauthorizedException(RestClientException):
 
 
 class RestJsonClient(RestRequests):
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
     def __init__(self, hostname, use_https=True):
         self._hostname = hostname
         self._use_https = use_https
         self._session = requests.Session()
+        self._unauthorized_handler = None
+        self._local = local()
+        self.requests_count = 0
+        self.replayed_requests_count = 0
 
     @property
     def session(self):
         return self._session
 
+    @property
+    def hostname(self):
+        return self._hostname
+
+    def set_unauthorized_handler(self, handler):
+        """
+        Handler called to re-authenticate when request failed with 401, the request is replayed after it
+        :param handler: callable without arguments, None - disable replay
+        """
+        self._unauthorized_handler = handler
+
     def _build_url(self, uri):
         if self._hostname not in uri:
             if not uri.startswith("/"):
@@ -45,26 +64,74 @@ class RestJsonClient(RestRequests):
                 self.__class__.__name__, "Request failed: {0}, {1}".format(response.status_code, response.text)
             )
 
+    @staticmethod
+    def _rewind_files(files, data=None):
+        file_objects = [file_info[1] if isinstance(file_info, tuple) else file_info for file_info in (files or {}).values()]
+        for file_object in file_objects + [data]:
+            if hasattr(file_object, "seek"):
+                file_object.seek(0)
+
+    def _request(self, method, uri, **kwargs):
+        url = self._build_url(uri)
+        self.requests_count += 1
+        response = self._session.request(method, url, verify=False, **kwargs)
+        # The handler requests are not replayed, the flag is per thread as the client can be shared by the threads
+        if (
+            response.status_code in [401]
+            and self._unauthorized_handler
+            and not getattr(self._local, "reauthenticating", False)
+        ):
+            self._local.reauthenticating = True
+            try:
+                self._unauthorized_handler()
+            finally:
+                self._local.reauthenticating = False
+            self._rewind_files(kwargs.get("files"), kwargs.get("data"))
+            self.requests_count += 1
+            self.replayed_requests_count += 1
+            response = self._session.request(method, url, verify=False, **kwargs)
+        return self._valid(response)
+
     def request_put(self, uri, data):
-        response = self._session.put(self._build_url(uri), data, verify=False)
-        return self._valid(response).json()
+        return self._request("PUT", uri, data=data).json()
 
     def request_post(self, uri, data):
-        response = self._session.post(self._build_url(uri), json=data, verify=False)
-        return self._valid(response).json()
+        return self._request("POST", uri, json=data).json()
 
     def request_post_files(self, uri, data, files):
-        response = self._session.post(self._build_url(uri), data=data, files=files, verify=False)
-        return self._valid(response).json()
+        return self._request("POST", uri, data=data, files=files).json()
 
     def request_get(self, uri):
-        response = self._session.get(self._build_url(uri), verify=False)
-        return self._valid(response).json()
-
-    def request_get_files(self, uri):
-        response = self._session.get(self._build_url(uri), verify=False)
-        return self._valid(response)
+        return self._request("GET", uri).json()
+
+    def request_post_stream(self, uri, data, content_type):
+        """
+        Post streamed body
+        :param data: file like object with read and len, sent by chunks
+        :param str content_type:
+        """
+        return self._request("POST", uri, data=data, headers={"Content-Type": content_type}).json()
+
+    def request_get_files(self, uri, stream=False):
+        """
+        :param bool stream: do not load the response content, read it with iter_content and close the response
+        :rtype: requests.Response
+        """
+        return self._request("GET", uri, stream=stream)
+
+    def download_file(self, uri, file_object, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Stream response content to the file object by chunks
+        :param file_object: binary file object
+        :return: bytes written
+        :rtype: int
+        """
+        size = 0
+        with self.request_get_files(uri, stream=True) as response:
+            for chunk in response.iter_content(chunk_size):
+                file_object.write(chunk)
+                size += len(chunk)
+        return size
 
     def request_delete(self, uri):
-        response = self._session.delete(self._build_url(uri), verify=False)
-        return self._valid(response).content
+        return self._request("DELETE", uri).content
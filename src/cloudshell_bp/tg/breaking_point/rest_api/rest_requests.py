@@ -9,7 +9,7 @@ class RestRequests(object):
         pass
 
     @abstractmethod
-    def request_get_files(self, uri):
+    def request_get_files(self, uri, stream=False):
         pass
 
     @abstractmethod
@@ -1,18 +1,29 @@
-from threading import Lock
+from threading import local
 
-from cloudshell_bp.tg.breaking_point.rest_actions.auth_actions import AuthActions
-from cloudshell_bp.tg.breaking_point.rest_api.rest_json_client import RestJsonClient
+from cloudshell_bp.tg.breaking_point.rest_api.rest_session_pool import RestSessionPool
 
 
 class RestSessionContextManager(object):
-    def __init__(self, hostname, username, password, logger):
-        self.__lock = Lock()
+    def __init__(self, hostname, username, password, logger, session_pool=None):
+        """
+        :param str hostname:
+        :param str username:
+        :param str password:
+        :param logger:
+        :param session_pool: shared pool of authenticated sessions, private single session pool if not specified
+        :type session_pool: RestSessionPool
+        """
+        self.__local = local()
         self._hostname = hostname
         self._username = username
         self._password = password
         self._logger = logger
-        self.__session = None
-        self.__auth_actions = None
+        self._own_session_pool = session_pool is None
+        self._session_pool = RestSessionPool(pool_size=1) if session_pool is None else session_pool
+
+    @property
+    def hostname(self):
+        return self._hostname
 
     @property
     def logger(self):
@@ -22,43 +33,40 @@ class RestSessionContextManager(object):
     def logger(self, value):
         self._logger = value
 
-    @property
-    def _session(self):
-        if not self.__session:
-            self.__session = RestJsonClient(self._hostname)
-        return self.__session
-
-    @property
-    def _auth_actions(self):
-        if not self.__auth_actions:
-            self.__auth_actions = AuthActions(self._session, self._logger)
-        return self.__auth_actions
-
     def _destroy_session(self):
-        if self.__auth_actions:
-            self.__auth_actions.logout()
-            self.__session = None
-            self.__auth_actions = None
+        if self._own_session_pool:
+            self._session_pool.close(self._logger)
 
     def __del__(self):
         self._destroy_session()
 
     def __enter__(self):
         """
+        Borrow pooled session for the current thread, nested entries in the same thread share the session
         :return:
-        :rtype: RestJsonClient
+        :rtype: cloudshell_bp.tg.breaking_point.rest_api.rest_json_client.RestJsonClient
         """
-        self.__lock.acquire()
-        if not self._auth_actions.logged_in():
-            try:
-                self._auth_actions.login(self._username, self._password)
-            except:
-                self.__lock.release()
-                raise
-        return self._session
+        pooled_session = getattr(self.__local, "pooled_session", None)
+        if pooled_session:
+            self.__local.depth += 1
+            return pooled_session.client
+        pooled_session = self._session_pool.acquire(self._hostname, self._username, self._password, self._logger)
+        try:
+            if not pooled_session.authenticated:
+                self._session_pool.login(pooled_session, self._logger)
+        except:
+            self._session_pool.release(pooled_session, self._logger, discard=True)
+            raise
+        self.__local.pooled_session = pooled_session
+        self.__local.depth = 1
+        return pooled_session.client
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.__lock.release()
+        self.__local.depth -= 1
+        if not self.__local.depth:
+            pooled_session = self.__local.pooled_session
+            self.__local.pooled_session = None
+            self._session_pool.release(pooled_session, self._logger)
 
     def __eq__(self, other):
         """
@@ -0,0 +1,246 @@
+import time
+from collections import defaultdict
+from threading import Condition
+
+from cloudshell_bp.tg.breaking_point.rest_actions.auth_actions import AuthActions
+from cloudshell_bp.tg.breaking_point.rest_api.rest_json_client import RestJsonClient
+
+
+class RestSessionPoolException(Exception):
+    pass
+
+
+class PooledRestSession(object):
+    def __init__(self, key, client, password, generation=0):
+        """
+        Authenticated REST client owned by the pool
+        :param tuple key: (hostname, username)
+        :type client: RestJsonClient
+        :param str password:
+        :param int generation: pool generation the session was created in
+        """
+        self.key = key
+        self.generation = generation
+        self.client = client
+        self.password = password
+        self.last_used = time.time()
+        self.authenticated = False
+        self.logger = None
+
+    @property
+    def hostname(self):
+        return self.key[0]
+
+    @property
+    def username(self):
+        return self.key[1]
+
+    def expired(self, idle_timeout, now=None):
+        return idle_timeout is not None and (now or time.time()) - self.last_used > idle_timeout
+
+
+class RestSessionPool(object):
+    """
+    Driver process wide registry of authenticated keep-alive BP REST sessions, keyed by (hostname, username)
+    """
+
+    DEFAULT_POOL_SIZE = 4
+    DEFAULT_IDLE_TIMEOUT = 600
+    DEFAULT_ACQUIRE_TIMEOUT = 600
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT, use_https=True):
+        """
+        :param int pool_size: max number of sessions per (hostname, username)
+        :param int idle_timeout: seconds after which an unused session is logged out, None - never
+        :param bool use_https:
+        """
+        if pool_size < 1:
+            raise RestSessionPoolException(self.__class__.__name__, "Pool size must be positive")
+        self._pool_size = pool_size
+        self._idle_timeout = idle_timeout
+        self._use_https = use_https
+        self._condition = Condition()
+        self._idle_sessions = defaultdict(list)
+        self._sessions_count = defaultdict(int)
+        self._sessions = set()
+        self._generation = 0
+        self._closed_requests_count = 0
+        self._logins_count = 0
+        self._relogins_count = 0
+
+    @property
+    def pool_size(self):
+        return self._pool_size
+
+    @property
+    def idle_timeout(self):
+        return self._idle_timeout
+
+    def statistics(self):
+        """
+        Pool counters, requests count includes all the requests sent by the pooled sessions
+        :rtype: dict
+        """
+        with self._condition:
+            return {
+                "sessions": len(self._sessions),
+                "idle_sessions": sum(len(sessions) for sessions in self._idle_sessions.values()),
+                "logins": self._logins_count,
+                "relogins": self._relogins_count,
+                "requests": self._closed_requests_count + sum(s.client.requests_count for s in self._sessions),
+            }
+
+    def login(self, pooled_session, logger):
+        """
+        Authenticate pooled session
+        :type pooled_session: PooledRestSession
+        """
+        pooled_session.authenticated = False
+        AuthActions(pooled_session.client, logger).login(pooled_session.username, pooled_session.password)
+        pooled_session.authenticated = True
+        with self._condition:
+            self._logins_count += 1
+
+    def _relogin(self, pooled_session):
+        pooled_session.logger.debug(
+            "REST session {}@{} is not authorized, re-login".format(pooled_session.username, pooled_session.hostname)
+        )
+        with self._condition:
+            self._relogins_count += 1
+        self.login(pooled_session, pooled_session.logger)
+
+    def _create_session(self, key, password, logger):
+        hostname, username = key
+        client = RestJsonClient(hostname, self._use_https)
+        pooled_session = PooledRestSession(key, client, password, self._generation)
+        pooled_session.logger = logger
+        client.set_unauthorized_handler(lambda: self._relogin(pooled_session))
+        with self._condition:
+            self._sessions.add(pooled_session)
+        try:
+            self.login(pooled_session, logger)
+        except Exception:
+            with self._condition:
+                self._sessions.discard(pooled_session)
+                self._closed_requests_count += client.requests_count
+            raise
+        return pooled_session
+
+    def _logout(self, pooled_session, logger):
+        pooled_session.client.set_unauthorized_handler(None)
+        AuthActions(pooled_session.client, logger).logout()
+        pooled_session.client.session.close()
+        pooled_session.authenticated = False
+        with self._condition:
+            self._sessions.discard(pooled_session)
+            self._closed_requests_count += pooled_session.client.requests_count
+
+    def _pop_expired(self):
+        """
+        Remove expired idle sessions, must be called under the pool condition
+        :rtype: list[PooledRestSession]
+        """
+        now = time.time()
+        expired = []
+        for key, sessions in self._idle_sessions.items():
+            alive = []
+            for pooled_session in sessions:
+                if pooled_session.expired(self._idle_timeout, now):
+                    expired.append(pooled_session)
+                    self._sessions_count[key] -= 1
+                else:
+                    alive.append(pooled_session)
+            sessions[:] = alive
+        if expired:
+            self._condition.notify_all()
+        return expired
+
+    def acquire(self, hostname, username, password, logger, timeout=DEFAULT_ACQUIRE_TIMEOUT):
+        """
+        Borrow authenticated session, waits when all the sessions for the key are in use
+        :param str hostname:
+        :param str username:
+        :param str password:
+        :param logger:
+        :param timeout: seconds to wait for a free session
+        :rtype: PooledRestSession
+        """
+        key = (hostname, username)
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._condition:
+            expired = self._pop_expired()
+            while True:
+                idle_sessions = self._idle_sessions[key]
+                if idle_sessions:
+                    pooled_session = idle_sessions.pop()
+                    break
+                if self._sessions_count[key] < self._pool_size:
+                    self._sessions_count[key] += 1
+                    pooled_session = None
+                    break
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise RestSessionPoolException(
+                        self.__class__.__name__, "Timeout waiting for a free REST session to {}@{}".format(username, hostname)
+                    )
+                self._condition.wait(remaining)
+
+        for expired_session in expired:
+            logger.debug("Closing idle REST session {}@{}".format(expired_session.username, expired_session.hostname))
+            self._logout(expired_session, logger)
+
+        if pooled_session is None:
+            logger.debug("Opening new REST session {}@{}".format(username, hostname))
+            try:
+                pooled_session = self._create_session(key, password, logger)
+            except Exception:
+                with self._condition:
+                    self._sessions_count[key] -= 1
+                    self._condition.notify_all()
+                raise
+        pooled_session.password = password
+        pooled_session.logger = logger
+        return pooled_session
+
+    def release(self, pooled_session, logger, discard=False):
+        """
+        Return borrowed session to the pool
+        :type pooled_session: PooledRestSession
+        :param logger:
+        :param bool discard: logout and drop the session instead of reusing it
+        """
+        pooled_session.last_used = time.time()
+        with self._condition:
+            discard = discard or pooled_session.generation != self._generation
+            if discard:
+                self._sessions_count[pooled_session.key] -= 1
+            else:
+                self._idle_sessions[pooled_session.key].append(pooled_session)
+            self._condition.notify_all()
+        if discard:
+            self._logout(pooled_session, logger)
+
+    def expire_idle(self, logger):
+        """
+        Logout sessions unused longer than idle timeout
+        """
+        with self._condition:
+            expired = self._pop_expired()
+        for pooled_session in expired:
+            self._logout(pooled_session, logger)
+
+    def close(self, logger):
+        """
+        Logout all idle sessions, sessions in use are logged out on release.
+        The pool stays usable, new sessions are opened on demand
+        """
+        with self._condition:
+            self._generation += 1
+            idle_sessions = [s for sessions in self._idle_sessions.values() for s in sessions]
+            for pooled_session in idle_sessions:
+                self._sessions_count[pooled_session.key] -= 1
+            self._idle_sessions.clear()
+            self._condition.notify_all()
+        for pooled_session in idle_sessions:
+            logger.debug("Closing REST session {}@{}".format(pooled_session.username, pooled_session.hostname))
+            self._logout(pooled_session, logger)
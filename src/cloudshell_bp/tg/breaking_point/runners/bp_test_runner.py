@@ -1,10 +1,17 @@
-import csv
+import fnmatch
 import io
 import json
 import os
 import re
-from xml.etree import ElementTree
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
+from cloudshell_bp.tg.breaking_point.actions.test_results_actions import TestResultsActions
+from cloudshell_bp.tg.breaking_point.actions.test_statistics_actions import TestStatisticsActions
+from cloudshell_bp.tg.breaking_point.entities.bp_test_model import BPTestModel
 from cloudshell_bp.tg.breaking_point.flows.bp_download_test_file_flow import BPDownloadTestFileFlow
 from cloudshell_bp.tg.breaking_point.flows.bp_load_configuration_file_flow import BPLoadConfigurationFileFlow
 from cloudshell_bp.tg.breaking_point.flows.bp_load_pcap_file_flow import BPLoadPcapFileFlow
@@ -13,25 +20,48 @@ from cloudshell_bp.tg.breaking_point.flows.bp_results_flow import BPResultsFlow
 from cloudshell_bp.tg.breaking_point.flows.bp_statistics_flow import BPStatisticsFlow
 from cloudshell_bp.tg.breaking_point.flows.bp_test_execution_flow import BPTestExecutionFlow
 from cloudshell_bp.tg.breaking_point.helpers.bp_cs_reservation_details import BPCSReservationDetails
+from cloudshell_bp.tg.breaking_point.helpers.bp_test_library import BPTestLibrary
+from cloudshell_bp.tg.breaking_point.helpers.export_cache import ExportCache
 from cloudshell_bp.tg.breaking_point.helpers.port_reservation_helper import PortReservationHelper
+from cloudshell_bp.tg.breaking_point.helpers.statistics_sampler import StatisticsSampler
+from cloudshell_bp.tg.breaking_point.helpers.upload_index import UploadIndex
 from cloudshell_bp.tg.breaking_point.rest_api.rest_session_manager import RestSessionContextManager
 from cloudshell_bp.tg.breaking_point.runners.bp_runner import BPRunner
 from cloudshell_bp.tg.breaking_point.runners.exceptions import BPRunnerException
+from cloudshell_bp.tg.breaking_point.statistics.columnar_store import ColumnarStatisticsStore, flatten_statistics
+from cloudshell_bp.tg.breaking_point.statistics.derived_metrics import DerivedMetrics
+from cloudshell_bp.tg.breaking_point.statistics.thresholds import ThresholdEngine, ThresholdRule
+from cloudshell_bp.tg.breaking_point.statistics.writers import (
+    WRITERS,
+    CsvStatisticsWriter,
+    get_statistics_writer,
+    statistics_columns,
+)
+from cloudshell_bp.tg.breaking_point.utils.file_based_lock import FileBasedLock
 
 
 class BPTestRunner(BPRunner):
-    def __init__(self, resource_config, bp_session, logger, api):
+    COLUMNAR_FORMAT = "zip"
+    EXPORT_SPOOL_SIZE = 8 * 2**20
+    TEST_DOWNLOAD_WORKERS = 4
+    TEST_FILE_CACHE_TTL = 60
+
+    def __init__(self, resource_config, bp_session, logger, api, session_pool=None):
         """
         Test runner, hold current configuration fo specific test
         :type resource_config: cloudshell_bp.devices.standards.traffic.controller.configuration_attributes_structure.
         :type bp_session: cloudshell.tg.breaking_point.entities.bp_session.BPSession
+        :type session_pool: cloudshell_bp.tg.breaking_point.rest_api.rest_session_pool.RestSessionPool
         """
         super(BPTestRunner, self).__init__(api, logger)
         self._resource_config = resource_config
         self._bp_session = bp_session
+        self._session_pool = session_pool
         self.reservation_id = self._bp_session.cs_reservation_id
 
         self.__session_context_manager = None
+        self.__export_cache = None
+        self.__test_library = None
         self.__test_execution_flow = None
         self.__test_statistics_flow = None
         self.__test_results_flow = None
@@ -45,7 +75,7 @@ class BPTestRunner(BPRunner):
         bp_address = self._cs_reservation_details.get_chassis_address()
         bp_username = self._cs_reservation_details.get_chassis_user()
         bp_password = self._cs_reservation_details.get_chassis_password()
-        return RestSessionContextManager(bp_address, bp_username, bp_password, self.logger)
+        return RestSessionContextManager(bp_address, bp_username, bp_password, self.logger, self._session_pool)
 
     @property
     def session_context_manager(self):
@@ -53,6 +83,33 @@ class BPTestRunner(BPRunner):
             self.__session_context_manager = self._init_session_manager()
         return self.__session_context_manager
 
+    @property
+    def _export_cache(self):
+        """
+        Cache of the exported files under Test Files Location
+        :return: None if the location is not defined or not writable
+        :rtype: ExportCache
+        """
+        test_files_location = self._resource_config.test_files_location
+        if not self.__export_cache and test_files_location and os.access(test_files_location, os.W_OK):
+            self.__export_cache = ExportCache(test_files_location, self.logger)
+        return self.__export_cache
+
+    @property
+    def _test_library(self):
+        """
+        Index of the test files under Test Files Location
+        :return: None if the location is not defined or not writable
+        :rtype: BPTestLibrary
+        """
+        test_files_location = self._resource_config.test_files_location
+        if not self.__test_library and test_files_location and os.access(test_files_location, os.W_OK):
+            self.__test_library = BPTestLibrary(test_files_location, self.logger)
+        return self.__test_library
+
+    def _export_cache_key(self, name, file_format):
+        return ExportCache.key(self.session_context_manager.hostname, name, file_format)
+
     @property
     def _cs_reservation_details(self):
         """
@@ -143,21 +200,112 @@ class BPTestRunner(BPRunner):
             'File {} does not exists or "Test Files Location" attribute was not specified'.format(file_path),
         )
 
-    def load_configuration(self, file_path):
+    def _resolve_test_file(self, file_path):
+        """
+        Find the file by path or by the test name in the test library
+        :param str file_path: file path or test name
+        :return: existing path, test library entry or None if the file is not under Test Files Location
+        :rtype: (str, dict)
+        """
+        test_library = self._test_library
+        try:
+            file_path = self._get_existing_path(file_path)
+        except BPRunnerException:
+            library_entry = test_library.find(file_path) if test_library else None
+            if not library_entry:
+                raise
+            self.logger.debug("Test {} resolved to {}".format(file_path, library_entry["path"]))
+            return test_library.path(library_entry), library_entry
+        return file_path, test_library.get(file_path) if test_library else None
+
+    def load_configuration(self, file_path, force_upload="False", group_wait_timeout="0"):
         """
         Upload configuration file and reserve ports
-        :param file_path:
+        :param file_path: file path or test name from the test library
+        :param str force_upload: True - upload the file even if identical one was already imported to the chassis
+        :param str group_wait_timeout: seconds to wait for a free reservation group when all the groups are busy
         :return:
         """
-        file_path = self._get_existing_path(file_path)
+        file_path, library_entry = self._resolve_test_file(file_path)
+        port_reservation_helper = self._port_reservation_helper
+        stage_durations = {}
+        start_time = time.time()
+
+        def timed(stage, function, *args):
+            stage_start_time = time.time()
+            try:
+                return function(*args)
+            finally:
+                stage_durations[stage] = time.time() - stage_start_time
+
+        def lookup_test_interfaces():
+            if library_entry:
+                test_model = BPTestLibrary.test_model(library_entry)
+            else:
+                test_model = BPTestModel.from_file(file_path)
+            return test_model, port_reservation_helper.get_test_interfaces(test_model.network_name)
+
+        # The CS ports lookup is independent of the chassis stages. The network can be created by the test import,
+        # it is looked up after the upload and overlaps the CS ports lookup only when the upload is skipped
+        self.logger.debug("Loading {} to {}".format(file_path, self.session_context_manager.hostname))
+        sha256 = library_entry["sha256"] if library_entry else UploadIndex.file_hash(file_path)
+        test_name = None if str(force_upload).lower() == "true" else self._find_imported_test(sha256)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="bp-load") as executor:
+            ports_lookup = executor.submit(timed, "CS ports lookup", port_reservation_helper.get_cs_reserved_ports)
+            if not test_name:
+                test_name = timed("upload", self._import_configuration, file_path, sha256)
+            test_model, bp_test_interfaces = timed("network lookup", lookup_test_interfaces)
+            cs_reserved_ports = ports_lookup.result()
+        self._bp_session.test_name = test_name
+
+        reservation_order = port_reservation_helper.build_reservation_order(
+            test_model.interfaces, bp_test_interfaces, cs_reserved_ports
+        )
+        timed(
+            "reservation",
+            port_reservation_helper.reserve_reservation_order,
+            reservation_order,
+            self._bp_session,
+            float(group_wait_timeout) if group_wait_timeout else 0,
+        )
+        self.logger.info(
+            "Configuration {} loaded in {:.2f}s: {}".format(
+                self._bp_session.test_name,
+                time.time() - start_time,
+                ", ".join("{} {:.2f}s".format(stage, duration) for stage, duration in stage_durations.items()),
+            )
+        )
+
+    def _find_imported_test(self, sha256):
+        """
+        :param str sha256: test file hash
+        :return: name of the test imported to the chassis from identical file or None
+        """
+        test_name = UploadIndex(self.session_context_manager.hostname, self.logger).get(sha256)
+        if test_name:
+            self.logger.info("Test {} was imported from identical file, upload skipped".format(test_name))
+        return test_name
+
+    def _import_configuration(self, file_path, sha256):
+        """
+        :param str file_path:
+        :param str sha256: test file hash
+        :return: imported test name
+        :rtype: str
+        """
+        test_name = self._test_configuration_file_flow.load_configuration(file_path)
+        UploadIndex(self.session_context_manager.hostname, self.logger).add(sha256, test_name)
+        return test_name
 
-        self._bp_session.test_name = self._test_configuration_file_flow.load_configuration(file_path)
-        test_model = ElementTree.parse(file_path).getroot().find("testmodel")
-        network_name = test_model.get("network")
-        interfaces = []
-        for interface in test_model.findall("interface"):
-            interfaces.append(int(interface.get("number")))
-        self._port_reservation_helper.reserve_ports(network_name, interfaces, self._bp_session)
+    def invalidate_upload_index(self):
+        """
+        Forget the test files imported to the chassis, the next load uploads them again.
+        Required after the chassis reboot or when the tests were changed outside the driver
+        :rtype: str
+        """
+        chassis = self.session_context_manager.hostname
+        forgotten = UploadIndex(chassis, self.logger).invalidate()
+        return "{} imported test files forgotten for {}".format(forgotten, chassis)
 
     def load_pcap(self, file_path):
         response_file_name = BPLoadPcapFileFlow(self.session_context_manager, self.logger).load_pcap(file_path)
@@ -166,19 +314,154 @@ class BPTestRunner(BPRunner):
         if not re.search(response_file_name, file_name, re.IGNORECASE):
             raise BPRunnerException(self.__class__.__name__, "Unable to load pcap file")
 
-    def start_traffic(self, blocking):
+    @staticmethod
+    def _split_list(value):
+        return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+    def _get_stats_groups(self, value):
+        """
+        Parse and validate comma separated statistics groups
+        :param str value: comma separated groups or all
+        :rtype: list[str]
+        """
+        stats_groups = [group.lower() for group in self._split_list(value)]
+        if stats_groups == ["all"]:
+            return list(TestStatisticsActions.STATS_GROUPS)
+        for group in stats_groups:
+            if group not in TestStatisticsActions.STATS_GROUPS:
+                raise BPRunnerException(
+                    self.__class__.__name__,
+                    "Incorrect stats group {0}, supported groups {1}".format(group, TestStatisticsActions.STATS_GROUPS),
+                )
+        if not stats_groups:
+            raise BPRunnerException(self.__class__.__name__, "Statistics group is not specified")
+        return stats_groups
+
+    def _get_threshold_engine(self, thresholds):
+        """
+        Parse and validate threshold rules
+        :param str thresholds: semicolon or comma separated rules
+        :rtype: ThresholdEngine
+        """
+        try:
+            threshold_engine = ThresholdEngine.parse(thresholds)
+        except ValueError as e:
+            raise BPRunnerException(self.__class__.__name__, str(e))
+        for rule in threshold_engine.rules:
+            if "." not in rule.counter or rule.group not in TestStatisticsActions.STATS_GROUPS:
+                raise BPRunnerException(
+                    self.__class__.__name__,
+                    "Threshold counter {0} must be prefixed by stats group, supported groups {1}".format(
+                        rule.counter, TestStatisticsActions.STATS_GROUPS
+                    ),
+                )
+        return threshold_engine
+
+    def _stop_failed_test(self, test_id, failed_rules):
+        """
+        Stop traffic of the test failed hard thresholds, called from the sampler thread,
+        the sampler keeps the stop error for the verdict
+        """
+        self.logger.info("Stop test {} on threshold failure {}".format(test_id, ", ".join(str(rule) for rule in failed_rules)))
+        self._test_execution_flow.stop_traffic(test_id)
+
+    def _start_statistics_sampler(self, statistics_groups, statistics_interval, threshold_engine=None, stop_on_failure=False):
+        """
+        Start background RTS sampler for the current test
+        :param list[str] statistics_groups:
+        :param str statistics_interval: seconds between samples
+        :type threshold_engine: ThresholdEngine
+        :param bool stop_on_failure: stop traffic when hard threshold failed
+        """
+        interval = float(statistics_interval) if statistics_interval else StatisticsSampler.DEFAULT_INTERVAL
+        test_id = self._bp_session.test_id
+        on_hard_failure = partial(self._stop_failed_test, test_id) if stop_on_failure else None
+        sampler = StatisticsSampler(
+            self._test_statistics_flow,
+            test_id,
+            statistics_groups,
+            self.logger,
+            interval,
+            threshold_engine=threshold_engine,
+            on_hard_failure=on_hard_failure,
+        )
+        self._bp_session.statistics_sampler = sampler
+        sampler.start()
+
+    def _stop_statistics_sampler(self):
+        """
+        Stop background RTS sampler, collected samples are kept until the next test
+        """
+        sampler = self._bp_session.statistics_sampler
+        if sampler:
+            sampler.stop()
+            if sampler.threshold_engine:
+                sampler.threshold_engine.complete()
+
+    @staticmethod
+    def _threshold_summary(threshold_engine, stop_on_failure, stop_error=None):
+        """
+        :type threshold_engine: ThresholdEngine
+        :param bool stop_on_failure: the test was stopped on hard threshold failure
+        :param Exception stop_error: error of the stop on hard threshold failure
+        :rtype: str
+        """
+        result = threshold_engine.result()
+        if result["hard_failures"]:
+            if stop_error:
+                stop_status = "Test stop failed: {}".format(stop_error)
+            else:
+                stop_status = "Test stopped" if stop_on_failure else "Test not stopped"
+            return "{}, hard thresholds failed: {}".format(stop_status, ", ".join(result["hard_failures"]))
+        failed = [rule["rule"] for rule in result["rules"] if rule["status"] != ThresholdRule.PASSED]
+        if failed:
+            return "Thresholds failed: {}".format(", ".join(failed))
+        return "Thresholds passed"
+
+    def start_traffic(
+        self,
+        blocking,
+        timeout=None,
+        cancellation_context=None,
+        statistics_groups=None,
+        statistics_interval=None,
+        thresholds=None,
+        stop_on_failure="True",
+    ):
         """
         Start traffic
         :param blocking:
-        :return:
+        :param str timeout: seconds to wait for blocking test, empty or 0 - wait until the test finished
+        :param cancellation_context:
+        :param str statistics_groups: comma separated statistics groups to sample in background, empty - do not sample
+        :param str statistics_interval: seconds between statistics samples
+        :param str thresholds: semicolon separated rules evaluated on each statistics sample
+        :param str stop_on_failure: True - stop traffic when a hard threshold failed
+        :return: thresholds verdict of the blocking test
         """
         if not self._bp_session.test_name:
             raise BPRunnerException(self.__class__.__name__, "Load configuration first")
+        statistics_groups = self._get_stats_groups(statistics_groups) if self._split_list(statistics_groups) else []
+        threshold_engine = self._get_threshold_engine(thresholds) if thresholds and thresholds.strip() else None
+        if threshold_engine:
+            statistics_groups.extend(group for group in threshold_engine.stats_groups if group not in statistics_groups)
+        stop_on_failure = str(stop_on_failure).lower() == "true"
+        self._stop_statistics_sampler()
+        self._bp_session.statistics_sampler = None
         self._bp_session.test_id = self._test_execution_flow.start_traffic(
             self._bp_session.test_name, self._bp_session.reservation_group
         )
+        if statistics_groups:
+            self._start_statistics_sampler(statistics_groups, statistics_interval, threshold_engine, stop_on_failure)
         if blocking.lower() == "true":
-            self._test_execution_flow.block_while_test_running(self._bp_session.test_id)
+            finished = self._test_execution_flow.block_while_test_running(
+                self._bp_session.test_id, float(timeout) if timeout and float(timeout) > 0 else None, cancellation_context
+            )
+            if finished:
+                self._stop_statistics_sampler()
+                if threshold_engine:
+                    sampler = self._bp_session.statistics_sampler
+                    return self._threshold_summary(threshold_engine, stop_on_failure, sampler.hard_failure_error)
 
     def stop_traffic(self):
         """
@@ -187,55 +470,283 @@ class BPTestRunner(BPRunner):
         """
         if not self._bp_session.test_id:
             raise BPRunnerException(self.__class__.__name__, "Test id is not defined, run the test first")
+        self._stop_statistics_sampler()
         self._test_execution_flow.stop_traffic(self._bp_session.test_id)
 
-    def get_statistics(self, view_name, output_format):
+    def get_threshold_results(self):
+        """
+        Thresholds evaluation of the current test
+        :rtype: str
+        """
+        sampler = self._bp_session.statistics_sampler
+        if not sampler or not sampler.threshold_engine or sampler.test_id != self._bp_session.test_id:
+            raise BPRunnerException(self.__class__.__name__, "Thresholds are not defined, start traffic with thresholds")
+        result = dict(sampler.threshold_engine.result(), test_id=sampler.test_id)
+        return json.dumps(result, indent=4, sort_keys=True)
+
+    def _get_sampler(self, stats_groups):
+        """
+        Background sampler of the current test sampling all the groups
+        :param list[str] stats_groups:
+        :rtype: StatisticsSampler
+        """
+        sampler = self._bp_session.statistics_sampler
+        if sampler and sampler.test_id == self._bp_session.test_id and sampler.samples(stats_groups):
+            return sampler
+
+    @staticmethod
+    def _statistics_row(sample, stats_groups, with_timestamp):
+        """
+        Single group statistics as is, several groups merged with group prefixed keys
+        :param tuple sample: (timestamp, {stats_group: statistics})
+        :rtype: dict
+        """
+        timestamp, stats = sample
+        row = {"timestamp": timestamp} if with_timestamp or len(stats_groups) > 1 else {}
+        if len(stats_groups) == 1:
+            row.update(stats[stats_groups[0]])
+        else:
+            for group in stats_groups:
+                row.update(("{}.{}".format(group, key), value) for key, value in stats[group].items())
+        return row
+
+    @staticmethod
+    def _derived_statistics(samples, stats_groups):
         """
-        Real time statistics
-        :param view_name:
+        Columnar statistics with derived rates, single group counters are not prefixed by the group name
+        :param list[tuple] samples: [(timestamp, {stats_group: statistics})]
+        :rtype: ColumnarStatisticsStore
+        """
+        store = ColumnarStatisticsStore()
+        for timestamp, stats in samples:
+            if len(stats_groups) == 1:
+                store.append(timestamp, flatten_statistics(stats[stats_groups[0]]))
+            else:
+                store.append_groups(timestamp, stats)
+        return store
+
+    def get_statistics(self, view_name, output_format, time_series="False", derived_metrics="False"):
+        """
+        Real time statistics, sampled statistics are returned from memory
+        :param view_name: statistics group, comma separated groups or all
         :param output_format:
+        :param str time_series: True - return all the sampled values, False - the latest values only
+        :param str derived_metrics: True - add delta, rate and rate moving average of numeric counters
         :return:
         """
         if not self._bp_session.test_id:
             raise BPRunnerException(self.__class__.__name__, "Test id is not defined, run the test first")
-        result = self._test_statistics_flow.get_rt_statistics(self._bp_session.test_id, view_name)
-        if output_format.lower() == "json":
-            statistics = json.dumps(result, indent=4, sort_keys=True, ensure_ascii=False)
-            # print statistics
-            # self.api.WriteMessageToReservationOutput(self.context.reservation.reservation_id, statistics)
-        elif output_format.lower() == "csv":
-            output = io.BytesIO()
-            w = csv.DictWriter(output, result.keys())
-            w.writeheader()
-            w.writerow(result)
-            statistics = output.getvalue().strip("\r\n")
+        if output_format.lower() not in ["json", "csv"]:
+            raise BPRunnerException(self.__class__.__name__, "Incorrect file format, supported csv or json only")
+        stats_groups = self._get_stats_groups(view_name)
+        sampler = self._get_sampler(stats_groups)
+        time_series = str(time_series).lower() == "true"
+        derived_metrics = str(derived_metrics).lower() == "true"
+        if time_series:
+            if not sampler:
+                raise BPRunnerException(
+                    self.__class__.__name__,
+                    "Statistics {} are not sampled, start traffic with the statistics groups".format(view_name),
+                )
+            samples = sampler.series(stats_groups)
+        elif derived_metrics and sampler:
+            samples = sampler.series(stats_groups)
+        else:
+            sample = sampler.latest(stats_groups) if sampler else None
+            if not sample:
+                sample = self._test_statistics_flow.get_rt_statistics_groups(self._bp_session.test_id, stats_groups)
+            samples = [sample]
 
-            # self.api.WriteMessageToReservationOutput(self.context.reservation.reservation_id,
-            #                                          output.getvalue().strip('\r\n'))
+        if derived_metrics:
+            store = self._derived_statistics(samples, stats_groups)
+            metrics = DerivedMetrics()
+            metrics.apply(store)
+            summary = metrics.summary(store)
+            rows = list(store.rows()) if time_series else list(store.rows())[-1:]
+            document = {"samples": rows, "summary": summary} if time_series else rows[0]
         else:
-            raise BPRunnerException(self.__class__.__name__, "Incorrect file format, supported csv or json only")
+            rows = [self._statistics_row(sample, stats_groups, time_series) for sample in samples]
+            if len(stats_groups) > 1:
+                documents = [dict({"timestamp": timestamp}, **stats) for timestamp, stats in samples]
+            else:
+                documents = rows
+            document = documents if time_series else documents[0]
+
+        if output_format.lower() == "json":
+            statistics = json.dumps(document, indent=4, sort_keys=True, ensure_ascii=False)
+        else:
+            output = io.BytesIO()
+            with CsvStatisticsWriter(output, statistics_columns(rows)) as writer:
+                writer.write_rows(rows)
+            statistics = output.getvalue().decode(CsvStatisticsWriter.ENCODING).strip("\r\n")
         return statistics
 
-    def get_results(self, environment_name, quali_api_helper):
+    def _get_result_formats(self, value):
         """
-        Get test result file and attache it to the reservation
+        Parse and validate comma separated result formats
+        :param str value:
+        :rtype: list[str]
+        """
+        result_formats = []
+        for result_format in self._split_list((value or "").lower()):
+            if result_format not in TestResultsActions.RESULT_FORMATS:
+                raise BPRunnerException(
+                    self.__class__.__name__,
+                    "Incorrect result format {0}, supported formats {1}".format(
+                        result_format, TestResultsActions.RESULT_FORMATS
+                    ),
+                )
+            if result_format not in result_formats:
+                result_formats.append(result_format)
+        if not result_formats:
+            raise BPRunnerException(self.__class__.__name__, "Result format is not specified")
+        return result_formats
+
+    def get_results(self, environment_name, quali_api_helper, result_formats="pdf", test_id=None):
+        """
+        Get test result files and attache them to the reservation, files of finished tests are cached
         :param str environment_name:
         :type quali_api_helper: cloudshell.tg.breaking_point.helpers.quali_rest_api_helper.QualiAPIHelper
+        :param str result_formats: comma separated formats, downloaded concurrently
+        :param str test_id: test id, the current test by default
         """
-        if not self._bp_session.test_id:
+        bp_test_id = test_id or self._bp_session.test_id
+        if not bp_test_id:
             raise BPRunnerException(self.__class__.__name__, "Test id is not defined, run the test first")
-        pdf_result = self._test_results_flow.get_results(self._bp_session.test_id)
-        quali_api_helper.login()
-        env_name = re.sub("\s+", "_", environment_name)
-        test_id = re.sub("\s+", "_", self._bp_session.test_id)
-        file_name = "{0}_{1}.pdf".format(env_name, test_id)
-        quali_api_helper.upload_file(self.reservation_id, file_name=file_name, file_stream=pdf_result)
-        return "Please check attachments for results"
+        result_formats = self._get_result_formats(result_formats)
+        env_name = re.sub(r"\s+", "_", environment_name)
+        test_id = re.sub(r"\s+", "_", bp_test_id)
+        export_cache = self._export_cache
+        file_objects = {}
+        if export_cache:
+            for result_format in result_formats:
+                cached_file = export_cache.open(self._export_cache_key(bp_test_id, result_format))
+                if cached_file:
+                    file_objects[result_format] = cached_file
+        cached_formats = list(file_objects)
+        downloads = {
+            result_format: tempfile.SpooledTemporaryFile(max_size=self.EXPORT_SPOOL_SIZE)
+            for result_format in result_formats
+            if result_format not in cached_formats
+        }
+        file_objects.update(downloads)
+        try:
+            # Reports of a running test are partial, the status is checked before the download
+            # so the reports downloaded before the test completed are never cached
+            test_completed = False
+            if export_cache and downloads:
+                test_status = self._test_execution_flow.get_test_status(bp_test_id) or "incomplete"
+                test_completed = "incomplete" not in test_status
+            start_time = time.time()
+            download_times = {}
+            if downloads:
+                download_times = self._test_results_flow.download_results_formats(bp_test_id, downloads)
+            download_time = time.time() - start_time
+            if test_completed:
+                for result_format, file_object in downloads.items():
+                    file_object.seek(0)
+                    export_cache.put_file(self._export_cache_key(bp_test_id, result_format), file_object)
+            files = []
+            for result_format in result_formats:
+                file_name = "{0}_{1}.{2}".format(env_name, test_id, result_format)
+                if result_format in download_times:
+                    size, duration = download_times[result_format]
+                    self.logger.debug("Downloaded {} bytes of {} in {:.1f}s".format(size, file_name, duration))
+                file_objects[result_format].seek(0)
+                files.append((file_name, file_objects[result_format]))
+            quali_api_helper.attach_files(self.reservation_id, files)
+        finally:
+            for file_object in file_objects.values():
+                file_object.close()
+        serial_time = sum(duration for _, duration in download_times.values())
+        output = "Attached {} results".format(", ".join(result_formats))
+        if cached_formats:
+            output += ", {} from cache".format(", ".join(cached_formats))
+        if downloads:
+            output += ", downloaded in {:.1f}s (serial {:.1f}s)".format(download_time, serial_time)
+        return output + ", total {:.1f}s".format(time.time() - start_time)
 
-    def get_test_file(self, test_name: str) -> str:
-        """Download test file from BP.
+    def submit_results_job(self, job_queue, environment_name, quali_api_helper, result_formats="pdf"):
+        """
+        Get results of the current test in background, identical active job is reused
+        :type job_queue: cloudshell_bp.tg.breaking_point.helpers.job_queue.JobQueue
+        :param str environment_name:
+        :type quali_api_helper: cloudshell.tg.breaking_point.helpers.quali_rest_api_helper.QualiAPIHelper
+        :param str result_formats: comma separated formats
+        :return: job id
+        :rtype: str
+        """
+        test_id = self._bp_session.test_id
+        if not test_id:
+            raise BPRunnerException(self.__class__.__name__, "Test id is not defined, run the test first")
+        result_formats = ",".join(self._get_result_formats(result_formats))
+        job = job_queue.submit(
+            (self.reservation_id, "get_results", test_id, result_formats),
+            "Get {} results of test {}".format(result_formats, test_id),
+            lambda: self.get_results(environment_name, quali_api_helper, result_formats, test_id),
+            self.logger,
+            self.reservation_id,
+        )
+        return job.id
+
+    def get_job_status(self, job_queue, job_id=None):
+        """
+        Status of the background job or of all the jobs of the reservation
+        :type job_queue: cloudshell_bp.tg.breaking_point.helpers.job_queue.JobQueue
+        :param str job_id: empty - all the jobs of the reservation
+        :rtype: str
+        """
+        if job_id:
+            job = job_queue.get(job_id)
+            if not job or job.owner != self.reservation_id:
+                raise BPRunnerException(self.__class__.__name__, "Job {} is not found".format(job_id))
+            return json.dumps(job.to_dict(), indent=4, sort_keys=True)
+        return json.dumps([job.to_dict() for job in job_queue.jobs(self.reservation_id)], indent=4, sort_keys=True)
 
-        :param test_name:
+    def export_statistics(
+        self, environment_name, quali_api_helper, downsample_interval=None, output_format=COLUMNAR_FORMAT, compress="False"
+    ):
+        """
+        Attach history of the background sampled statistics to the reservation
+        :param str environment_name:
+        :type quali_api_helper: cloudshell.tg.breaking_point.helpers.quali_rest_api_helper.QualiAPIHelper
+        :param str downsample_interval: seconds, aggregate samples to min, max and mean per interval, empty - all samples
+        :param str output_format: zip - compressed columnar store, csv or json - one row per sample
+        :param str compress: True - gzip csv or json file
+        """
+        sampler = self._bp_session.statistics_sampler
+        if not sampler or sampler.test_id != self._bp_session.test_id:
+            raise BPRunnerException(
+                self.__class__.__name__, "Statistics are not sampled, start traffic with statistics groups"
+            )
+        output_format = (output_format or self.COLUMNAR_FORMAT).lower()
+        if output_format != self.COLUMNAR_FORMAT and output_format not in WRITERS:
+            raise BPRunnerException(
+                self.__class__.__name__,
+                "Incorrect file format, supported {}".format(", ".join([self.COLUMNAR_FORMAT] + list(WRITERS))),
+            )
+        store = sampler.history(float(downsample_interval) if downsample_interval else None)
+        env_name = re.sub(r"\s+", "_", environment_name)
+        test_id = re.sub(r"\s+", "_", self._bp_session.test_id)
+        file_name = "{0}_{1}_statistics.{2}".format(env_name, test_id, output_format)
+        with tempfile.SpooledTemporaryFile(max_size=self.EXPORT_SPOOL_SIZE) as output:
+            if output_format == self.COLUMNAR_FORMAT:
+                store.export(output)
+            else:
+                compress = str(compress).lower() == "true"
+                if compress:
+                    file_name += ".gz"
+                columns = ["timestamp"] + store.columns
+                with get_statistics_writer(output_format, output, columns, compress) as writer:
+                    writer.write_rows(store.rows())
+            output.seek(0)
+            quali_api_helper.upload_file(self.reservation_id, file_name=file_name, file_stream=output)
+        return "{} samples of {} counters attached as {}".format(len(store), len(store.columns), file_name)
+
+    def _get_reservation_files_location(self):
+        """
+        Reservation folder under Test Files Location, created if not exists
+        :rtype: str
         """
         test_files_location = self._resource_config.test_files_location
 
@@ -249,14 +760,144 @@ class BPTestRunner(BPRunner):
         reservation_files = os.path.join(test_files_location, self.reservation_id)
         if not os.path.exists(reservation_files):
             os.makedirs(reservation_files)
-        test_file_path = os.path.join(
-            reservation_files,
-            test_name + ".bpt",
+        BPTestLibrary.mark_reservation_folder(reservation_files)
+        return reservation_files
+
+    def _get_test_names(self, test_names):
+        """
+        Expand comma separated test names and globs, globs are matched against the tests saved on the chassis
+        :param str test_names:
+        :rtype: list[str]
+        """
+        names = []
+        for pattern in self._split_list(test_names):
+            if any(char in pattern for char in "*?["):
+                search_string = re.split(r"[*?\[]", pattern, 1)[0]
+                matches = [
+                    name
+                    for name in self._download_test_file_flow.search_tests(search_string)
+                    if fnmatch.fnmatchcase(name.lower(), pattern.lower())
+                ]
+                if not matches:
+                    raise BPRunnerException(self.__class__.__name__, "No tests match {}".format(pattern))
+            else:
+                matches = [pattern]
+            names.extend(name for name in matches if name not in names)
+        if not names:
+            raise BPRunnerException(self.__class__.__name__, "Test name is not defined")
+        return names
+
+    def _download_test_file(self, test_name, location):
+        """
+        Stream the test file from the export cache or the chassis to the location,
+        the file is written to a temporary file and renamed.
+        The test can be changed on the chassis, so the cached file is used for TEST_FILE_CACHE_TTL seconds only
+        :return: manifest entry with path, size, duration and cached flag
+        :rtype: dict
+        """
+        start_time = time.time()
+        test_file_path = os.path.join(location, test_name + ".bpt")
+        export_cache = self._export_cache
+        cache_key = self._export_cache_key(test_name, "bpt")
+        cached_file = export_cache.open(cache_key, self.TEST_FILE_CACHE_TTL) if export_cache else None
+        file_descriptor, temp_path = tempfile.mkstemp(dir=location, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "wb") as test_file:
+                if cached_file:
+                    with cached_file:
+                        shutil.copyfileobj(cached_file, test_file)
+                else:
+                    self._download_test_file_flow.download_test_file_to(test_name, test_file)
+            os.replace(temp_path, test_file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        if export_cache and not cached_file:
+            with open(test_file_path, "rb") as test_file:
+                export_cache.put_file(cache_key, test_file)
+        return {
+            "test": test_name,
+            "path": test_file_path,
+            "size": os.path.getsize(test_file_path),
+            "duration": round(time.time() - start_time, 3),
+            "cached": bool(cached_file),
+        }
+
+    def _try_download_test_file(self, test_name, location):
+        try:
+            return self._download_test_file(test_name, location)
+        except Exception as e:
+            self.logger.exception("Failed to download test {}".format(test_name))
+            return {"test": test_name, "error": str(e)}
+
+    def get_test_file(self, test_name: str) -> str:
+        """Download test files from BP.
+
+        :param test_name: test name, comma separated test names or globs of the tests saved on the chassis
+        :return: file path of the single test or JSON manifest of the downloaded files
+        """
+        reservation_files = self._get_reservation_files_location()
+        test_names = self._get_test_names(test_name)
+        if test_names == [test_name.strip()]:
+            return self._download_test_file(test_names[0], reservation_files)["path"]
+
+        start_time = time.time()
+        # The chassis session is resolved before the workers share it
+        self.logger.debug("Downloading {} tests from {}".format(len(test_names), self.session_context_manager.hostname))
+        with ThreadPoolExecutor(
+            max_workers=min(self.TEST_DOWNLOAD_WORKERS, len(test_names)), thread_name_prefix="bp-test-file"
+        ) as executor:
+            manifest = list(executor.map(lambda name: self._try_download_test_file(name, reservation_files), test_names))
+        failed = [entry["test"] for entry in manifest if "error" in entry]
+        self.logger.info(
+            "Downloaded {} of {} tests in {:.2f}s".format(len(manifest) - len(failed), len(manifest), time.time() - start_time)
+        )
+        if len(failed) == len(manifest):
+            raise BPRunnerException(self.__class__.__name__, "Failed to download tests {}".format(", ".join(failed)))
+        return json.dumps(
+            {
+                "files": manifest,
+                "size": sum(entry.get("size", 0) for entry in manifest),
+                "duration": round(time.time() - start_time, 3),
+                "failed": failed,
+            },
+            indent=4,
         )
-        test_file_content = self._download_test_file_flow.download_test_file(test_name)
-        with open(test_file_path, "w") as f:
-            f.write(test_file_content.decode("utf-8"))
-        return test_file_path
+
+    def get_test_library(self, search=None):
+        """
+        Test files under Test Files Location with their network and interfaces
+        :param str search: substring or glob of the test name, file path or network name, empty - all the tests
+        :rtype: str
+        """
+        test_library = self._test_library
+        if not test_library:
+            raise BPRunnerException(
+                self.__class__.__name__, "Test Files Location attribute is not defined or the location is not writable"
+            )
+        return json.dumps(test_library.search(search), indent=4)
+
+    def get_lock_statistics(self):
+        """
+        Wait and hold time of the chassis locks of the driver process
+        :rtype: str
+        """
+        return json.dumps(FileBasedLock.statistics.to_dict(), indent=4, sort_keys=True)
+
+    def get_cache_statistics(self, clear="False"):
+        """
+        Statistics of the exported files cache
+        :param str clear: True - remove the cached files
+        :rtype: str
+        """
+        export_cache = self._export_cache
+        if not export_cache:
+            raise BPRunnerException(
+                self.__class__.__name__, "Test Files Location attribute is not defined or the location is not writable"
+            )
+        if str(clear).lower() == "true":
+            export_cache.clear()
+        return json.dumps(export_cache.statistics(), indent=4, sort_keys=True)
 
     def close_session(self):
         """
@@ -265,4 +906,5 @@ class BPTestRunner(BPRunner):
         """
         reservation_id = self.reservation_id
         self.logger.debug("Close session for reservation ID: ".format(reservation_id))
+        self._stop_statistics_sampler()
         self._port_reservation_helper.unreserve_ports(self._bp_session)
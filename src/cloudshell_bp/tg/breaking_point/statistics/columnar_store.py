@@ -0,0 +1,245 @@
+import json
+import math
+import sys
+import zipfile
+from array import array
+
+NAN = float("nan")
+
+
+def flatten_statistics(statistics, prefix=""):
+    """
+    Flatten nested RTS dictionaries into dotted counter names
+    :param dict statistics:
+    :param str prefix:
+    :rtype: dict
+    """
+    result = {}
+    for key, value in statistics.items():
+        name = "{}.{}".format(prefix, key) if prefix else str(key)
+        if isinstance(value, dict):
+            result.update(flatten_statistics(value, name))
+        else:
+            result[name] = value
+    return result
+
+
+def to_number(value):
+    """
+    Convert RTS value to int or float
+    :return: number or None for not numeric values
+    """
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+class ColumnarStatisticsStore(object):
+    """
+    Array backed statistics samples, one typed column per numeric counter.
+    Integer columns are promoted to float on the first float or missing value, missing values are NaN.
+    """
+
+    INT_TYPECODE = "q"
+    FLOAT_TYPECODE = "d"
+    INT_MIN = -(2**63)
+    INT_MAX = 2**63 - 1
+    HEADER_FILE = "columns.json"
+
+    def __init__(self):
+        self._timestamps = array(self.FLOAT_TYPECODE)
+        self._columns = {}
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    @property
+    def columns(self):
+        """
+        Counter names in order of appearance
+        :rtype: list[str]
+        """
+        return list(self._columns)
+
+    @property
+    def timestamps(self):
+        return self._timestamps
+
+    def column(self, name):
+        """
+        :rtype: array.array
+        """
+        return self._columns[name]
+
+    def add_column(self, name, column):
+        """
+        Add computed column
+        :param str name:
+        :param array.array column: one value per sample
+        :return: interned column name
+        """
+        if len(column) != len(self):
+            raise ValueError("Column {} has {} values, expected {}".format(name, len(column), len(self)))
+        name = sys.intern(name)
+        self._columns[name] = column
+        return name
+
+    def nbytes(self):
+        """
+        Size of the columns data
+        :rtype: int
+        """
+        return sum(column.itemsize * len(column) for column in [self._timestamps] + list(self._columns.values()))
+
+    def copy(self):
+        """
+        :rtype: ColumnarStatisticsStore
+        """
+        store = ColumnarStatisticsStore()
+        store._timestamps = self._timestamps[:]
+        store._columns = {name: column[:] for name, column in self._columns.items()}
+        return store
+
+    def _promote(self, name):
+        column = self._columns[name]
+        if column.typecode != self.FLOAT_TYPECODE:
+            column = self._columns[name] = array(self.FLOAT_TYPECODE, column)
+        return column
+
+    def _new_column(self, name, value):
+        name = sys.intern(name)
+        if isinstance(value, int) and self.INT_MIN <= value <= self.INT_MAX and not len(self):
+            column = array(self.INT_TYPECODE)
+        else:
+            column = array(self.FLOAT_TYPECODE, [NAN]) * len(self)
+        self._columns[name] = column
+        return name
+
+    def append(self, timestamp, sample):
+        """
+        Append one sample
+        :param float timestamp:
+        :param dict sample: flat {counter name: value}, not numeric values are ignored
+        """
+        size = len(self)
+        for name, value in sample.items():
+            value = to_number(value)
+            if value is None:
+                continue
+            if name not in self._columns:
+                name = self._new_column(name, value)
+            column = self._columns[name]
+            if column.typecode == self.INT_TYPECODE and not (isinstance(value, int) and self.INT_MIN <= value <= self.INT_MAX):
+                column = self._promote(name)
+            if len(column) == size:
+                column.append(value)
+        self._timestamps.append(timestamp)
+        for name, column in self._columns.items():
+            if len(column) == size:
+                self._promote(name).append(NAN)
+
+    def append_groups(self, timestamp, stats_by_group):
+        """
+        Append sample of several statistics groups, counters are prefixed by the group name
+        :param float timestamp:
+        :param dict stats_by_group: {stats_group: statistics}
+        """
+        self.append(timestamp, flatten_statistics(stats_by_group))
+
+    def rows(self, columns=None):
+        """
+        Yield samples as dictionaries with timestamp
+        :param list[str] columns: requested columns, all by default
+        """
+        columns = columns or self.columns
+        data = [self._columns[name] for name in columns]
+        for index, timestamp in enumerate(self._timestamps):
+            row = {"timestamp": timestamp}
+            for name, column in zip(columns, data):
+                value = column[index]
+                row[name] = None if value != value else value
+            yield row
+
+    def downsample(self, interval):
+        """
+        Aggregate samples into interval buckets with min, max and mean of each counter
+        :param float interval: bucket length, seconds
+        :rtype: ColumnarStatisticsStore
+        """
+        result = ColumnarStatisticsStore()
+        if not len(self):
+            return result
+        start = self._timestamps[0]
+        buckets = []
+        bucket_start = 0
+        bucket_id = None
+        for index, timestamp in enumerate(self._timestamps):
+            current_id = int((timestamp - start) // interval)
+            if current_id != bucket_id:
+                if bucket_id is not None:
+                    buckets.append((bucket_id, bucket_start, index))
+                bucket_id, bucket_start = current_id, index
+        buckets.append((bucket_id, bucket_start, len(self)))
+
+        result._timestamps = array(self.FLOAT_TYPECODE, (start + bucket_id * interval for bucket_id, _, _ in buckets))
+        for name, column in self._columns.items():
+            minimums = array(self.FLOAT_TYPECODE)
+            maximums = array(self.FLOAT_TYPECODE)
+            means = array(self.FLOAT_TYPECODE)
+            for _, first, last in buckets:
+                values = [value for value in column[first:last] if value == value]
+                minimums.append(min(values) if values else NAN)
+                maximums.append(max(values) if values else NAN)
+                means.append(math.fsum(values) / len(values) if values else NAN)
+            result._columns[sys.intern(name + ".min")] = minimums
+            result._columns[sys.intern(name + ".max")] = maximums
+            result._columns[sys.intern(name + ".mean")] = means
+        return result
+
+    def export(self, file_object):
+        """
+        Write compressed store, zip archive with columns header and one raw array file per column
+        :param file_object: binary file object
+        """
+        header = {
+            "rows": len(self),
+            "byteorder": sys.byteorder,
+            "columns": [{"name": name, "typecode": column.typecode} for name, column in self._columns.items()],
+        }
+        with zipfile.ZipFile(file_object, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(self.HEADER_FILE, json.dumps(header))
+            archive.writestr("timestamps.{}".format(self.FLOAT_TYPECODE), self._timestamps.tobytes())
+            for index, column in enumerate(self._columns.values()):
+                archive.writestr("{}.{}".format(index, column.typecode), column.tobytes())
+
+    @classmethod
+    def load(cls, file_object):
+        """
+        Read store written by export
+        :param file_object: binary file object
+        :rtype: ColumnarStatisticsStore
+        """
+        store = cls()
+        with zipfile.ZipFile(file_object) as archive:
+            header = json.loads(archive.read(cls.HEADER_FILE))
+            swap = header["byteorder"] != sys.byteorder
+            store._timestamps.frombytes(archive.read("timestamps.{}".format(cls.FLOAT_TYPECODE)))
+            if swap:
+                store._timestamps.byteswap()
+            for index, column_info in enumerate(header["columns"]):
+                column = array(column_info["typecode"])
+                column.frombytes(archive.read("{}.{}".format(index, column_info["typecode"])))
+                if swap:
+                    column.byteswap()
+                store._columns[sys.intern(column_info["name"])] = column
+        return store
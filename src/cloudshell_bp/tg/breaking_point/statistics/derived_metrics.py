@@ -0,0 +1,187 @@
+import fnmatch
+import math
+import operator
+from array import array
+from itertools import accumulate, compress, filterfalse
+
+from cloudshell_bp.tg.breaking_point.statistics.columnar_store import NAN
+
+FLOAT_TYPECODE = "d"
+DERIVED_SUFFIXES = (".delta", ".rate", ".rate_avg")
+
+_negative = (0.0).__gt__
+_not_positive = (0.0).__ge__
+
+
+def _indexes(values, predicate):
+    """
+    Indexes of the values matching the predicate, the values are tested without Python level loop
+    :param array.array values:
+    :param predicate: callable(value) -> bool
+    :rtype: list[int]
+    """
+    return list(compress(range(len(values)), map(predicate, values)))
+
+
+def deltas(values):
+    """
+    Differences of cumulative counter samples, a counter reset (value decreased) starts from zero
+    :param array.array values:
+    :rtype: array.array
+    """
+    result = array(FLOAT_TYPECODE, [NAN] if len(values) else [])
+    result.extend(map(operator.sub, values[1:], values[:-1]))
+    for index in _indexes(result, _negative):
+        result[index] = values[index]
+    return result
+
+
+def intervals(timestamps):
+    """
+    Seconds between the samples, not positive intervals are missing
+    :param array.array timestamps:
+    :rtype: array.array
+    """
+    result = deltas(timestamps)
+    for index in _indexes(result, _not_positive):
+        result[index] = NAN
+    return result
+
+
+def _rates(counter_deltas, sample_intervals):
+    """
+    :param array.array counter_deltas:
+    :param array.array sample_intervals:
+    :rtype: array.array
+    """
+    return array(FLOAT_TYPECODE, map(operator.truediv, counter_deltas, sample_intervals))
+
+
+def rates(timestamps, values):
+    """
+    Per second rates of cumulative counter samples
+    :param array.array timestamps:
+    :param array.array values:
+    :rtype: array.array
+    """
+    return _rates(deltas(values), intervals(timestamps))
+
+
+def moving_average(values, window):
+    """
+    Trailing moving average, missing values are skipped
+    :param array.array values:
+    :param int window: number of samples
+    :rtype: array.array
+    """
+    size = len(values)
+    head = min(window, size)
+    present_values = array(FLOAT_TYPECODE, values)
+    counts = array(FLOAT_TYPECODE, range(1, head + 1))
+    counts.extend(array(FLOAT_TYPECODE, [window]) * (size - head))
+    # Missing values are rare, they are excluded from the windows covering them one by one
+    for index in _indexes(values, math.isnan):
+        present_values[index] = 0.0
+        for window_end in range(index, min(index + window, size)):
+            counts[window_end] -= 1
+    for index in _indexes(counts, _not_positive):
+        counts[index] = NAN
+    sums = array(FLOAT_TYPECODE, [0.0])
+    sums.extend(accumulate(present_values))
+    window_sums = sums[1 : head + 1]
+    window_sums.extend(map(operator.sub, sums[window + 1 :], sums[1:]))
+    return array(FLOAT_TYPECODE, map(operator.truediv, window_sums, counts))
+
+
+def percentiles(values, percents):
+    """
+    Percentiles with linear interpolation, missing values are skipped
+    :param array.array values:
+    :param list[float] percents: 0..100
+    :rtype: dict
+    """
+    ordered = sorted(filterfalse(math.isnan, values))
+    result = {}
+    for percent in percents:
+        if not ordered:
+            result[percent] = None
+            continue
+        position = (len(ordered) - 1) * percent / 100.0
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        result[percent] = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+    return result
+
+
+class DerivedMetrics(object):
+    """
+    Derived metrics of cumulative counters sampled into ColumnarStatisticsStore:
+    <counter>.delta, <counter>.rate (per second) and <counter>.rate_avg (moving average of the rate)
+    """
+
+    DEFAULT_WINDOW = 10
+    PERCENTILES = [50, 90, 95, 99]
+
+    def __init__(self, counters=None, window=DEFAULT_WINDOW):
+        """
+        :param list[str] counters: counter names or shell-style patterns, None - all counters
+        :param int window: moving average window, samples
+        """
+        self._counters = counters
+        self._window = window
+
+    def _select(self, store):
+        columns = store.columns
+        if not self._counters:
+            return columns
+        return [name for name in columns if any(fnmatch.fnmatchcase(name, pattern) for pattern in self._counters)]
+
+    def apply(self, store):
+        """
+        Add derived columns to the store
+        :type store: cloudshell_bp.tg.breaking_point.statistics.columnar_store.ColumnarStatisticsStore
+        :return: added columns
+        :rtype: list[str]
+        """
+        added = []
+        sample_intervals = intervals(store.timestamps)
+        for name in self._select(store):
+            counter_deltas = deltas(store.column(name))
+            counter_rates = _rates(counter_deltas, sample_intervals)
+            for suffix, column in [
+                ("delta", counter_deltas),
+                ("rate", counter_rates),
+                ("rate_avg", moving_average(counter_rates, self._window)),
+            ]:
+                added.append(store.add_column("{}.{}".format(name, suffix), column))
+        return added
+
+    def summary(self, store):
+        """
+        Rate percentiles, min, max and mean of the selected counters,
+        the rates added to the store by apply are reused
+        :type store: cloudshell_bp.tg.breaking_point.statistics.columnar_store.ColumnarStatisticsStore
+        :rtype: dict
+        """
+        result = {}
+        columns = set(store.columns)
+        sample_intervals = None
+        for name in self._select(store):
+            if name.endswith(DERIVED_SUFFIXES):
+                continue
+            rate_name = "{}.rate".format(name)
+            if rate_name in columns:
+                counter_rates = store.column(rate_name)
+            else:
+                if sample_intervals is None:
+                    sample_intervals = intervals(store.timestamps)
+                counter_rates = _rates(deltas(store.column(name)), sample_intervals)
+            counter_rates = list(filterfalse(math.isnan, counter_rates))
+            counter_summary = {
+                "p{}".format(percent): value for percent, value in percentiles(counter_rates, self.PERCENTILES).items()
+            }
+            counter_summary["min"] = min(counter_rates) if counter_rates else None
+            counter_summary["max"] = max(counter_rates) if counter_rates else None
+            counter_summary["mean"] = sum(counter_rates) / len(counter_rates) if counter_rates else None
+            result[rate_name] = counter_summary
+        return result
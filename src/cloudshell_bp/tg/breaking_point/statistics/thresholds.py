@@ -0,0 +1,240 @@
+import operator
+import re
+from threading import Lock
+
+from cloudshell_bp.tg.breaking_point.statistics.columnar_store import flatten_statistics, to_number
+
+
+class ThresholdRule(object):
+    """
+    KPI assertion on one RTS counter: [function(]group.counter[)] operator value[!]
+    Without function each sample must satisfy the condition, min, max, avg and last are checked against
+    the aggregate of all the samples. Trailing ! marks a hard rule, its final failure stops the evaluation.
+    """
+
+    OPERATORS = {
+        "<=": operator.le,
+        ">=": operator.ge,
+        "==": operator.eq,
+        "!=": operator.ne,
+        "<": operator.lt,
+        ">": operator.gt,
+    }
+    FUNCTIONS = ["min", "max", "avg", "last"]
+    RULE_PATTERN = re.compile(
+        r"^\s*(?:(?P<function>{})\(\s*(?P<counter>[^()<>=!]+?)\s*\)|(?P<sample_counter>[^()<>=!]+?))"
+        r"\s*(?P<operator><=|>=|==|!=|<|>)\s*(?P<value>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*(?P<hard>!?)\s*$".format(
+            "|".join(FUNCTIONS)
+        )
+    )
+
+    PASSED = "passed"
+    FAILED = "failed"
+    NO_DATA = "no data"
+
+    def __init__(self, counter, operator_name, value, function=None, hard=False):
+        """
+        :param str counter: group prefixed counter name, e.g. summary.sessionsFailed
+        :param str operator_name: one of OPERATORS
+        :param float value: threshold
+        :param str function: one of FUNCTIONS, None - check each sample
+        :param bool hard: stop evaluation on final failure
+        """
+        group, _, name = counter.partition(".")
+        self.counter = "{}.{}".format(group.lower(), name) if name else counter
+        self.operator_name = operator_name
+        self.value = value
+        self.function = function
+        self.hard = hard
+        self._compare = self.OPERATORS[operator_name]
+        self.samples_count = 0
+        self.actual = None
+        self.violation_timestamp = None
+        self._sum = 0.0
+        self._min = None
+        self._max = None
+
+    @classmethod
+    def parse(cls, text):
+        """
+        :param str text: rule, e.g. max(summary.sessionsFailed)<=10!
+        :rtype: ThresholdRule
+        """
+        match = cls.RULE_PATTERN.match(text)
+        if not match:
+            raise ValueError(
+                "Incorrect threshold rule '{}', expected [function(]group.counter[)]<operator><value>[!]".format(text)
+            )
+        return cls(
+            match.group("counter") or match.group("sample_counter"),
+            match.group("operator"),
+            float(match.group("value")),
+            match.group("function"),
+            bool(match.group("hard")),
+        )
+
+    def __str__(self):
+        counter = "{}({})".format(self.function, self.counter) if self.function else self.counter
+        return "{}{}{:g}{}".format(counter, self.operator_name, self.value, "!" if self.hard else "")
+
+    @property
+    def group(self):
+        return self.counter.split(".", 1)[0].lower()
+
+    @property
+    def final(self):
+        """
+        Failure can not be recovered by the next samples
+        """
+        if self.function is None:
+            return True
+        if self.function == "max":
+            return self.operator_name in ["<", "<="]
+        if self.function == "min":
+            return self.operator_name in [">", ">="]
+        return False
+
+    @property
+    def passed(self):
+        """
+        :return: None - no samples
+        """
+        if not self.samples_count:
+            return None
+        if self.function is None:
+            return self.violation_timestamp is None
+        return bool(self._compare(self.actual, self.value))
+
+    @property
+    def status(self):
+        passed = self.passed
+        return self.NO_DATA if passed is None else self.PASSED if passed else self.FAILED
+
+    def update(self, timestamp, value):
+        """
+        Add sample value
+        :return: True if the rule failed finally by this sample
+        """
+        failed_before = self.samples_count and self.passed is False
+        self.samples_count += 1
+        self._sum += value
+        self._min = value if self._min is None else min(self._min, value)
+        self._max = value if self._max is None else max(self._max, value)
+        if self.function == "min":
+            self.actual = self._min
+        elif self.function == "max":
+            self.actual = self._max
+        elif self.function == "avg":
+            self.actual = self._sum / self.samples_count
+        elif self.function == "last":
+            self.actual = value
+        elif self.violation_timestamp is None:
+            self.actual = value
+            if not self._compare(value, self.value):
+                self.violation_timestamp = timestamp
+        if self.function and not failed_before and not self._compare(self.actual, self.value):
+            self.violation_timestamp = timestamp
+        return bool(not failed_before and self.final and self.passed is False)
+
+    def to_dict(self):
+        return {
+            "rule": str(self),
+            "status": self.status,
+            "actual": self.actual,
+            "samples": self.samples_count,
+            "violation_timestamp": self.violation_timestamp,
+        }
+
+
+class ThresholdEngine(object):
+    """
+    Evaluates threshold rules incrementally on each RTS sample
+    """
+
+    RULES_SEPARATOR = re.compile(r"[;,\n]")
+
+    def __init__(self, rules):
+        """
+        :param list[ThresholdRule] rules:
+        """
+        self.rules = rules
+        self.hard_failures = []
+        self.samples_count = 0
+        self.completed = False
+        self._lock = Lock()
+
+    @classmethod
+    def parse(cls, text):
+        """
+        :param str text: semicolon or comma separated rules
+        :rtype: ThresholdEngine
+        """
+        return cls([ThresholdRule.parse(rule) for rule in cls.RULES_SEPARATOR.split(text or "") if rule.strip()])
+
+    @property
+    def stats_groups(self):
+        """
+        Statistics groups required by the rules
+        :rtype: list[str]
+        """
+        groups = []
+        for rule in self.rules:
+            if rule.group not in groups:
+                groups.append(rule.group)
+        return groups
+
+    @property
+    def failed(self):
+        return bool(self.hard_failures)
+
+    def evaluate(self, timestamp, stats_by_group):
+        """
+        Update the rules with the sample, evaluation is short-circuited after a hard failure
+        :param float timestamp:
+        :param dict stats_by_group: {stats_group: statistics}
+        :return: hard rules failed by this sample
+        :rtype: list[ThresholdRule]
+        """
+        counters = flatten_statistics(stats_by_group)
+        failed = []
+        with self._lock:
+            if self.hard_failures or self.completed:
+                return failed
+            self.samples_count += 1
+            for rule in self.rules:
+                value = to_number(counters.get(rule.counter))
+                if value is None:
+                    continue
+                if rule.update(timestamp, value) and rule.hard:
+                    failed.append(rule)
+            self.hard_failures.extend(failed)
+        return failed
+
+    def complete(self):
+        """
+        Stop evaluation, the test finished
+        """
+        with self._lock:
+            self.completed = True
+
+    def result(self):
+        """
+        :return: {"passed": bool or None, "completed": bool, "hard_failures": [rule], "samples": int, "rules": [...]}
+        :rtype: dict
+        """
+        with self._lock:
+            rules = [rule.to_dict() for rule in self.rules]
+            statuses = [rule["status"] for rule in rules]
+            if ThresholdRule.FAILED in statuses:
+                passed = False
+            elif ThresholdRule.NO_DATA in statuses:
+                passed = None
+            else:
+                passed = True
+            return {
+                "passed": passed,
+                "completed": self.completed or self.failed,
+                "hard_failures": [str(rule) for rule in self.hard_failures],
+                "samples": self.samples_count,
+                "rules": rules,
+            }
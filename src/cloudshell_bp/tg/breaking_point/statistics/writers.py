@@ -0,0 +1,151 @@
+import csv
+import gzip
+import io
+import json
+from abc import ABCMeta, abstractmethod
+
+TIMESTAMP_COLUMN = "timestamp"
+
+
+def statistics_columns(rows):
+    """
+    Stable column order of the rows, timestamp first and then the keys in order of the first appearance
+    :param list[dict] rows:
+    :rtype: list[str]
+    """
+    columns = {}
+    for row in rows:
+        columns.update(dict.fromkeys(row))
+    if TIMESTAMP_COLUMN in columns:
+        return [TIMESTAMP_COLUMN] + [name for name in columns if name != TIMESTAMP_COLUMN]
+    return list(columns)
+
+
+class StatisticsWriter(object):
+    """
+    Incremental statistics serializer, rows are encoded and written to the binary file object one by one,
+    the whole document is never kept in memory
+    """
+
+    __metaclass__ = ABCMeta
+
+    EXTENSION = None
+    ENCODING = "utf-8"
+
+    def __init__(self, file_object, columns=None, compress=False):
+        """
+        :param file_object: binary file object, it is not closed by the writer
+        :param list[str] columns: column order, None - columns of the first row
+        :param bool compress: gzip the output
+        """
+        self._gzip_file = gzip.GzipFile(fileobj=file_object, mode="wb") if compress else None
+        self._output = io.TextIOWrapper(self._gzip_file or file_object, encoding=self.ENCODING, newline="")
+        self._columns = list(columns) if columns else None
+        self.rows_count = 0
+        self._closed = False
+
+    @property
+    def columns(self):
+        return list(self._columns or [])
+
+    def _start(self):
+        pass
+
+    @abstractmethod
+    def _write_row(self, row):
+        pass
+
+    def _finish(self):
+        pass
+
+    def write_row(self, row):
+        """
+        :param dict row: {column: value}
+        """
+        if self._columns is None:
+            self._columns = statistics_columns([row])
+        if not self.rows_count:
+            self._start()
+        self._write_row(row)
+        self.rows_count += 1
+
+    def write_rows(self, rows):
+        """
+        :param rows: iterable of dictionaries, consumed lazily
+        """
+        for row in rows:
+            self.write_row(row)
+
+    def close(self):
+        """
+        Finish the document, flush and detach from the file object
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if not self.rows_count:
+            self._columns = self._columns or []
+            self._start()
+        self._finish()
+        self._output.flush()
+        self._output.detach()
+        if self._gzip_file:
+            self._gzip_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CsvStatisticsWriter(StatisticsWriter):
+    """
+    CSV header followed by one line per row, keys missing in the header are ignored
+    """
+
+    EXTENSION = "csv"
+
+    def _start(self):
+        self._writer = csv.DictWriter(self._output, self._columns, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def _write_row(self, row):
+        self._writer.writerow(row)
+
+
+class JsonStatisticsWriter(StatisticsWriter):
+    """
+    JSON list of row objects with keys in column order, new keys of the later rows are appended to the columns
+    """
+
+    EXTENSION = "json"
+
+    def _start(self):
+        self._known_columns = set(self._columns)
+        self._output.write("[")
+
+    def _write_row(self, row):
+        if any(key not in self._known_columns for key in row):
+            self._columns.extend(key for key in row if key not in self._known_columns)
+            self._known_columns.update(row)
+        document = {name: row.get(name) for name in self._columns}
+        self._output.write("{}\n    {}".format("," if self.rows_count else "", json.dumps(document, ensure_ascii=False)))
+
+    def _finish(self):
+        self._output.write("\n]" if self.rows_count else "]")
+
+
+WRITERS = {writer.EXTENSION: writer for writer in [CsvStatisticsWriter, JsonStatisticsWriter]}
+
+
+def get_statistics_writer(output_format, file_object, columns=None, compress=False):
+    """
+    :param str output_format: csv or json
+    :rtype: StatisticsWriter
+    """
+    try:
+        writer_class = WRITERS[output_format.lower()]
+    except KeyError:
+        raise ValueError("Unsupported statistics format {}, supported {}".format(output_format, ", ".join(WRITERS)))
+    return writer_class(file_object, columns, compress)
@@ -0,0 +1,88 @@
+import time
+
+
+class AdaptivePoller(object):
+    """
+    Polling intervals generator, starts with short interval and backs off while the polled operation runs.
+    When progress of the operation is known the interval follows the estimated remaining time.
+    """
+
+    INITIAL_INTERVAL = 0.5
+    MAX_INTERVAL = 30
+    BACKOFF = 1.5
+    SLEEP_STEP = 1
+
+    def __init__(
+        self,
+        initial_interval=INITIAL_INTERVAL,
+        max_interval=MAX_INTERVAL,
+        backoff=BACKOFF,
+        timeout=None,
+        cancellation_context=None,
+    ):
+        """
+        :param float initial_interval: first polling interval, seconds
+        :param float max_interval: longest polling interval, seconds
+        :param float backoff: interval multiplier
+        :param float timeout: overall deadline in seconds, None - no deadline
+        :param cancellation_context: cloudshell.shell.core.driver_context.CancellationContext
+        """
+        self._initial_interval = initial_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._timeout = timeout
+        self._cancellation_context = cancellation_context
+        self._interval = initial_interval
+        self._start_time = time.time()
+        self.progress = None
+        self.polls_count = 0
+
+    @property
+    def elapsed(self):
+        return time.time() - self._start_time
+
+    @property
+    def cancelled(self):
+        return bool(self._cancellation_context and self._cancellation_context.is_cancelled)
+
+    @property
+    def timed_out(self):
+        return self._timeout is not None and self.elapsed >= self._timeout
+
+    def next_interval(self):
+        """
+        Next polling interval based on the backoff and the reported progress (percents)
+        :rtype: float
+        """
+        interval = self._interval
+        self._interval = min(self._interval * self._backoff, self._max_interval)
+        if self.progress is not None and 0 < self.progress < 100:
+            remaining = self.elapsed * (100 - self.progress) / self.progress
+            interval = min(max(remaining / 2, self._initial_interval), self._max_interval)
+        if self._timeout is not None:
+            interval = min(interval, max(self._timeout - self.elapsed, 0))
+        return interval
+
+    def sleep(self):
+        """
+        Sleep next interval in short steps to react on cancellation
+        :return: False if cancelled or deadline reached
+        :rtype: bool
+        """
+        wake_time = time.time() + self.next_interval()
+        while not self.cancelled and not self.timed_out:
+            remaining = wake_time - time.time()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, self.SLEEP_STEP))
+        return False
+
+    def __iter__(self):
+        """
+        Yield poll number until stopped, cancelled or the deadline is reached
+        """
+        while not self.cancelled:
+            self.polls_count += 1
+            yield self.polls_count
+            if not self.sleep():
+                break
@@ -1,12 +1,143 @@
+import os
+import re
+import tempfile
+import time
+from threading import Lock
+
 import portalocker
 
+from cloudshell_bp.tg.breaking_point.bp_exception import BPException
+
+
+class LockTimeoutException(BPException):
+    pass
+
+
+class LockStatistics(object):
+    """
+    Wait and hold time of the file locks of the driver process by lock file
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._lock = Lock()
+
+    def _entry(self, name):
+        return self._locks.setdefault(
+            name, {"acquired": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0, "hold_total": 0.0, "hold_max": 0.0}
+        )
+
+    def acquired(self, name, wait_time, hold_time):
+        with self._lock:
+            entry = self._entry(name)
+            entry["acquired"] += 1
+            entry["wait_total"] += wait_time
+            entry["wait_max"] = max(entry["wait_max"], wait_time)
+            entry["hold_total"] += hold_time
+            entry["hold_max"] = max(entry["hold_max"], hold_time)
+
+    def timed_out(self, name):
+        with self._lock:
+            self._entry(name)["timeouts"] += 1
+
+    def to_dict(self):
+        """
+        :return: {lock file name: {acquired, timeouts, wait_total, wait_max, hold_total, hold_max}}
+        :rtype: dict
+        """
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._locks.items()}
+
 
 class FileBasedLock(object):
-    def __init__(self, lock_file_path):
-        self._file_descriptor = open(lock_file_path, "w")
+    """
+    Exclusive lock of the file shared by the driver processes,
+    waits up to the timeout for the lock and records the wait and hold time
+    """
+
+    LOCK_DIR_ENV = "BP_LOCK_DIR"
+    DEFAULT_LOCK_DIR = os.path.join(tempfile.gettempdir(), "breakingpoint_locks")
+    POLL_INTERVAL = 0.1
+    statistics = LockStatistics()
+
+    def __init__(self, lock_file_path, timeout=None, logger=None):
+        """
+        :param str lock_file_path:
+        :param float timeout: seconds to wait for the lock, None - wait forever
+        :param logger:
+        """
+        self._lock_file_path = lock_file_path
+        self._timeout = timeout
+        self._logger = logger
+        self._file_descriptor = None
+        self._wait_time = None
+        self._acquire_time = None
+
+    @classmethod
+    def lock_dir(cls):
+        """
+        Folder of the chassis locks, BP_LOCK_DIR environment variable or temporary folder
+        :rtype: str
+        """
+        lock_dir = os.environ.get(cls.LOCK_DIR_ENV) or cls.DEFAULT_LOCK_DIR
+        if not os.path.exists(lock_dir):
+            os.makedirs(lock_dir, exist_ok=True)
+        return lock_dir
+
+    @classmethod
+    def chassis_path(cls, name, chassis, extension="lock"):
+        """
+        Path of the chassis file in the locks folder
+        :param str name: resource name, e.g. port_reservation
+        :param str chassis: chassis address
+        :param str extension:
+        :rtype: str
+        """
+        file_name = "{}.{}.{}".format(name, re.sub(r"[^\w.-]", "_", chassis or "default"), extension)
+        return os.path.join(cls.lock_dir(), file_name)
+
+    @classmethod
+    def for_chassis(cls, name, chassis, timeout=None, logger=None):
+        """
+        Lock of the chassis resource, locks of different chassis never block each other
+        :param str name: locked resource, e.g. port_reservation
+        :param str chassis: chassis address
+        :rtype: FileBasedLock
+        """
+        return cls(cls.chassis_path(name, chassis), timeout, logger)
+
+    @property
+    def name(self):
+        return os.path.basename(self._lock_file_path)
 
     def __enter__(self):
-        portalocker.lock(self._file_descriptor, portalocker.LOCK_EX)
+        start_time = time.time()
+        self._file_descriptor = open(self._lock_file_path, "w")
+        if self._timeout is None:
+            portalocker.lock(self._file_descriptor, portalocker.LOCK_EX)
+        else:
+            while True:
+                try:
+                    portalocker.lock(self._file_descriptor, portalocker.LOCK_EX | portalocker.LOCK_NB)
+                    break
+                except portalocker.LockException:
+                    if time.time() - start_time >= self._timeout:
+                        self._file_descriptor.close()
+                        self.statistics.timed_out(self.name)
+                        raise LockTimeoutException(
+                            self.__class__.__name__,
+                            "Timeout after {}s waiting for lock {}, it is held by another reservation".format(
+                                self._timeout, self._lock_file_path
+                            ),
+                        )
+                    time.sleep(self.POLL_INTERVAL)
+        self._acquire_time = time.time()
+        self._wait_time = self._acquire_time - start_time
+        return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        hold_time = time.time() - self._acquire_time
         self._file_descriptor.close()
+        self.statistics.acquired(self.name, self._wait_time, hold_time)
+        if self._logger:
+            self._logger.debug("Lock {} waited {:.3f}s, held {:.3f}s".format(self._lock_file_path, self._wait_time, hold_time))
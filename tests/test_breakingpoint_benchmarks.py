@@ -0,0 +1,279 @@
+"""
+Benchmark BreakingPoint controller data processing.
+"""
+import io
+import logging
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Tuple
+from xml.etree import ElementTree
+
+from test_breakingpoint_flows import BPStandInServer
+
+from cloudshell_bp.tg.breaking_point.actions.port_reservation_actions import PortReservationActions
+from cloudshell_bp.tg.breaking_point.entities.bp_session import BPSession
+from cloudshell_bp.tg.breaking_point.entities.bp_test_model import BPTestModel
+from cloudshell_bp.tg.breaking_point.flows.bp_port_reservation_flow import BPPortReservationFlow
+from cloudshell_bp.tg.breaking_point.helpers.port_reservation_helper import PortReservationHelper
+from cloudshell_bp.tg.breaking_point.rest_api.rest_session_manager import RestSessionContextManager
+from cloudshell_bp.tg.breaking_point.rest_api.rest_session_pool import RestSessionPool
+from cloudshell_bp.tg.breaking_point.statistics.columnar_store import ColumnarStatisticsStore
+from cloudshell_bp.tg.breaking_point.statistics.derived_metrics import DerivedMetrics
+from cloudshell_bp.tg.breaking_point.statistics.writers import get_statistics_writer
+from cloudshell_bp.tg.breaking_point.utils.file_based_lock import FileBasedLock
+
+logger = logging.getLogger(__name__)
+
+SAMPLES = 3600
+COUNTERS = 200
+
+
+def measure(function: Callable) -> Tuple[object, int, float]:
+    """Return function result, memory allocated by the result and peak memory (bytes) and duration (seconds)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    duration = time.perf_counter() - start
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    logger.info(f"{function.__name__}: allocated {allocated / 2**20:.1f} MB, peak {peak / 2**20:.1f} MB, {duration:.3f} s")
+    return result, allocated, duration
+
+
+def rts_sample(second: int) -> dict:
+    """Generate RTS like sample with cumulative counters."""
+    return {f"counter{counter}": second * (counter + 1) * 1000 for counter in range(COUNTERS)}
+
+
+class TestStatisticsStorageBenchmark:
+    """Compare statistics samples storage."""
+
+    def test_columnar_vs_dicts(self) -> None:
+        """Columnar store must be several times smaller than the list of RTS dicts."""
+
+        def dicts() -> list:
+            return [dict(rts_sample(second), timestamp=float(second)) for second in range(SAMPLES)]
+
+        def columnar() -> ColumnarStatisticsStore:
+            store = ColumnarStatisticsStore()
+            for second in range(SAMPLES):
+                store.append(float(second), rts_sample(second))
+            return store
+
+        _, dicts_memory, _ = measure(dicts)
+        store, columnar_memory, _ = measure(columnar)
+        assert len(store) == SAMPLES
+        assert columnar_memory * 4 < dicts_memory
+
+        output = io.BytesIO()
+        store.export(output)
+        logger.info(f"Exported {store.nbytes() / 2**20:.1f} MB to {len(output.getvalue()) / 2**20:.1f} MB")
+        assert len(output.getvalue()) < store.nbytes()
+
+
+class TestDerivedMetricsBenchmark:
+    """Measure derived metrics computation."""
+
+    def test_100k_samples(self) -> None:
+        """Derived metrics of 100k samples series are kept as typed columns of one value per sample."""
+        store = ColumnarStatisticsStore()
+        for second in range(100000):
+            store.append(float(second), {"frames": second * 1000 if second < 50000 else (second - 49999) * 1000})
+        counters_nbytes = store.nbytes()
+        # Durations are measured without tracemalloc which slows down the allocations
+        timed_store = store.copy()
+        start = time.perf_counter()
+        DerivedMetrics().apply(timed_store)
+        apply_duration = time.perf_counter() - start
+        counters_summary = DerivedMetrics().summary(timed_store)
+        summary_duration = time.perf_counter() - start - apply_duration
+        logger.info(f"100k samples counter: apply {apply_duration * 1000:.0f} ms, summary {summary_duration * 1000:.0f} ms")
+        assert counters_summary == {"frames.rate": dict.fromkeys(["p50", "p90", "p95", "p99", "min", "max", "mean"], 1000)}
+
+        def derived_metrics() -> list:
+            return DerivedMetrics().apply(store)
+
+        added, allocated, _ = measure(derived_metrics)
+        derived_nbytes = store.nbytes() - counters_nbytes
+        assert added == ["frames.delta", "frames.rate", "frames.rate_avg"]
+        assert [len(store.column(name)) for name in added] == [len(store)] * 3 == [100000] * 3
+        assert derived_nbytes == 3 * 100000 * 8
+        assert allocated < derived_nbytes * 1.5
+        assert set(store.column("frames.rate")[1:]) == {1000}
+
+
+class TestStatisticsWriterBenchmark:
+    """Measure statistics export memory."""
+
+    ROWS = 1000000
+
+    @staticmethod
+    def export(path: Path, rows: int) -> int:
+        """Write gzipped CSV rows to the file."""
+        with open(path, "wb") as output:
+            columns = ["timestamp", "frames", "bytes", "rate"]
+            with get_statistics_writer("csv", output, columns, compress=True) as writer:
+                writer.write_rows(
+                    {"timestamp": float(row), "frames": row * 10, "bytes": row * 1000, "rate": row / 3} for row in range(rows)
+                )
+        return writer.rows_count
+
+    def test_million_rows(self, tmp_path: Path) -> None:
+        """Peak memory of million rows export does not depend on the number of rows."""
+        peaks = []
+        tracemalloc.start()
+        for rows in [self.ROWS // 100, self.ROWS]:
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            assert self.export(tmp_path / f"{rows}.csv.gz", rows) == rows
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            size = (tmp_path / f"{rows}.csv.gz").stat().st_size
+            logger.info(
+                f"{rows} rows: peak {peaks[-1] / 2**20:.2f} MB, "
+                f"{size / 2**20:.1f} MB file, {time.perf_counter() - start:.1f} s"
+            )
+        tracemalloc.stop()
+        assert peaks[1] < peaks[0] * 2
+        assert peaks[1] < 2**20
+
+
+class CountingReader:
+    """Binary file wrapper counting the bytes read by the parser."""
+
+    def __init__(self, file_object: io.BufferedReader) -> None:
+        """Wrap the file opened in binary mode."""
+        self._file_object = file_object
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Read from the wrapped file."""
+        data = self._file_object.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class TestTestModelParseBenchmark:
+    """Compare reading the test model of a large .bpt file."""
+
+    SUPER_FLOWS = 50000
+
+    def large_test_file(self, path: Path) -> Path:
+        """Append synthetic super flows after the test model of the sample test file."""
+        content = (Path(__file__).parent / "TestConfig.bpt").read_text()
+        head, tail = content.rsplit("</modelExport>", 1)
+        super_flow = '<superflow name="flow{}"><host iface="origin" id="client"/><flow from="client" to="server" />'
+        super_flow += "<action id='1' type='client.send'><param name='data'>" + "x" * 256 + "</param></action></superflow>"
+        with open(path, "w") as test_file:
+            test_file.write(head)
+            for number in range(self.SUPER_FLOWS):
+                test_file.write(super_flow.format(number))
+            test_file.write("</modelExport>" + tail)
+        return path
+
+    def test_streaming_parse(self, tmp_path: Path) -> None:
+        """Incremental parse stops after the test model, full DOM parse reads the whole file."""
+        path = self.large_test_file(tmp_path / "large.bpt")
+
+        def dom_parse(test_file: CountingReader) -> tuple:
+            test_model = ElementTree.parse(test_file).getroot().find("testmodel")
+            return test_model.get("network"), [int(interface.get("number")) for interface in test_model.findall("interface")]
+
+        def streaming_parse(test_file: CountingReader) -> tuple:
+            test_model = BPTestModel.from_file(test_file)
+            return test_model.network_name, test_model.interfaces
+
+        results = []
+        for function in [dom_parse, streaming_parse]:
+            with open(path, "rb") as test_file:
+                counting_file = CountingReader(test_file)
+                tracemalloc.start()
+                start = time.perf_counter()
+                results.append(function(counting_file))
+                duration = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            logger.info(
+                f"{function.__name__} of {path.stat().st_size / 2**20:.0f} MB: "
+                f"read {counting_file.bytes_read / 2**20:.2f} MB, peak {peak / 2**20:.2f} MB, {duration:.3f} s"
+            )
+            results.append((peak, counting_file.bytes_read))
+        (dom_result, (dom_peak, dom_read), streaming_result, (streaming_peak, streaming_read)) = results
+        assert dom_result == streaming_result == ("BreakingPoint Switching", [1, 2])
+        assert dom_read == path.stat().st_size
+        assert streaming_read * 100 < dom_read
+        assert streaming_peak * 100 < dom_peak
+
+
+class PerPortReservationFlow(BPPortReservationFlow):
+    """Reservation flow issuing one request per port."""
+
+    def reserve_ports(self, group, ports):
+        """Reserve the ports one by one."""
+        with self._session_context_manager as rest_service:
+            port_reservation = PortReservationActions(rest_service, self._logger)
+            for slot, port in ports:
+                port_reservation.reserve_port(slot, [port], group)
+
+    def unreserve_ports(self, ports):
+        """Unreserve the ports one by one."""
+        with self._session_context_manager as rest_service:
+            port_reservation = PortReservationActions(rest_service, self._logger)
+            for slot, port in ports:
+                port_reservation.unreserve_port(slot, [port])
+
+
+class TestPortReservationBenchmark:
+    """Compare per port and per slot reservation requests against the stand-in server."""
+
+    PORTS = [(str(slot), str(port)) for slot in [1, 2] for port in range(8)]
+
+    def test_batched_reservation(self, monkeypatch, tmp_path: Path) -> None:
+        """Reloading 16 ports on 2 slots takes 4 reservation requests instead of 32."""
+        monkeypatch.setenv(FileBasedLock.LOCK_DIR_ENV, str(tmp_path))
+        server = BPStandInServer()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        reserved = []
+
+        def reserve(body: dict) -> tuple:
+            reserved.append((body["slot"], body["portList"]))
+            return 200, {}
+
+        server.route("POST", "/api/v1/bps/ports/operations/reserve", reserve)
+        server.route("POST", "/api/v1/bps/ports/operations/unreserve", lambda _: (200, {}))
+        server.route("GET", "/api/v1/bps/ports", lambda _: (200, {"portReservationState": ""}))
+        pool = RestSessionPool(pool_size=1, use_https=False)
+        session_manager = RestSessionContextManager(server.address, "admin", "admin", logger, pool)
+        results = {}
+        try:
+            for flow_class in [PerPortReservationFlow, BPPortReservationFlow]:
+                server.hits.clear()
+                lock_before = FileBasedLock.statistics.to_dict()
+                bp_session = BPSession("reservation")
+                bp_session.reserved_ports = list(self.PORTS)
+                helper = PortReservationHelper(flow_class(session_manager, logger), None, logger)
+                helper.reserve_reservation_order(list(self.PORTS), bp_session)
+                requests = sum(
+                    count for (_, path), count in server.hits.items() if path.startswith("/api/v1/bps/ports/operations/")
+                )
+                logger.info(f"{flow_class.__name__}: {requests} reservation requests")
+                for name, lock_statistics in FileBasedLock.statistics.to_dict().items():
+                    if name.startswith(f"{PortReservationHelper.LOCK_NAME}."):
+                        before = lock_before.get(name, {"hold_total": 0.0, "wait_total": 0.0})
+                        logger.info(
+                            f"{flow_class.__name__}: {name} held "
+                            f"{lock_statistics['hold_total'] - before['hold_total']:.3f}s, "
+                            f"waited {lock_statistics['wait_total'] - before['wait_total']:.3f}s"
+                        )
+                assert server.hits[("GET", "/api/v1/bps/ports")] == 1
+                results[flow_class] = requests
+            reserved.clear()
+            helper.reserve_reservation_order([("1", "0"), ("1", "1"), ("2", "0"), ("1", "2")], bp_session)
+        finally:
+            pool.close(logger)
+            server.shutdown()
+            server.server_close()
+        assert list(results.values()) == [32, 4]
+        assert reserved == [("1", ["0", "1"]), ("2", ["0"]), ("1", ["2"])]
@@ -0,0 +1,1103 @@
+"""
+Test BreakingPoint flows against a local stand-in of the BP REST API.
+"""
+# pylint: disable=redefined-outer-name
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Iterable
+from unittest.mock import MagicMock
+
+import pytest
+
+from cloudshell_bp.devices.standards.traffic.controller.configuration_attributes_structure import (
+    GenericTrafficControllerResource,
+)
+from cloudshell_bp.tg.breaking_point.bp_exception import BPException
+from cloudshell_bp.tg.breaking_point.entities.bp_session import BPSession
+from cloudshell_bp.tg.breaking_point.entities.bp_test_model import BPTestModel
+from cloudshell_bp.tg.breaking_point.flows.bp_statistics_flow import BPStatisticsFlow
+from cloudshell_bp.tg.breaking_point.flows.bp_test_execution_flow import BPTestExecutionFlow
+from cloudshell_bp.tg.breaking_point.flows.exceptions import BPFlowException
+from cloudshell_bp.tg.breaking_point.helpers.bp_cs_reservation_details import BPCSReservationDetails
+from cloudshell_bp.tg.breaking_point.helpers.bp_test_library import BPTestLibrary
+from cloudshell_bp.tg.breaking_point.helpers.export_cache import ExportCache
+from cloudshell_bp.tg.breaking_point.helpers.group_allocator import GroupAllocator
+from cloudshell_bp.tg.breaking_point.helpers.job_queue import Job, JobQueue
+from cloudshell_bp.tg.breaking_point.helpers.quali_rest_api_helper import QualiAPIHelper
+from cloudshell_bp.tg.breaking_point.helpers.statistics_sampler import StatisticsSampler
+from cloudshell_bp.tg.breaking_point.helpers.upload_index import UploadIndex
+from cloudshell_bp.tg.breaking_point.rest_api.multipart_stream import MultipartFileStream
+from cloudshell_bp.tg.breaking_point.rest_api.rest_session_manager import RestSessionContextManager
+from cloudshell_bp.tg.breaking_point.rest_api.rest_session_pool import RestSessionPool
+from cloudshell_bp.tg.breaking_point.runners.bp_test_runner import BPTestRunner
+from cloudshell_bp.tg.breaking_point.runners.exceptions import BPRunnerException
+from cloudshell_bp.tg.breaking_point.utils.file_based_lock import FileBasedLock, LockTimeoutException
+
+logger = logging.getLogger(__name__)
+
+
+class BPStandInServer(ThreadingHTTPServer):
+    """Minimal BP REST API stand-in, routes map (method, path) to handler(body) -> (status, response)."""
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        """Bind to a free local port."""
+        super().__init__(("127.0.0.1", 0), _BPStandInHandler)
+        self.routes: dict = {
+            ("POST", "/api/v1/auth/session"): lambda body: (200, {}),
+            ("DELETE", "/api/v1/auth/session"): lambda body: (204, {}),
+        }
+        self.hits: Counter = Counter()
+        self.streamed_routes: set = set()
+
+    @property
+    def address(self) -> str:
+        """Server host:port."""
+        return f"127.0.0.1:{self.server_port}"
+
+    def route(self, method: str, path: str, handler: Callable, streamed: bool = False) -> None:
+        """Register handler for method and path, streamed handler gets (rfile, content length) instead of the body."""
+        self.routes[(method, path)] = handler
+        if streamed:
+            self.streamed_routes.add((method, path))
+
+
+class InFlightCounter:
+    """Count the requests handled concurrently by the stand-in server handlers."""
+
+    def __init__(self) -> None:
+        """Start without requests in flight."""
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def __enter__(self) -> "InFlightCounter":
+        """Count the request in flight."""
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Count the request done."""
+        with self._lock:
+            self.in_flight -= 1
+
+
+class _BPStandInHandler(BaseHTTPRequestHandler):
+    """Dispatch requests to the stand-in server routes."""
+
+    server: BPStandInServer
+
+    def log_message(self, *args) -> None:  # pylint: disable=arguments-differ
+        """Keep test output clean."""
+
+    def _dispatch(self) -> None:
+        path = self.path.split("?")[0]
+        length = int(self.headers.get("Content-Length") or 0)
+        if (self.command, path) in self.server.streamed_routes:
+            self.server.hits[(self.command, path)] += 1
+            self._respond(*self.server.routes[(self.command, path)]((self.rfile, length)))
+            return
+        raw_body = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw_body) if raw_body else {}
+        except ValueError:
+            body = raw_body
+        self.server.hits[(self.command, path)] += 1
+        handler = self.server.routes.get((self.command, path))
+        self._respond(*(handler(body) if handler else (404, {"error": path})))
+
+    def _respond(self, status: int, response: object) -> None:
+        payload = response if isinstance(response, bytes) else json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+
+@pytest.fixture()
+def bp_server() -> Iterable[BPStandInServer]:
+    """Yield running BP REST API stand-in."""
+    server = BPStandInServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def session_pool() -> Iterable[RestSessionPool]:
+    """Yield single session pool, the worst case for commands contention."""
+    pool = RestSessionPool(pool_size=1, use_https=False)
+    yield pool
+    pool.close(logger)
+
+
+def session_manager(bp_server: BPStandInServer, session_pool: RestSessionPool) -> RestSessionContextManager:
+    """Create session context manager as each driver command does."""
+    return RestSessionContextManager(bp_server.address, "admin", "admin", logger, session_pool)
+
+
+class StandInTestRunner(BPTestRunner):
+    """BPTestRunner connected to the stand-in server instead of the reservation chassis."""
+
+    def __init__(self, bp_server: BPStandInServer, session_pool: RestSessionPool, bp_session: BPSession) -> None:
+        """Create runner without CloudShell API."""
+        super().__init__(GenericTrafficControllerResource(), bp_session, logger, None, session_pool)
+        self._bp_server = bp_server
+
+    def _init_session_manager(self) -> RestSessionContextManager:
+        return session_manager(self._bp_server, self._session_pool)
+
+
+def running_session() -> BPSession:
+    """Create BPSession with a started test."""
+    bp_session = BPSession("reservation")
+    bp_session.test_name = "test"
+    bp_session.test_id = "test@1"
+    return bp_session
+
+
+class TestTestExecutionFlow:
+    """Test BPTestExecutionFlow."""
+
+    def test_stop_traffic_during_blocking_run(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """stop_traffic must not wait for a blocking start_traffic of the same reservation."""
+        monkeypatch.setattr(BPTestExecutionFlow, "MAX_POLL_INTERVAL", 0.1)
+        stopped = threading.Event()
+        events = []
+
+        def stop_test(_: dict) -> tuple:
+            events.append("stop")
+            stopped.set()
+            return 200, {"result": "stopped"}
+
+        bp_server.route(
+            "POST",
+            "/api/v1/bps/tests/operations/result",
+            lambda body: (200, {"result": "passed" if stopped.is_set() else "incomplete"}),
+        )
+        bp_server.route("POST", "/api/v1/bps/tests/operations/stop", stop_test)
+
+        def block() -> None:
+            BPTestExecutionFlow(session_manager(bp_server, session_pool), logger).block_while_test_running("test@1")
+            events.append("blocking finished")
+
+        blocking = threading.Thread(target=block)
+        blocking.start()
+        while not bp_server.hits[("POST", "/api/v1/bps/tests/operations/result")]:
+            time.sleep(0.01)
+
+        result = BPTestExecutionFlow(session_manager(bp_server, session_pool), logger).stop_traffic("test@1")
+        assert result == "stopped"
+        blocking.join(5)
+        assert not blocking.is_alive()
+        # The blocking wait finishes only after the test was stopped, so the stop was not queued behind it
+        assert events == ["stop", "blocking finished"]
+        assert bp_server.hits[("POST", "/api/v1/auth/session")] == 1
+
+    def test_block_while_test_running_deadline(self, bp_server: BPStandInServer, session_pool: RestSessionPool) -> None:
+        """Waiting stops at the deadline with few status requests."""
+        bp_server.route("POST", "/api/v1/bps/tests/operations/result", lambda body: (200, {"result": "incomplete"}))
+        flow = BPTestExecutionFlow(session_manager(bp_server, session_pool), logger)
+        with pytest.raises(BPFlowException):
+            flow.block_while_test_running("test@1", timeout=2)
+        assert 1 <= bp_server.hits[("POST", "/api/v1/bps/tests/operations/result")] <= 4
+
+    def test_block_while_test_running_cancelled(self, bp_server: BPStandInServer, session_pool: RestSessionPool) -> None:
+        """Waiting stops when the command is cancelled, without another status request."""
+        cancellation_context = type("CancellationContext", (), {"is_cancelled": False})()
+
+        def test_result(_: dict) -> tuple:
+            if bp_server.hits[("POST", "/api/v1/bps/tests/operations/result")] == 2:
+                cancellation_context.is_cancelled = True
+            return 200, {"result": "incomplete"}
+
+        bp_server.route("POST", "/api/v1/bps/tests/operations/result", test_result)
+        flow = BPTestExecutionFlow(session_manager(bp_server, session_pool), logger)
+        assert not flow.block_while_test_running("test@1", cancellation_context=cancellation_context)
+        assert bp_server.hits[("POST", "/api/v1/bps/tests/operations/result")] == 2
+
+    def test_block_while_test_running_progress(self, bp_server: BPStandInServer, session_pool: RestSessionPool) -> None:
+        """Waiting ends at the first status request reporting the finished test."""
+
+        def test_result(_: dict) -> tuple:
+            progress = min(bp_server.hits[("POST", "/api/v1/bps/tests/operations/result")] * 50, 100)
+            return 200, {"result": "incomplete" if progress < 100 else "passed", "progress": progress}
+
+        bp_server.route("POST", "/api/v1/bps/tests/operations/result", test_result)
+        assert BPTestExecutionFlow(session_manager(bp_server, session_pool), logger).block_while_test_running("test@1")
+        assert bp_server.hits[("POST", "/api/v1/bps/tests/operations/result")] == 2
+
+
+class TestStatisticsSampler:
+    """Test background RTS sampling."""
+
+    def test_ring_buffer(self, bp_server: BPStandInServer, session_pool: RestSessionPool) -> None:
+        """Sampler keeps only the latest samples of each group."""
+        counter = Counter()
+
+        def get_rts(body: dict) -> tuple:
+            counter[body["statsGroup"]] += 1
+            return 200, {"statsGroup": body["statsGroup"], "sample": counter[body["statsGroup"]]}
+
+        bp_server.route("POST", "/api/v1/bps/tests/operations/getrts", get_rts)
+        flow = BPStatisticsFlow(session_manager(bp_server, session_pool), logger)
+        sampler = StatisticsSampler(flow, "test@1", ["summary", "l4stats"], logger, interval=0.01, buffer_size=5)
+        sampler.start()
+        time.sleep(0.5)
+        sampler.stop()
+        assert not sampler.running
+        assert sampler.samples_count > 5
+        series = sampler.series(["l4stats"])
+        assert len(series) == 5
+        assert [stats["l4stats"]["sample"] for _, stats in series] == list(
+            range(counter["l4stats"] - 4, counter["l4stats"] + 1)
+        )
+        assert sampler.latest(["summary"])[1]["summary"]["sample"] == counter["summary"]
+
+
+class TestGetStatistics:
+    """Test BPTestRunner.get_statistics."""
+
+    def test_concurrent_groups(self, bp_server: BPStandInServer) -> None:
+        """Several groups are fetched concurrently and merged into one document."""
+        in_flight = InFlightCounter()
+
+        def get_rts(body: dict) -> tuple:
+            with in_flight:
+                time.sleep(0.3)
+            return 200, {"group": body["statsGroup"], "value": 1}
+
+        bp_server.route("POST", "/api/v1/bps/tests/operations/getrts", get_rts)
+        pool = RestSessionPool(pool_size=4, use_https=False)
+        runner = StandInTestRunner(bp_server, pool, running_session())
+        statistics = json.loads(runner.get_statistics("summary, l4stats, l7stats", "json"))
+        assert in_flight.peak > 1
+        assert set(statistics) == {"timestamp", "summary", "l4stats", "l7stats"}
+        assert statistics["l7stats"] == {"group": "l7stats", "value": 1}
+        header, row = runner.get_statistics("summary,l4stats", "csv").splitlines()
+        assert header.split(",") == ["timestamp", "summary.group", "summary.value", "l4stats.group", "l4stats.value"]
+        assert row.split(",")[1:] == ["summary", "1", "l4stats", "1"]
+        pool.close(logger)
+
+    def test_sampled_series(self, bp_server: BPStandInServer, session_pool: RestSessionPool) -> None:
+        """Sampled statistics are returned from memory."""
+        bp_server.route("POST", "/api/v1/bps/tests/operations/getrts", lambda body: (200, {"value": time.time()}))
+        bp_session = running_session()
+        runner = StandInTestRunner(bp_server, session_pool, bp_session)
+        runner._start_statistics_sampler(["summary"], "0.05")  # pylint: disable=protected-access
+        time.sleep(0.3)
+        bp_session.statistics_sampler.stop()
+        requests_count = bp_server.hits[("POST", "/api/v1/bps/tests/operations/getrts")]
+        series = json.loads(runner.get_statistics("summary", "json", "True"))
+        assert len(series) == requests_count
+        assert json.loads(runner.get_statistics("summary", "json")) == {"value": series[-1]["value"]}
+        assert bp_server.hits[("POST", "/api/v1/bps/tests/operations/getrts")] == requests_count
+
+    def test_export_series(self, bp_server: BPStandInServer, session_pool: RestSessionPool) -> None:
+        """Sampled series are attached as gzipped CSV file."""
+        bp_server.route("POST", "/api/v1/bps/tests/operations/getrts", lambda body: (200, {"frames": 10, "name": "x"}))
+        bp_session = running_session()
+        runner = StandInTestRunner(bp_server, session_pool, bp_session)
+        runner._start_statistics_sampler(["summary"], "0.05")  # pylint: disable=protected-access
+        time.sleep(0.2)
+        bp_session.statistics_sampler.stop()
+        uploads = {}
+        quali_api_helper = MagicMock()
+        quali_api_helper.upload_file.side_effect = lambda reservation_id, file_stream, file_name: uploads.update(
+            {file_name: file_stream.read()}
+        )
+        runner.export_statistics("Test Env", quali_api_helper, output_format="CSV", compress="True")
+        file_name, data = uploads.popitem()
+        assert file_name.endswith("_statistics.csv.gz")
+        lines = gzip.decompress(data).decode().splitlines()
+        assert lines[0] == "timestamp,summary.frames"
+        assert len(lines) == bp_session.statistics_sampler.samples_count + 1
+
+
+class TestThresholds:
+    """Test thresholds evaluation of the running test."""
+
+    def test_stop_on_hard_failure(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Blocking test is stopped early when a hard threshold fails."""
+        monkeypatch.setattr(BPTestExecutionFlow, "MAX_POLL_INTERVAL", 0.1)
+        stopped = threading.Event()
+        failed_sessions = Counter()
+
+        def get_rts(_: dict) -> tuple:
+            failed_sessions["summary"] += 1
+            return 200, {"sessionsFailed": failed_sessions["summary"], "totalBandwidth": 100}
+
+        def stop_test(_: dict) -> tuple:
+            stopped.set()
+            return 200, {"result": "stopped"}
+
+        bp_server.route("POST", "/api/v1/bps/tests/operations/start", lambda body: (200, {"testid": "test@2"}))
+        bp_server.route("POST", "/api/v1/bps/tests/operations/getrts", get_rts)
+        bp_server.route("POST", "/api/v1/bps/tests/operations/stop", stop_test)
+        bp_server.route(
+            "POST",
+            "/api/v1/bps/tests/operations/result",
+            lambda body: (200, {"result": "passed" if stopped.is_set() else "incomplete"}),
+        )
+        runner = StandInTestRunner(bp_server, session_pool, running_session())
+        verdict = runner.start_traffic(
+            "True", "10", statistics_interval="0.05", thresholds="avg(summary.totalBandwidth)>=50; Summary.sessionsFailed<=3!"
+        )
+        assert verdict == "Test stopped, hard thresholds failed: summary.sessionsFailed<=3!"
+        assert bp_server.hits[("POST", "/api/v1/bps/tests/operations/stop")] == 1
+        result = json.loads(runner.get_threshold_results())
+        assert result["passed"] is False and result["test_id"] == "test@2"
+        assert [rule["status"] for rule in result["rules"]] == ["passed", "failed"]
+        assert result["rules"][1]["actual"] == 4
+
+    def test_hard_failure_without_stop(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Hard threshold failure is reported without stopping the test when stop on failure is disabled."""
+        monkeypatch.setattr(BPTestExecutionFlow, "MAX_POLL_INTERVAL", 0.1)
+        status_requests = Counter()
+
+        def test_result(_: dict) -> tuple:
+            status_requests["result"] += 1
+            return 200, {"result": "passed" if status_requests["result"] > 5 else "incomplete"}
+
+        bp_server.route("POST", "/api/v1/bps/tests/operations/start", lambda body: (200, {"testid": "test@3"}))
+        bp_server.route("POST", "/api/v1/bps/tests/operations/getrts", lambda body: (200, {"sessionsFailed": 10}))
+        bp_server.route("POST", "/api/v1/bps/tests/operations/result", test_result)
+        runner = StandInTestRunner(bp_server, session_pool, running_session())
+        verdict = runner.start_traffic(
+            "True", "10", statistics_interval="0.05", thresholds="summary.sessionsFailed<=3!", stop_on_failure="False"
+        )
+        assert verdict == "Test not stopped, hard thresholds failed: summary.sessionsFailed<=3!"
+        assert bp_server.hits[("POST", "/api/v1/bps/tests/operations/stop")] == 0
+
+    def test_stop_failure_reported(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Verdict reports the error of the stop on hard threshold failure."""
+        monkeypatch.setattr(BPTestExecutionFlow, "MAX_POLL_INTERVAL", 0.1)
+
+        def test_result(_: dict) -> tuple:
+            finished = bp_server.hits[("POST", "/api/v1/bps/tests/operations/stop")] > 0
+            return 200, {"result": "passed" if finished else "incomplete"}
+
+        bp_server.route("POST", "/api/v1/bps/tests/operations/start", lambda body: (200, {"testid": "test@4"}))
+        bp_server.route("POST", "/api/v1/bps/tests/operations/getrts", lambda body: (200, {"sessionsFailed": 10}))
+        bp_server.route("POST", "/api/v1/bps/tests/operations/stop", lambda body: (500, {"error": "chassis is busy"}))
+        bp_server.route("POST", "/api/v1/bps/tests/operations/result", test_result)
+        runner = StandInTestRunner(bp_server, session_pool, running_session())
+        verdict = runner.start_traffic("True", "10", statistics_interval="0.05", thresholds="summary.sessionsFailed<=3!")
+        assert verdict.startswith("Test stop failed: ") and "chassis is busy" in verdict
+        assert verdict.endswith(", hard thresholds failed: summary.sessionsFailed<=3!")
+
+
+class TestResultsExport:
+    """Test streamed result export from the chassis to the reservation."""
+
+    REPORT_SIZE = 16 * 2**20
+
+    def test_multipart_stream(self) -> None:
+        """Streamed body is a valid multipart form."""
+        file_object = io.BytesIO(b"skipped" + bytes(range(256)) * 10)
+        file_object.seek(7)
+        body = MultipartFileStream({"reservationId": "reservation"}, "QualiPackage", file_object, "result.pdf")
+        data = b"".join(body)
+        assert len(data) == len(body)
+        message = BytesParser().parsebytes(f"Content-Type: {body.content_type}\r\n\r\n".encode() + data)
+        fields = {part.get_param("name", header="content-disposition"): part for part in message.get_payload()}
+        assert fields["reservationId"].get_payload() == "reservation"
+        assert fields["QualiPackage"].get_filename() == "result.pdf"
+        assert fields["QualiPackage"].get_payload(decode=True) == bytes(range(256)) * 10
+        body.seek(0)
+        assert b"".join(body) == data
+
+    def test_streamed_results(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Report is moved through the driver by chunks with bounded memory."""
+        monkeypatch.setattr(BPTestRunner, "EXPORT_SPOOL_SIZE", 2**20)
+        report = bytes(range(256)) * (self.REPORT_SIZE // 256)
+        uploads = {}
+
+        def attach_file(request: tuple) -> tuple:
+            rfile, length = request
+            head = rfile.read(1024)
+            received = len(head)
+            while received < length:
+                received += len(rfile.read(min(2**16, length - received)))
+            uploads["head"], uploads["size"] = head, received
+            return 200, {"Success": True}
+
+        bp_server.route("GET", "/api/v1/bps/export/report/test@1/pdf", lambda body: (200, report))
+        bp_server.route("PUT", "/API/Auth/Login", lambda body: (200, "token"))
+        bp_server.route("POST", "/API/Package/AttachFileToReservation", attach_file, streamed=True)
+        runner = StandInTestRunner(bp_server, session_pool, running_session())
+        quali_api_helper = QualiAPIHelper(bp_server.address, logger, token="token")
+
+        tracemalloc.start()
+        runner.get_results("Test Env", quali_api_helper)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        logger.info(f"{self.REPORT_SIZE / 2**20:.0f} MB report exported with {peak / 2**20:.1f} MB peak")
+        assert peak < self.REPORT_SIZE / 4
+        assert b'name="saveFileAs"\r\n\r\nTest_Env_test@1.pdf' in uploads["head"]
+        assert uploads["size"] > self.REPORT_SIZE
+
+    def test_concurrent_formats(self, bp_server: BPStandInServer) -> None:
+        """Result formats are downloaded concurrently and attached one by one."""
+        in_flight = InFlightCounter()
+
+        def report(result_format: str) -> Callable:
+            def download(_: dict) -> tuple:
+                with in_flight:
+                    time.sleep(0.3)
+                return 200, result_format.encode() * 1000
+
+            return download
+
+        uploads = []
+        for result_format in ["pdf", "csv", "xml", "zip"]:
+            bp_server.route("GET", f"/api/v1/bps/export/report/test@1/{result_format}", report(result_format))
+        quali_api_helper = MagicMock()
+        quali_api_helper.attach_files.side_effect = lambda reservation_id, files: uploads.extend(
+            (file_name, file_stream.read()) for file_name, file_stream in files
+        )
+        pool = RestSessionPool(pool_size=4, use_https=False)
+        runner = StandInTestRunner(bp_server, pool, running_session())
+        output = runner.get_results("env", quali_api_helper, "PDF, csv,xml, zip, pdf")
+        assert in_flight.peak > 1
+        assert output.startswith("Attached pdf, csv, xml, zip results")
+        assert uploads == [(f"env_test@1.{fmt}", fmt.encode() * 1000) for fmt in ["pdf", "csv", "xml", "zip"]]
+        with pytest.raises(BPRunnerException):
+            runner.get_results("env", quali_api_helper, "pdf, doc")
+        pool.close(logger)
+
+    def test_cached_results(self, bp_server: BPStandInServer, session_pool: RestSessionPool, tmp_path: Path) -> None:
+        """Reports of finished tests are downloaded once."""
+        bp_server.route("GET", "/api/v1/bps/export/report/test@1/pdf", lambda body: (200, b"pdf report"))
+        bp_server.route("POST", "/api/v1/bps/tests/operations/result", lambda body: (200, {"result": "passed"}))
+        uploads = []
+        quali_api_helper = MagicMock()
+        quali_api_helper.attach_files.side_effect = lambda reservation_id, files: uploads.extend(
+            file_stream.read() for _, file_stream in files
+        )
+        runner = StandInTestRunner(bp_server, session_pool, running_session())
+        runner._resource_config.attributes["Test Files Location"] = str(tmp_path)  # pylint: disable=protected-access
+        runner.get_results("env", quali_api_helper)
+        assert "from cache" in runner.get_results("env", quali_api_helper)
+        assert uploads == [b"pdf report"] * 2
+        assert bp_server.hits[("GET", "/api/v1/bps/export/report/test@1/pdf")] == 1
+        statistics = json.loads(runner.get_cache_statistics())
+        assert (statistics["hits"], statistics["misses"], statistics["hit_ratio"]) == (1, 1, 0.5)
+
+    def test_running_test_results_not_cached(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, tmp_path: Path
+    ) -> None:
+        """Reports downloaded before the test completed are not cached, even if the test completes meanwhile."""
+        requests = []
+
+        def report(_: dict) -> tuple:
+            requests.append("report")
+            return 200, f"pdf report {len(requests)}".encode()
+
+        def test_result(_: dict) -> tuple:
+            requests.append("status")
+            return 200, {"result": "passed" if len(requests) > 1 else "incomplete"}
+
+        bp_server.route("GET", "/api/v1/bps/export/report/test@1/pdf", report)
+        bp_server.route("POST", "/api/v1/bps/tests/operations/result", test_result)
+        uploads = []
+        quali_api_helper = MagicMock()
+        quali_api_helper.attach_files.side_effect = lambda reservation_id, files: uploads.extend(
+            file_stream.read() for _, file_stream in files
+        )
+        runner = StandInTestRunner(bp_server, session_pool, running_session())
+        runner._resource_config.attributes["Test Files Location"] = str(tmp_path)  # pylint: disable=protected-access
+        runner.get_results("env", quali_api_helper)
+        runner.get_results("env", quali_api_helper)
+        assert "from cache" in runner.get_results("env", quali_api_helper)
+        assert requests == ["status", "report", "status", "report"]
+        assert uploads == [b"pdf report 2", b"pdf report 4", b"pdf report 4"]
+
+
+class TestExportCache:
+    """Test ExportCache."""
+
+    def test_lru_eviction(self, tmp_path: Path) -> None:
+        """Least recently used entries are evicted, identical content is stored once."""
+        cache = ExportCache(str(tmp_path), logger, max_size=25)
+        cache.put(ExportCache.key("bp", "test@1", "pdf"), b"1" * 10)
+        cache.put(ExportCache.key("bp", "test@1", "csv"), b"2" * 10)
+        cache.put(ExportCache.key("bp", "test@2", "csv"), b"2" * 10)
+        with cache.open(ExportCache.key("bp", "test@1", "pdf")) as cached_file:
+            assert cached_file.read() == b"1" * 10
+        cache.put(ExportCache.key("bp", "test@3", "pdf"), b"3" * 10)
+        assert cache.open(ExportCache.key("bp", "test@1", "csv")) is None
+        assert cache.open(ExportCache.key("bp", "test@2", "csv")) is None
+        assert cache.open(ExportCache.key("bp", "test@1", "pdf")).read() == b"1" * 10
+        statistics = cache.statistics()
+        assert (statistics["entries"], statistics["size"], statistics["hits"], statistics["misses"]) == (2, 20, 2, 2)
+        assert len(os.listdir(tmp_path / ExportCache.CACHE_DIR / ExportCache.OBJECTS_DIR)) == 2
+
+
+class TestJobQueue:
+    """Test background jobs."""
+
+    def test_retry_and_dedupe(self) -> None:
+        """Failed job is retried with backoff, identical active job is submitted once."""
+        job_queue = JobQueue(workers=2, attempts=3, initial_backoff=0.1)
+        calls = []
+
+        def flaky() -> str:
+            calls.append(time.time())
+            if len(calls) < 3:
+                raise RuntimeError("chassis is busy")
+            return "done"
+
+        job = job_queue.submit("key", "flaky job", flaky, logger, "reservation")
+        assert job_queue.submit("key", "flaky job", flaky, logger, "reservation") is job
+        assert job.done.wait(5)
+        assert (job.status, job.attempts, job.result) == (Job.COMPLETED, 3, "done")
+        assert calls[2] - calls[1] >= 0.2 > calls[1] - calls[0] >= 0.1
+        failing = job_queue.submit("other", "failing job", lambda: 1 / 0, logger, "reservation")
+        assert failing.done.wait(5)
+        assert failing.status == Job.FAILED and "division" in failing.error
+        assert job_queue.submit("key", "flaky job", flaky, logger, "reservation") is not job
+
+    def test_shutdown(self) -> None:
+        """Shutdown lets the running job finish and stops the workers, new jobs are rejected."""
+        job_queue = JobQueue(workers=2)
+        running = job_queue.submit("slow", "slow job", lambda: time.sleep(0.3) or "slow", logger)
+        workers = list(job_queue._executor._threads)  # pylint: disable=protected-access
+        job_queue.shutdown()
+        assert running.done.wait(5) and running.result == "slow"
+        for worker in workers:
+            worker.join(5)
+            assert not worker.is_alive()
+        with pytest.raises(RuntimeError):
+            job_queue.submit("next", "next job", lambda: "next", logger)
+        assert [job.id for job in job_queue.jobs()] == [running.id]
+
+    def test_async_results(self, bp_server: BPStandInServer, session_pool: RestSessionPool) -> None:
+        """get_results job is attached in background and reported by get_job_status."""
+
+        def download(_: dict) -> tuple:
+            time.sleep(0.3)
+            return 200, b"pdf"
+
+        bp_server.route("GET", "/api/v1/bps/export/report/test@1/pdf", download)
+        quali_api_helper = MagicMock()
+        job_queue = JobQueue()
+        runner = StandInTestRunner(bp_server, session_pool, running_session())
+        job_id = runner.submit_results_job(job_queue, "env", quali_api_helper, "pdf")
+        assert runner.submit_results_job(job_queue, "env", quali_api_helper, "PDF") == job_id
+        assert json.loads(runner.get_job_status(job_queue, job_id))["status"] in [Job.QUEUED, Job.RUNNING]
+        job_queue.get(job_id).done.wait(5)
+        statuses = json.loads(runner.get_job_status(job_queue))
+        assert [(status["id"], status["status"]) for status in statuses] == [(job_id, Job.COMPLETED)]
+        assert quali_api_helper.attach_files.call_count == 1
+        with pytest.raises(BPRunnerException):
+            runner.get_job_status(job_queue, "unknown")
+
+
+class TestQualiAPIHelper:
+    """Test QualiAPIHelper against the stand-in server."""
+
+    def test_token_reuse(self, bp_server: BPStandInServer, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Helpers of one server share the authenticated session, expired or rejected token is renewed."""
+        tokens = Counter()
+        attached = []
+
+        def login(_: dict) -> tuple:
+            tokens["issued"] += 1
+            return 200, f"token{tokens['issued']}"
+
+        def attach_file(request: tuple) -> tuple:
+            rfile, length = request
+            rfile.read(length)
+            if tokens["expire"]:
+                tokens["expire"] -= 1
+                return 401, {"Message": "expired"}
+            attached.append(length)
+            return 200, {"Success": True}
+
+        bp_server.route("PUT", "/API/Auth/Login", login)
+        bp_server.route("POST", "/API/Package/AttachFileToReservation", attach_file, streamed=True)
+        helpers = [QualiAPIHelper(bp_server.address, logger, token="admin", domain="Global") for _ in range(3)]
+        for helper in helpers:
+            helper.attach_files("reservation", [("a.pdf", io.BytesIO(b"a")), ("b.csv", io.BytesIO(b"b"))])
+        assert len(attached) == 6
+        assert tokens["issued"] == 1
+        tokens["expire"] = 1
+        helpers[0].attach_new_file("reservation", io.BytesIO(b"c"), "c.xml")
+        assert tokens["issued"] == 2 and len(attached) == 7
+        monkeypatch.setattr(QualiAPIHelper, "TOKEN_TTL", 0)
+        helpers[1].attach_new_file("reservation", b"d", "d.zip")
+        assert tokens["issued"] == 3 and len(attached) == 8
+        assert helpers[2].session.logins == 3
+        other_token = QualiAPIHelper(bp_server.address, logger, token="other", domain="Global")
+        assert other_token.session is not helpers[0].session
+        other_token.attach_new_file("reservation", b"e", "e.zip")
+        assert helpers[0].session.credentials == ("admin", None, None) and helpers[0].session.logins == 3
+
+    def test_concurrent_relogin(self, bp_server: BPStandInServer) -> None:
+        """Token rejected in several threads at once is renewed once, the rejected requests are replayed."""
+        tokens = Counter()
+        revoked = threading.Event()
+        attached = []
+
+        def login(_: dict) -> tuple:
+            time.sleep(0.3)
+            tokens["issued"] += 1
+            revoked.clear()
+            return 200, f"token{tokens['issued']}"
+
+        def attach_file(request: tuple) -> tuple:
+            rfile, length = request
+            rfile.read(length)
+            if revoked.is_set():
+                return 401, {"Message": "expired"}
+            attached.append(length)
+            return 200, {"Success": True}
+
+        bp_server.route("PUT", "/API/Auth/Login", login)
+        bp_server.route("POST", "/API/Package/AttachFileToReservation", attach_file, streamed=True)
+        QualiAPIHelper(bp_server.address, logger, token="admin").login()
+        revoked.set()
+        barrier = threading.Barrier(4)
+
+        def attach(number: int) -> None:
+            helper = QualiAPIHelper(bp_server.address, logger, token="admin")
+            barrier.wait()
+            helper.attach_new_file("reservation", io.BytesIO(b"x"), f"{number}.pdf")
+
+        threads = [threading.Thread(target=attach, args=(number,)) for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        assert len(attached) == 4
+        assert tokens["issued"] == 2
+
+
+class TestUploadIndex:
+    """Test skipping upload of the test files already imported to the chassis."""
+
+    def test_identical_file_not_uploaded(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Identical file is imported once, changed file, forced upload and invalidated index upload again."""
+        monkeypatch.setenv(FileBasedLock.LOCK_DIR_ENV, str(tmp_path))
+        chassis_ports = {"interface1": ("1", "0"), "interface2": ("1", "1")}
+        monkeypatch.setattr(BPCSReservationDetails, "get_chassis_ports", lambda _: chassis_ports)
+        bp_server.route("POST", "/api/v1/bps/upload", lambda _: (200, {"result": "TestConfig"}))
+        bp_server.route("POST", "/api/v1/bps/network/operations/retrieve", lambda _: (200, {}))
+        interfaces = {"interface:Interface1": "number: 1", "interface:Interface2": "number: 2"}
+        bp_server.route("GET", "/api/v1/bps/network/", lambda _: (200, {"interfaces": interfaces}))
+        stateful_port_reservation(bp_server, dict.fromkeys(chassis_ports.values()), [])
+        test_file = tmp_path / "TestConfig.bpt"
+        test_file.write_bytes((Path(__file__).parent / "TestConfig.bpt").read_bytes())
+        bp_session = BPSession("reservation")
+        runner = StandInTestRunner(bp_server, session_pool, bp_session)
+
+        def load(force_upload: str = "False") -> int:
+            runner.load_configuration(str(test_file), force_upload)
+            assert (bp_session.test_name, bp_session.reserved_ports) == ("TestConfig", [("1", "0"), ("1", "1")])
+            return bp_server.hits[("POST", "/api/v1/bps/upload")]
+
+        assert [load(), load()] == [1, 1]
+        assert load(force_upload="True") == 2
+        test_file.write_bytes(test_file.read_bytes() + b"<!-- changed -->")
+        assert [load(), load()] == [3, 3]
+        assert runner.invalidate_upload_index().startswith("1 imported test files forgotten")
+        assert load() == 4
+        # Other driver process imports different content under the same test name
+        UploadIndex(bp_server.address).add("sha256 of the other content", "TestConfig")
+        assert load() == 5
+
+
+class TestLoadConfiguration:
+    """Test load_configuration stages."""
+
+    STAGE_DELAY = 0.3
+
+    def test_pipelined_stages(
+        self, bp_server: BPStandInServer, caplog: pytest.LogCaptureFixture, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+    ) -> None:
+        """CS ports lookup overlaps the upload, network is looked up after the upload or with the ports if it is skipped."""
+        events = []
+
+        def delayed(stage: str, response: object) -> Callable:
+            def handler(_: object) -> tuple:
+                events.append(f"{stage} start")
+                time.sleep(self.STAGE_DELAY)
+                events.append(f"{stage} end")
+                return 200, response
+
+            return handler
+
+        def chassis_ports(_: BPCSReservationDetails) -> dict:
+            events.append("ports start")
+            time.sleep(self.STAGE_DELAY)
+            events.append("ports end")
+            return {"interface1": ("1", "0"), "interface2": ("1", "1")}
+
+        reserved = []
+        bp_server.route("POST", "/api/v1/bps/upload", delayed("upload", {"result": "BitBlaster"}))
+        bp_server.route("POST", "/api/v1/bps/network/operations/retrieve", delayed("network", {}))
+        interfaces = {"interface:Interface1": "number: 1", "interface:Interface2": "number: 2"}
+        bp_server.route("GET", "/api/v1/bps/network/", lambda _: (200, {"interfaces": interfaces}))
+        bp_server.route("GET", "/api/v1/bps/ports", lambda _: (200, {"portReservationState": ""}))
+        bp_server.route("POST", "/api/v1/bps/ports/operations/reserve", lambda body: (reserved.append(body), (200, {}))[1])
+        monkeypatch.setattr(BPCSReservationDetails, "get_chassis_ports", chassis_ports)
+        monkeypatch.setenv(FileBasedLock.LOCK_DIR_ENV, str(tmp_path))
+        pool = RestSessionPool(pool_size=3, use_https=False)
+        bp_sessions = [BPSession("reservation1"), BPSession("reservation2")]
+        try:
+            with caplog.at_level(logging.INFO):
+                StandInTestRunner(bp_server, pool, bp_sessions[0]).load_configuration(
+                    str(Path(__file__).parent / "TestConfig.bpt")
+                )
+                assert events.index("ports start") < events.index("upload end") < events.index("network start")
+                events.clear()
+                StandInTestRunner(bp_server, pool, bp_sessions[1]).load_configuration(
+                    str(Path(__file__).parent / "TestConfig.bpt")
+                )
+        finally:
+            pool.close(logger)
+        assert bp_server.hits[("POST", "/api/v1/bps/upload")] == 1
+        assert events.index("ports start") < events.index("network end")
+        assert events.index("network start") < events.index("ports end")
+        for bp_session in bp_sessions:
+            assert (bp_session.test_name, bp_session.reserved_ports) == ("BitBlaster", [("1", "0"), ("1", "1")])
+        assert [body["portList"] for body in reserved] == [["0", "1"]] * 2
+        assert all(stage in caplog.text for stage in ["upload", "network lookup", "CS ports lookup", "reservation"])
+
+
+class TestTestLibrary:
+    """Test BPTestLibrary."""
+
+    def test_incremental_refresh(self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+        """Only new and modified files are parsed, tests are found by name, file name or network."""
+        parsed = []
+        from_file = BPTestModel.from_file.__func__
+
+        def counting_from_file(cls: type, source: object) -> BPTestModel:
+            if isinstance(source, str):
+                parsed.append(os.path.basename(source))
+            return from_file(cls, source)
+
+        monkeypatch.setattr(BPTestModel, "from_file", classmethod(counting_from_file))
+        content = (Path(__file__).parent / "TestConfig.bpt").read_text()
+        (tmp_path / "TestConfig.bpt").write_text(content)
+        (tmp_path / "suite").mkdir()
+        (tmp_path / "suite" / "Other.bpt").write_text(content.replace('name="BitBlaster"', 'name="Other"'))
+        (tmp_path / ".bp_cache").mkdir()
+        (tmp_path / ".bp_cache" / "Hidden.bpt").write_text(content)
+        library = BPTestLibrary(str(tmp_path), logger)
+        entries = library.refresh()
+        assert [(entry["name"], entry["network"], entry["interfaces"]) for entry in entries] == [
+            ("BitBlaster", "BreakingPoint Switching", [1, 2]),
+            ("Other", "BreakingPoint Switching", [1, 2]),
+        ]
+        assert sorted(parsed) == ["Other.bpt", "TestConfig.bpt"]
+        library.refresh()
+        assert len(parsed) == 2
+        (tmp_path / "TestConfig.bpt").write_text(content.replace("BreakingPoint Switching", "Lab Network"))
+        os.utime(tmp_path / "TestConfig.bpt", (time.time() + 10, time.time() + 10))
+        assert [entry["path"] for entry in library.search("lab*")] == ["TestConfig.bpt"]
+        assert parsed[2:] == ["TestConfig.bpt"]
+        assert library.find("testconfig")["name"] == library.find("BitBlaster")["name"] == "BitBlaster"
+        assert library.find("missing") is None
+        for folder in ["downloads", "0a1b2c3d-0000-4e5f-8a9b-0123456789ab"]:
+            (tmp_path / folder).mkdir()
+            (tmp_path / folder / "BitBlaster.bpt").write_text(content)
+        BPTestLibrary.mark_reservation_folder(str(tmp_path / "downloads"))
+        assert library.find("BitBlaster")["path"] == "TestConfig.bpt"
+        assert parsed[3:] == []
+        (tmp_path / "suite" / "BitBlaster.bpt").write_text(content)
+        with pytest.raises(BPException):
+            library.find("BitBlaster")
+
+    def test_load_by_test_name(self, bp_server: BPStandInServer, session_pool: RestSessionPool, tmp_path: Path) -> None:
+        """Test name is resolved through the library, indexed hash is used by the upload."""
+        (tmp_path / "Lab.bpt").write_bytes((Path(__file__).parent / "TestConfig.bpt").read_bytes())
+        runner = StandInTestRunner(bp_server, session_pool, BPSession("reservation"))
+        runner._resource_config.attributes["Test Files Location"] = str(tmp_path)  # pylint: disable=protected-access
+        assert [entry["name"] for entry in json.loads(runner.get_test_library("switching"))] == ["BitBlaster"]
+        file_path, entry = runner._resolve_test_file("BitBlaster")  # pylint: disable=protected-access
+        assert (file_path, entry["path"]) == (str(tmp_path / "Lab.bpt"), "Lab.bpt")
+        assert runner._resolve_test_file(file_path)[1] == entry  # pylint: disable=protected-access
+        with pytest.raises(BPRunnerException):
+            runner._resolve_test_file("Missing")  # pylint: disable=protected-access
+
+
+class TestGetTestFile:
+    """Test bulk test files download."""
+
+    DOWNLOAD_DELAY = 0.3
+
+    def test_bulk_download(self, bp_server: BPStandInServer, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Names and globs are downloaded concurrently in binary mode, the manifest lists every file."""
+        tests = {
+            name: f"<modelExport name='{name}'>".encode() + bytes(range(256)) for name in ["Smoke1", "Smoke2", "BitBlaster"]
+        }
+        in_flight = InFlightCounter()
+
+        def export(content: bytes) -> Callable:
+            def handler(_: object) -> tuple:
+                with in_flight:
+                    time.sleep(self.DOWNLOAD_DELAY)
+                return 200, content
+
+            return handler
+
+        for name, content in tests.items():
+            bp_server.route("GET", f"/api/v1/bps/export/bpt/testname/{name}", export(content))
+        search_results = [{"name": name} for name in ["Smoke1", "Smoke2", "SmokeLong"]]
+        bp_server.route("POST", "/api/v1/bps/testmodel/operations/search", lambda _: (200, search_results))
+        pool = RestSessionPool(pool_size=3, use_https=False)
+        runner = StandInTestRunner(bp_server, pool, BPSession("reservation"))
+        runner._resource_config.attributes["Test Files Location"] = str(tmp_path)  # pylint: disable=protected-access
+        manifest = json.loads(runner.get_test_file("Smoke?, BitBlaster"))
+        assert in_flight.peak > 1
+        assert [(entry["test"], entry["size"], entry["cached"]) for entry in manifest["files"]] == [
+            (name, len(tests[name]), False) for name in ["Smoke1", "Smoke2", "BitBlaster"]
+        ]
+        assert manifest["size"] == sum(len(content) for content in tests.values()) and not manifest["failed"]
+        for entry in manifest["files"]:
+            assert Path(entry["path"]).read_bytes() == tests[entry["test"]]
+        assert runner.get_test_file("BitBlaster") == str(tmp_path / "reservation" / "BitBlaster.bpt")
+        manifest = json.loads(runner.get_test_file("Smoke1,Missing"))
+        assert [entry.get("cached") for entry in manifest["files"]] == [True, None]
+        assert manifest["failed"] == ["Missing"]
+        with pytest.raises(BPRunnerException):
+            runner.get_test_file("Nothing*")
+        assert not [path for path in os.listdir(tmp_path / "reservation") if path.endswith(".tmp")]
+        monkeypatch.setattr(BPTestRunner, "TEST_FILE_CACHE_TTL", 0)
+        bp_server.route("GET", "/api/v1/bps/export/bpt/testname/Smoke1", export(b"<modelExport name='Smoke1' changed/>"))
+        assert Path(runner.get_test_file("Smoke1")).read_bytes() == b"<modelExport name='Smoke1' changed/>"
+        pool.close(logger)
+
+
+def stateful_port_reservation(bp_server: BPStandInServer, groups: dict, requests: list) -> None:
+    """Serve port status from groups {(slot, port): group id}, record and apply reserve and unreserve requests."""
+
+    def port_status(_: dict) -> tuple:
+        state = " ".join(
+            f"[slot={slot},port={port}]=0" + (f":[reserved=admin,group={group},number=1]" if group else "")
+            for (slot, port), group in groups.items()
+        )
+        return 200, {"portReservationState": state}
+
+    def operation(name: str) -> Callable:
+        def handler(body: dict) -> tuple:
+            requests.append((name, body["portList"]))
+            for port in body["portList"]:
+                groups[(body["slot"], port)] = body.get("group")
+            return 200, {}
+
+        return handler
+
+    bp_server.route("GET", "/api/v1/bps/ports", port_status)
+    bp_server.route("POST", "/api/v1/bps/ports/operations/reserve", operation("reserve"))
+    bp_server.route("POST", "/api/v1/bps/ports/operations/unreserve", operation("unreserve"))
+
+
+class TestPortReservation:
+    """Test PortReservationHelper against the stand-in server."""
+
+    PORT_STATE = (
+        "[slot=1,port=0]=0:[reserved=admin,group=1,number=1] [slot=1,port=1]=0:[reserved=admin,group=2,number=1] "
+        "[slot=1,port=2]=0:[reserved=other,group=3,number=1] [slot=1,port=3]=0"
+    )
+
+    def test_port_state_snapshot(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+    ) -> None:
+        """Port status is fetched once, released ports and groups are reused from the local snapshot."""
+        requests = []
+        bp_server.route("GET", "/api/v1/bps/ports", lambda _: (200, {"portReservationState": self.PORT_STATE}))
+        for operation in ["reserve", "unreserve"]:
+            bp_server.route(
+                "POST",
+                f"/api/v1/bps/ports/operations/{operation}",
+                lambda body, operation=operation: (requests.append((operation, body["portList"])), (200, {}))[1],
+            )
+        monkeypatch.setenv(FileBasedLock.LOCK_DIR_ENV, str(tmp_path))
+        bp_session = BPSession("reservation")
+        bp_session.reserved_ports = [("1", "0")]
+        runner = StandInTestRunner(bp_server, session_pool, bp_session)
+        helper = runner._port_reservation_helper  # pylint: disable=protected-access
+        helper.reserve_reservation_order([("1", "1"), ("1", "3")], bp_session)
+        assert bp_server.hits[("GET", "/api/v1/bps/ports")] == 1
+        assert requests == [("unreserve", ["0"]), ("unreserve", ["1"]), ("reserve", ["1", "3"])]
+        assert (bp_session.reservation_group, bp_session.reserved_ports) == (1, [("1", "1"), ("1", "3")])
+
+    def test_diff_reservation(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+    ) -> None:
+        """Reloading the same ports keeps them and the group, changed ports are released and reserved only."""
+        groups = {("1", str(port)): None for port in range(4)}
+        requests = []
+        stateful_port_reservation(bp_server, groups, requests)
+        monkeypatch.setenv(FileBasedLock.LOCK_DIR_ENV, str(tmp_path))
+        groups[("1", "3")] = 1
+        bp_session = BPSession("reservation")
+        helper = StandInTestRunner(bp_server, session_pool, bp_session)._port_reservation_helper  # pylint: disable=W0212
+        helper.reserve_reservation_order([("1", "0"), ("1", "1")], bp_session)
+        assert (bp_session.reservation_group, requests) == (2, [("reserve", ["0", "1"])])
+        requests.clear()
+        helper.reserve_reservation_order([("1", "0"), ("1", "1")], bp_session)
+        assert (bp_session.reservation_group, requests) == (2, [])
+        helper.reserve_reservation_order([("1", "0"), ("1", "2")], bp_session)
+        assert (bp_session.reservation_group, requests) == (2, [("unreserve", ["1"]), ("reserve", ["2"])])
+        requests.clear()
+        groups[("1", "0")] = 3
+        helper.reserve_reservation_order([("1", "0"), ("1", "2")], bp_session)
+        assert requests == [("unreserve", ["0", "2"]), ("reserve", ["0", "2"])]
+        assert bp_session.reservation_group == 2
+
+    def test_group_leases(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+    ) -> None:
+        """Reservations wait for a released group in FIFO order, without timeout they fail immediately."""
+        groups = {("1", str(port)): port + 1 if port < 11 else None for port in range(14)}
+        stateful_port_reservation(bp_server, groups, [])
+        monkeypatch.setenv(FileBasedLock.LOCK_DIR_ENV, str(tmp_path))
+        allocator = GroupAllocator.for_chassis(bp_server.address)
+        helpers = {}
+        for owner in ["a", "b", "c", "d"]:
+            bp_session = BPSession(owner)
+            helpers[owner] = (StandInTestRunner(bp_server, session_pool, bp_session)._port_reservation_helper, bp_session)
+
+        def reserve(owner: str, port: str, timeout: float) -> None:
+            helper, bp_session = helpers[owner]
+            helper.reserve_reservation_order([("1", port)], bp_session, timeout)
+            reserved.append((owner, bp_session.reservation_group))
+
+        reserved = []
+        reserve("a", "11", 0)
+        assert allocator.leases() == {"a": 12}
+        with pytest.raises(BPException, match="busy"):
+            reserve("c", "12", 0)
+        waiting = []
+        for owner, port in [("b", "12"), ("d", "13")]:
+            waiting.append(threading.Thread(target=reserve, args=(owner, port, 5)))
+            waiting[-1].start()
+            while owner not in allocator.waiting():
+                time.sleep(0.01)
+        assert allocator.waiting() == ["b", "d"]
+        with pytest.raises(BPException, match="busy"):
+            reserve("c", "12", 0)
+        helpers["a"][0].unreserve_ports(helpers["a"][1])
+        waiting[0].join(5)
+        assert reserved == [("a", 12), ("b", 12)] and allocator.waiting() == ["d"]
+        helpers["b"][0].unreserve_ports(helpers["b"][1])
+        waiting[1].join(5)
+        assert reserved[-1] == ("d", 12) and allocator.leases() == {"d": 12}
+        groups[("1", "13")] = None
+        reserve("d", "12", 0)
+        assert reserved[-1] == ("d", 12)
+
+    def test_stale_group_lease(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+    ) -> None:
+        """Lease of the group which ports were unreserved outside the driver does not block other reservations."""
+        groups = {("1", str(port)): port + 1 if port < 11 else None for port in range(13)}
+        stateful_port_reservation(bp_server, groups, [])
+        monkeypatch.setenv(FileBasedLock.LOCK_DIR_ENV, str(tmp_path))
+        allocator = GroupAllocator.for_chassis(bp_server.address)
+        helpers = {}
+        for owner in ["crashed", "next"]:
+            bp_session = BPSession(owner)
+            helpers[owner] = (StandInTestRunner(bp_server, session_pool, bp_session)._port_reservation_helper, bp_session)
+        helper, bp_session = helpers["crashed"]
+        helper.reserve_reservation_order([("1", "11")], bp_session)
+        helper, bp_session = helpers["next"]
+        with pytest.raises(BPException, match="busy"):
+            helper.reserve_reservation_order([("1", "12")], bp_session)
+        # The ports of the crashed sandbox are unreserved on the chassis, its group lease is left in the driver
+        groups[("1", "11")] = None
+        helper.reserve_reservation_order([("1", "12")], bp_session)
+        assert (bp_session.reservation_group, allocator.leases()) == (12, {"next": 12})
+
+    def test_busy_groups_keep_ports(
+        self, bp_server: BPStandInServer, session_pool: RestSessionPool, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+    ) -> None:
+        """Waiting for a free group releases neither the own ports nor the ports of other reservations."""
+        groups = {("1", str(port)): port + 1 for port in range(12)}
+        groups[("1", "12")] = 1
+        requests = []
+        stateful_port_reservation(bp_server, groups, requests)
+        monkeypatch.setenv(FileBasedLock.LOCK_DIR_ENV, str(tmp_path))
+        bp_session = BPSession("waiting")
+        bp_session.reserved_ports = [("1", "13")]
+        helper = StandInTestRunner(bp_server, session_pool, bp_session)._port_reservation_helper  # pylint: disable=W0212
+        with pytest.raises(BPException, match="busy"):
+            helper.reserve_reservation_order([("1", "12")], bp_session, 0.3)
+        assert bp_server.hits[("GET", "/api/v1/bps/ports")] > 1
+        assert requests == [] and groups[("1", "12")] == 1
+        helper.reserve_reservation_order([("1", "0"), ("1", "12")], bp_session)
+        assert requests == [("unreserve", ["13"]), ("unreserve", ["0", "12"]), ("reserve", ["0", "12"])]
+        assert bp_session.reservation_group == 1
+
+
+class TestFileBasedLock:
+    """Test chassis locks."""
+
+    def test_chassis_locks(self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+        """Locks of different chassis are independent, waiting for a busy lock times out with a clear error."""
+        monkeypatch.setenv(FileBasedLock.LOCK_DIR_ENV, str(tmp_path / "locks"))
+        holding = threading.Event()
+        release = threading.Event()
+        names = ["port_reservation.192.168.1.1.lock", "port_reservation.192.168.1.2.lock"]
+        empty = {"acquired": 0, "timeouts": 0}
+        before = FileBasedLock.statistics.to_dict()
+
+        def hold() -> None:
+            with FileBasedLock.for_chassis("port_reservation", "192.168.1.1"):
+                holding.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        assert holding.wait(5)
+        with FileBasedLock.for_chassis("port_reservation", "192.168.1.2", timeout=0):
+            pass
+        with pytest.raises(LockTimeoutException, match="192.168.1.1.lock"):
+            with FileBasedLock.for_chassis("port_reservation", "192.168.1.1", timeout=0):
+                pass
+        release.set()
+        thread.join()
+        with FileBasedLock.for_chassis("port_reservation", "192.168.1.1", timeout=0):
+            pass
+        after = FileBasedLock.statistics.to_dict()
+        assert [
+            {key: after[name][key] - before.get(name, empty)[key] for key in ["acquired", "timeouts"]} for name in names
+        ] == [{"acquired": 2, "timeouts": 1}, {"acquired": 1, "timeouts": 0}]
+        assert sorted(os.listdir(tmp_path / "locks")) == [
+            "port_reservation.192.168.1.1.lock",
+            "port_reservation.192.168.1.2.lock",
+        ]
@@ -0,0 +1,159 @@
+"""
+Test BreakingPoint statistics processing.
+"""
+import csv
+import gzip
+import io
+import json
+import math
+from array import array
+
+import pytest
+
+from cloudshell_bp.tg.breaking_point.statistics.columnar_store import ColumnarStatisticsStore
+from cloudshell_bp.tg.breaking_point.statistics.derived_metrics import (
+    DerivedMetrics,
+    deltas,
+    moving_average,
+    percentiles,
+    rates,
+)
+from cloudshell_bp.tg.breaking_point.statistics.thresholds import ThresholdEngine, ThresholdRule
+from cloudshell_bp.tg.breaking_point.statistics.writers import get_statistics_writer, statistics_columns
+
+
+class TestColumnarStatisticsStore:
+    """Test ColumnarStatisticsStore."""
+
+    def test_columns(self) -> None:
+        """Columns are typed, promoted to float and padded with NaN."""
+        store = ColumnarStatisticsStore()
+        store.append_groups(0, {"summary": {"frames": 1, "rate": "10", "name": "test"}})
+        store.append_groups(1, {"summary": {"frames": 2, "rate": "10.5", "sessions": 3}})
+        store.append_groups(2, {"summary": {"frames": 3}})
+        assert store.columns == ["summary.frames", "summary.rate", "summary.sessions"]
+        assert store.column("summary.frames").typecode == "q"
+        assert store.column("summary.rate").tolist()[:2] == [10.0, 10.5]
+        assert math.isnan(store.column("summary.rate")[2])
+        assert math.isnan(store.column("summary.sessions")[0])
+        assert list(store.rows(["summary.sessions"]))[1] == {"timestamp": 1, "summary.sessions": 3}
+
+    def test_downsample(self) -> None:
+        """Downsampled buckets keep min, max and mean."""
+        store = ColumnarStatisticsStore()
+        for second in range(10):
+            store.append(second, {"frames": second})
+        downsampled = store.downsample(5)
+        assert downsampled.timestamps.tolist() == [0, 5]
+        assert downsampled.column("frames.min").tolist() == [0, 5]
+        assert downsampled.column("frames.max").tolist() == [4, 9]
+        assert downsampled.column("frames.mean").tolist() == [2, 7]
+
+    def test_export(self) -> None:
+        """Exported store is loaded back."""
+        store = ColumnarStatisticsStore()
+        for second in range(100):
+            store.append(second, {"frames": second * 1000, "rate": second / 3})
+        output = io.BytesIO()
+        store.export(output)
+        output.seek(0)
+        loaded = ColumnarStatisticsStore.load(output)
+        assert loaded.columns == store.columns
+        assert loaded.timestamps == store.timestamps
+        assert loaded.column("frames") == store.column("frames")
+        assert loaded.column("rate") == store.column("rate")
+
+
+class TestDerivedMetrics:
+    """Test derived metrics of cumulative counters."""
+
+    def test_rates(self) -> None:
+        """Rates handle counter reset and missing values."""
+        timestamps = array("d", [0, 1, 2, 4, 5, 6])
+        values = array("d", [0, 10, 30, 10, math.nan, 20])
+        assert deltas(values).tolist()[1:4] == [10, 20, 10]
+        counter_rates = rates(timestamps, values)
+        assert counter_rates.tolist()[1:4] == [10, 20, 5]
+        assert math.isnan(counter_rates[4]) and math.isnan(counter_rates[5])
+        assert moving_average(counter_rates, 2).tolist()[1:5] == [10, 15, 12.5, 5]
+
+    def test_percentiles(self) -> None:
+        """Percentiles are interpolated."""
+        assert percentiles(array("d", range(101)), [50, 95]) == {50: 50, 95: 95}
+        assert percentiles(array("d", [1, 2]), [50]) == {50: 1.5}
+
+    def test_apply(self) -> None:
+        """Derived columns are added to the store."""
+        store = ColumnarStatisticsStore()
+        for second in range(5):
+            store.append(second, {"frames": second * 100, "bytes": second * 1000})
+        metrics = DerivedMetrics(["frames"], window=2)
+        assert metrics.apply(store) == ["frames.delta", "frames.rate", "frames.rate_avg"]
+        assert store.column("frames.rate").tolist()[1:] == [100] * 4
+        assert metrics.summary(store)["frames.rate"]["p50"] == 100
+
+
+class TestStatisticsWriters:
+    """Test incremental statistics writers."""
+
+    ROWS = [{"frames": 1, "timestamp": 0}, {"timestamp": 1, "rate": 2.5, "frames": 2}]
+
+    def test_columns(self) -> None:
+        """Timestamp goes first, other columns in order of appearance."""
+        assert statistics_columns(self.ROWS) == ["timestamp", "frames", "rate"]
+
+    def test_csv(self) -> None:
+        """CSV rows follow the header order, gzip output is readable."""
+        output = io.BytesIO()
+        with get_statistics_writer("CSV", output, statistics_columns(self.ROWS), compress=True) as writer:
+            writer.write_rows(iter(self.ROWS))
+        lines = gzip.decompress(output.getvalue()).decode().splitlines()
+        assert list(csv.reader(lines)) == [["timestamp", "frames", "rate"], ["0", "1", ""], ["1", "2", "2.5"]]
+        assert not output.closed
+
+    def test_json(self) -> None:
+        """JSON columns are taken from the first row and extended by the new keys."""
+        output = io.BytesIO()
+        with get_statistics_writer("json", output) as writer:
+            writer.write_rows(self.ROWS)
+        rows = json.loads(output.getvalue())
+        assert [list(row) for row in rows] == [["timestamp", "frames"], ["timestamp", "frames", "rate"]]
+        empty = io.BytesIO()
+        get_statistics_writer("json", empty).close()
+        assert json.loads(empty.getvalue()) == []
+
+
+class TestThresholds:
+    """Test incremental thresholds evaluation."""
+
+    def test_parse(self) -> None:
+        """Rules are parsed with optional function and hard mark."""
+        rule = ThresholdRule.parse(" max( Summary.sessionsFailed ) <= 1e3 !")
+        assert (rule.function, rule.counter, rule.operator_name, rule.value, rule.hard) == (
+            "max",
+            "summary.sessionsFailed",
+            "<=",
+            1000,
+            True,
+        )
+        assert str(rule) == "max(summary.sessionsFailed)<=1000!"
+        with pytest.raises(ValueError):
+            ThresholdRule.parse("summary.sessionsFailed => 10")
+
+    def test_evaluate(self) -> None:
+        """Only final failures of hard rules short-circuit the evaluation."""
+        engine = ThresholdEngine.parse("avg(summary.rate)>=10; max(summary.failed)<=2!; summary.latency<5")
+        assert engine.stats_groups == ["summary"]
+        assert not engine.evaluate(0, {"summary": {"rate": 5, "failed": 0, "latency": 6}})
+        assert engine.result()["passed"] is False
+        assert not engine.evaluate(1, {"summary": {"rate": 20, "failed": 2, "latency": 1}})
+        failed = engine.evaluate(2, {"summary": {"rate": 20, "failed": 3}})
+        assert [str(rule) for rule in failed] == ["max(summary.failed)<=2!"]
+        assert not engine.evaluate(3, {"summary": {"rate": 0, "failed": 10}})
+        result = engine.result()
+        assert result["samples"] == 3 and result["completed"]
+        assert [(rule["status"], rule["actual"], rule["violation_timestamp"]) for rule in result["rules"]] == [
+            ("passed", 15, 0),
+            ("failed", 3, 2),
+            ("failed", 6, 0),
+        ]